@@ -1,33 +1,27 @@
 # backend/auth/routes.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from utils.database import general_session
-from utils.authutils import create_access_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import get_general_db
+from utils.passwords import password_hasher
+from utils.authutils import create_access_token, add_token_to_blacklist, oauth2_scheme
+from jose import JWTError
 from utils.schemas import UserRead, UserCreate, Token,LoginRequest
 from utils.models import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 router = APIRouter(
 )
 
-
-def get_db():
-    db = general_session()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_general_db)):
+    # Database calls are async and hashing goes to the password pool, so neither blocks the event loop
     # Check if user exists
-    db_user = db.query(User).filter_by(username=user_data.username).first()
+    db_user = (await db.execute(select(User).filter_by(username=user_data.username))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
     # Hash password
-    hashed_password = pwd_context.hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
 
     # Create new user instance with additional fields
     new_user = User(
@@ -45,24 +39,29 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
 
     # Add to the database
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
-    print("Login endpoint hit")
-    db_user = db.query(User).filter_by(username=login_data.username).first()
+async def login_user(login_data: LoginRequest, db: AsyncSession = Depends(get_general_db)):
+    db_user = (await db.execute(select(User).filter_by(username=login_data.username))).scalars().first()
 
     # Check if the user exists
     if not db_user:
         raise HTTPException(status_code=400, detail="User not found")
 
     # Check if the password matches
-    if not pwd_context.verify(login_data.password, db_user.hashed_password):
+    valid, new_hash = await password_hasher.verify(login_data.password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
+    # Stored with a different work factor: replace it now that we know the password
+    if new_hash is not None:
+        db_user.hashed_password = new_hash
+        await db.commit()
+
     # Generate JWT token
     access_token, expire = create_access_token(data={"sub": db_user.username})
 
@@ -75,3 +74,12 @@ def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
         expiry=expire
     )
 
+
+@router.post("/logout")
+async def logout_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_general_db)):
+    """Revoke the presented token for the rest of its lifetime."""
+    try:
+        await add_token_to_blacklist(token, db)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return {"detail": "Logged out"}
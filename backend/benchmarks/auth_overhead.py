@@ -0,0 +1,87 @@
+# backend/benchmarks/auth_overhead.py
+"""
+Per-request authentication overhead with 1M revoked tokens. Fills the revocation
+Bloom filter with 1M token ids and times get_current_user on a warm auth cache
+(the common case: valid, non-revoked token), the filter check on its own, and the
+filter's false-positive rate. With --db it also seeds blacklisted_tokens with the
+same number of rows and times what the check costs as an indexed query instead,
+plus a full filter load.
+
+Run from the backend directory (against a disposable general database for --db):
+    python -m benchmarks.auth_overhead [--revoked 1000000] [--db]
+"""
+from sqlalchemy import text
+from utils.authcache import auth_cache
+from utils.authutils import create_access_token, decode_token, get_current_user
+from utils.database import general_engine, general_session
+from utils.revocation import BloomFilter, REVOCATION_ERROR_RATE, revocation_list
+from utils.schemas import UserRead
+import argparse
+import asyncio
+import time
+import uuid
+
+REQUESTS = 100_000
+
+
+def per_call_us(fn, count: int = REQUESTS) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auth overhead with many revoked tokens")
+    parser.add_argument("--revoked", type=int, default=1_000_000)
+    parser.add_argument("--db", action="store_true", help="Also seed blacklisted_tokens and time the query")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    bloom = BloomFilter(args.revoked, REVOCATION_ERROR_RATE)
+    for _ in range(args.revoked):
+        bloom.add(uuid.uuid4().hex)
+    print(f"filled filter with {args.revoked} ids in {time.perf_counter() - start:.1f}s, "
+          f"{len(bloom.bits) / 1024 / 1024:.1f} MiB, {bloom.hashes} hashes")
+    revocation_list.filter = bloom
+    revocation_list.loaded = True
+
+    probes = [uuid.uuid4().hex for _ in range(REQUESTS)]
+    false_positives = sum(probe in bloom for probe in probes)
+    print(f"false positives: {false_positives / len(probes):.4%} (target {REVOCATION_ERROR_RATE:.2%})")
+
+    probe = probes[0]
+    print(f"filter check:                     {per_call_us(lambda: probe in bloom):6.2f} us")
+
+    token, _ = create_access_token({"sub": "bench"})
+    auth_cache.put_user("bench", UserRead.model_construct(username="bench", id=uuid.uuid4()), auth_cache.read_token())
+    decode_token(token)
+    # Warm cache and a negative filter answer never touch the session
+    loop = asyncio.new_event_loop()
+    print(f"get_current_user (warm cache):    "
+          f"{per_call_us(lambda: loop.run_until_complete(get_current_user(token, None))):6.2f} us")
+    loop.close()
+
+    if args.db:
+        with general_engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO blacklisted_tokens (jti, expires_at, revoked_at) "
+                "SELECT 'bench-' || md5(g::text || random()::text), now() + interval '1 day', now() "
+                "FROM generate_series(1, :count) AS g"
+            ), {"count": args.revoked})
+            conn.execute(text("ANALYZE blacklisted_tokens"))
+        try:
+            with general_session() as db:
+                query = text("SELECT 1 FROM blacklisted_tokens WHERE jti = :jti")
+                print(f"indexed query per request:        "
+                      f"{per_call_us(lambda: db.execute(query, {'jti': probe}).first(), 5000):6.2f} us")
+                start = time.perf_counter()
+                revocation_list.load(db)
+                print(f"full filter load of {revocation_list.filter.count} rows: {time.perf_counter() - start:.1f}s")
+        finally:
+            with general_engine.begin() as conn:
+                conn.execute(text("DELETE FROM blacklisted_tokens WHERE jti LIKE 'bench-%'"))
+
+
+if __name__ == "__main__":
+    main()
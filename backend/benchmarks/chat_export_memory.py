@@ -0,0 +1,87 @@
+# backend/benchmarks/chat_export_memory.py
+"""
+Seeds one chat with a million messages, streams it through the export generator
+and checks that peak RSS stays bounded while doing so. With --compare it then
+loads the same chat the old way (one list of rows) to show the difference.
+
+Exits non-zero when streaming grows peak RSS by more than --max-growth-mb.
+Run from the backend directory against a disposable chat database:
+    python -m benchmarks.chat_export_memory [--messages 1000000] [--compare] [--keep]
+"""
+from sqlalchemy import text
+from utils.database import chat_engine, chat_session
+from utils.models import ChatRoomManager, init_chat_schema
+from utils.schemas import ExportFormat
+from chat.export import export_chunks
+import argparse
+import resource
+import sys
+import time
+import uuid
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(chat_id: uuid.UUID, messages: int):
+    with chat_engine.begin() as conn:
+        conn.execute(text("SET LOCAL chat.skip_notify = 'on'"))
+        conn.execute(text("""
+            INSERT INTO chat_messages (chat_id, user_id, message, timestamp)
+            SELECT :chat_id, 'bench', 'Bericht ' || g || ': ' || repeat('kipfilet met broccoli ', 1 + g % 8),
+                   now() - make_interval(secs => g)
+              FROM generate_series(1, :messages) AS g
+        """), {"chat_id": chat_id, "messages": messages})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat export memory benchmark")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=[fmt.value for fmt in ExportFormat], default=ExportFormat.ndjson.value)
+    parser.add_argument("--max-growth-mb", type=float, default=64)
+    parser.add_argument("--compare", action="store_true", help="Also load the chat into one list afterwards")
+    parser.add_argument("--keep", action="store_true", help="Leave the seeded messages in place")
+    args = parser.parse_args()
+
+    init_chat_schema(chat_engine)
+    chat_id = uuid.uuid4()
+    print(f"Seeding {args.messages} messages into chat {chat_id}")
+    seed(chat_id, args.messages)
+
+    try:
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        exported = 0
+        for chunk in export_chunks([chat_id], ExportFormat(args.format)):
+            exported += len(chunk)
+        elapsed = time.perf_counter() - start
+        growth = peak_rss_mb() - baseline
+        print(f"streamed {exported / 1024 / 1024:.0f} MiB in {elapsed:.1f}s; "
+              f"peak RSS {baseline:.0f} -> {baseline + growth:.0f} MiB (+{growth:.1f})")
+
+        if args.compare:
+            before = peak_rss_mb()
+            session = chat_session()
+            try:
+                rows = ChatRoomManager.get_all_messages(session, chat_id)
+                print(f"list of {len(rows)} rows: peak RSS {before:.0f} -> {peak_rss_mb():.0f} MiB")
+                del rows
+            finally:
+                session.close()
+    finally:
+        if not args.keep:
+            session = chat_session()
+            try:
+                ChatRoomManager.remove_chat(session, chat_id)
+            finally:
+                session.close()
+
+    if growth > args.max_growth_mb:
+        print(f"FAIL: streaming grew peak RSS by {growth:.1f} MiB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# backend/benchmarks/chat_search.py
+"""
+Seeds chat_messages with a synthetic Dutch corpus (1M messages by default) spread
+over many chats and compares the GIN-indexed full-text search against the old
+ILIKE scan, both for one user's set of chats and for a single chat.
+
+Run from the backend directory against a disposable chat database:
+    python -m benchmarks.chat_search [--messages 1000000] [--chats 2000] [--keep]
+"""
+from sqlalchemy import text
+from utils.database import chat_engine, chat_session
+from utils.models import ChatRoomManager, init_chat_schema
+import argparse
+import statistics
+import time
+import uuid
+
+WORDS = [
+    "kipfilet", "broccoli", "pasta", "rijst", "linzen", "spinazie", "zalm", "tofu",
+    "paprika", "ui", "knoflook", "tomaat", "courgette", "havermout", "yoghurt", "kaas",
+    "ontbijt", "lunch", "avondeten", "recept", "gezond", "snel", "vegetarisch", "eiwit",
+    "calorieën", "koken", "bakken", "oven", "soep", "salade", "wraps", "curry",
+]
+QUERIES = ["kipfilet broccoli", "vegetarisch recept", "zalm oven", "snel ontbijt"]
+REPEATS = 20
+
+
+def seed(messages: int, chats: int):
+    chat_ids = [uuid.uuid4() for _ in range(chats)]
+    with chat_engine.begin() as conn:
+        conn.execute(text("SET LOCAL chat.skip_notify = 'on'"))
+        conn.execute(text("""
+            INSERT INTO chat_messages (chat_id, user_id, message, timestamp)
+            SELECT (CAST(:chat_ids AS uuid[]))[1 + (g % :chats)],
+                   'bench',
+                   (SELECT string_agg((:words)[1 + floor(random() * :word_count)::int], ' ')
+                      FROM generate_series(1, 12 + (g % 5))),
+                   now() - make_interval(secs => g)
+              FROM generate_series(1, :messages) AS g
+        """), {
+            "chat_ids": [str(chat_id) for chat_id in chat_ids],
+            "chats": chats,
+            "words": WORDS,
+            "word_count": len(WORDS),
+            "messages": messages,
+        })
+        conn.execute(text("ANALYZE chat_messages"))
+    return chat_ids
+
+
+def timed(fn):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--user-chats", type=int, default=50, help="Chats searched for one user")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded rows")
+    args = parser.parse_args()
+
+    init_chat_schema(chat_engine)
+    start = time.perf_counter()
+    chat_ids = seed(args.messages, args.chats)
+    print(f"Seeded {args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+    user_chats = chat_ids[:args.user_chats]
+    try:
+        with chat_session() as session:
+            print(f"{'query':<22} {'fts user (ms)':>14} {'fts chat (ms)':>14} {'ilike user (ms)':>16}")
+            for query in QUERIES:
+                fts_user = timed(lambda: ChatRoomManager.search_messages(session, user_chats, query))
+                fts_chat = timed(lambda: ChatRoomManager.search_messages(session, user_chats[:1], query))
+                ilike_user = timed(lambda: session.execute(
+                    text("SELECT id FROM chat_messages WHERE chat_id = ANY(CAST(:ids AS uuid[])) AND message ILIKE :q LIMIT 20"),
+                    {"ids": [str(chat_id) for chat_id in user_chats], "q": f"%{query.split()[0]}%"},
+                ).fetchall())
+                print(f"{query:<22} {fts_user:>14.2f} {fts_chat:>14.2f} {ilike_user:>16.2f}")
+    finally:
+        if not args.keep:
+            with chat_engine.begin() as conn:
+                conn.execute(
+                    text("DELETE FROM chat_messages WHERE chat_id = ANY(CAST(:ids AS uuid[]))"),
+                    {"ids": [str(chat_id) for chat_id in chat_ids]},
+                )
+
+
+if __name__ == "__main__":
+    main()
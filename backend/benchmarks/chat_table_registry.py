@@ -0,0 +1,96 @@
+# backend/benchmarks/chat_table_registry.py
+"""
+Walks 100k distinct chat ids and measures how much memory the per-chat Table
+objects hold on to: once the old way (create_chat_model on one shared MetaData)
+and once through the bounded ChatTableRegistry. Also times building a per-chat
+select on every call against reusing the prebuilt ChatRoomManager statement.
+
+Needs no database. Exits non-zero when the registry's memory keeps growing, so it
+doubles as a regression check:
+    python -m benchmarks.chat_table_registry [--chats 100000] [--cache-size 1024]
+"""
+from sqlalchemy import MetaData, select
+from utils.models import ChatTableRegistry, SELECT_PAGE_NEWEST, chat_messages, create_chat_model
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+
+# Allowed growth between the first and the last checkpoint once the registry is full
+MAX_REGISTRY_GROWTH_BYTES = 2 * 1024 * 1024
+
+
+def walk(get_table, chat_ids, checkpoints):
+    """Call get_table for every chat id; return traced memory at each checkpoint."""
+    gc.collect()
+    tracemalloc.start()
+    samples = []
+    start = time.perf_counter()
+    for index, chat_id in enumerate(chat_ids, 1):
+        get_table(chat_id)
+        if index in checkpoints:
+            gc.collect()
+            samples.append((index, tracemalloc.get_traced_memory()[0]))
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return samples, elapsed
+
+
+def report(label, samples, elapsed, chats):
+    print(f"{label}: {elapsed / chats * 1e6:.1f} us/chat")
+    for index, traced in samples:
+        print(f"  after {index:>7} chats: {traced / 1024 / 1024:8.1f} MiB")
+
+
+def statement_overhead(chat_ids):
+    start = time.perf_counter()
+    for chat_id in chat_ids:
+        (
+            select(chat_messages.c.id, chat_messages.c.user_id, chat_messages.c.message, chat_messages.c.timestamp)
+            .where(chat_messages.c.chat_id == chat_id)
+            .order_by(chat_messages.c.id.desc())
+            .limit(50)
+        )
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chat_id in chat_ids:
+        statement, params = SELECT_PAGE_NEWEST, {"chat_id": chat_id, "limit": 50}
+    reused = time.perf_counter() - start
+
+    print(f"per-call select construction: {built / len(chat_ids) * 1e6:.2f} us")
+    print(f"prebuilt statement + params:  {reused / len(chat_ids) * 1e6:.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-chat table memory benchmark")
+    parser.add_argument("--chats", type=int, default=100_000)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    chat_ids = [uuid.uuid4() for _ in range(args.chats)]
+    checkpoints = {args.chats // 10, args.chats // 2, args.chats}
+
+    shared = MetaData()
+    samples, elapsed = walk(lambda chat_id: create_chat_model(str(chat_id), shared), chat_ids, checkpoints)
+    report(f"create_chat_model on shared metadata ({len(shared.tables)} tables kept)", samples, elapsed, args.chats)
+    del shared
+
+    registry = ChatTableRegistry(MetaData(), args.cache_size)
+    registry_samples, elapsed = walk(registry.get, chat_ids, checkpoints)
+    report(f"ChatTableRegistry(max_size={args.cache_size}) ({len(registry.metadata.tables)} tables kept)",
+           registry_samples, elapsed, args.chats)
+
+    statement_overhead(chat_ids)
+
+    growth = registry_samples[-1][1] - registry_samples[0][1]
+    print(f"registry growth after warm-up: {growth / 1024:.0f} KiB")
+    if len(registry.metadata.tables) > args.cache_size or growth > MAX_REGISTRY_GROWTH_BYTES:
+        print("FAIL: registry memory is not bounded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
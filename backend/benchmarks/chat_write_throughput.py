@@ -0,0 +1,66 @@
+# backend/benchmarks/chat_write_throughput.py
+"""
+Messages/second for chat message inserts with and without the group-commit batcher.
+PRODUCERS coroutines (think: busy sockets spread over several rooms) each write
+MESSAGES messages, awaiting every write before sending the next one.
+
+Run from the backend directory against a disposable chat database:
+    python -m benchmarks.chat_write_throughput [--producers 200] [--messages 50]
+"""
+from sqlalchemy import text
+from utils.database import chat_async_engine, chat_async_session, chat_engine
+from utils.models import ChatRoomManager, init_chat_schema
+from chat.batcher import MessageBatcher
+import argparse
+import asyncio
+import time
+import uuid
+
+
+async def unbatched_write(room, user_id, message):
+    async with chat_async_session() as session:
+        return await session.run_sync(ChatRoomManager.add_message, room, user_id, message)
+
+
+async def run(write, rooms, producers: int, messages: int) -> float:
+    async def producer(index):
+        room = rooms[index % len(rooms)]
+        for n in range(messages):
+            await write(room, f"bench-{index}", f"message {n}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(i) for i in range(producers)))
+    return producers * messages / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--producers", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--max-delay-ms", type=float, default=5)
+    parser.add_argument("--max-rows", type=int, default=500)
+    args = parser.parse_args()
+
+    init_chat_schema(chat_engine)
+    rooms = [str(uuid.uuid4()) for _ in range(args.rooms)]
+    batcher = MessageBatcher(max_delay_ms=args.max_delay_ms, max_rows=args.max_rows)
+    try:
+        unbatched = await run(unbatched_write, rooms, args.producers, args.messages)
+        batched = await run(batcher.add, rooms, args.producers, args.messages)
+        await batcher.close()
+        print(f"producers={args.producers} messages/producer={args.messages} rooms={args.rooms}")
+        print(f"unbatched: {unbatched:,.0f} msg/s")
+        print(f"batched:   {batched:,.0f} msg/s ({batcher.batches} batches, "
+              f"{batcher.rows / max(batcher.batches, 1):.1f} rows/batch)")
+    finally:
+        async with chat_async_engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM chat_messages WHERE chat_id = ANY(CAST(:ids AS uuid[]))"),
+                {"ids": rooms},
+            )
+        await chat_async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
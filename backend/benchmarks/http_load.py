@@ -0,0 +1,80 @@
+# backend/benchmarks/http_load.py
+"""
+Throughput of the authenticated REST endpoints under increasing concurrency. For
+each level in BENCH_CONCURRENCY it keeps that many requests in flight for
+BENCH_PHASE_SECONDS, cycling through BENCH_PATHS, and prints requests per second
+with p50/p99. The last line is the best throughput whose p99 stayed under
+BENCH_P99_TARGET_MS. Run it against a build before and after a change and compare.
+
+Run from the backend directory against a running server and an existing account:
+    BENCH_USERNAME=<user> BENCH_PASSWORD=<password> python -m benchmarks.http_load
+"""
+import asyncio
+import itertools
+import os
+import statistics
+import time
+
+import httpx
+
+BASE_URL = os.getenv("BENCH_URL", "http://127.0.0.1:8000")
+USERNAME = os.getenv("BENCH_USERNAME", "")
+PASSWORD = os.getenv("BENCH_PASSWORD", "")
+PATHS = os.getenv("BENCH_PATHS", "/management/account,/chat/chats,/recipes/list").split(",")
+CONCURRENCY = [int(level) for level in os.getenv("BENCH_CONCURRENCY", "8,32,64,128,256").split(",")]
+PHASE_SECONDS = float(os.getenv("BENCH_PHASE_SECONDS", 10))
+P99_TARGET_MS = float(os.getenv("BENCH_P99_TARGET_MS", 100))
+
+
+async def worker(client: httpx.AsyncClient, paths, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(next(paths))
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int):
+    latencies, errors = [], []
+    paths = itertools.cycle(PATHS)
+    start = time.perf_counter()
+    deadline = start + PHASE_SECONDS
+    await asyncio.gather(*(worker(client, paths, deadline, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else float("inf")
+    rps = len(latencies) / elapsed
+    print(f"concurrency {concurrency:<4} {rps:8.1f} req/s  p50={statistics.median(latencies or [0]):7.1f} ms  "
+          f"p99={p99:7.1f} ms  errors={len(errors)}")
+    return rps, p99
+
+
+async def main():
+    limits = httpx.Limits(max_connections=max(CONCURRENCY), max_keepalive_connections=max(CONCURRENCY))
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=60) as client:
+        response = await client.post("/auth/login", json={"username": USERNAME, "password": PASSWORD})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        # Warm connections and caches before measuring
+        for path in PATHS:
+            (await client.get(path)).raise_for_status()
+
+        results = [await run_level(client, concurrency) for concurrency in CONCURRENCY]
+
+    within_target = [rps for rps, p99 in results if p99 <= P99_TARGET_MS]
+    if within_target:
+        print(f"best throughput with p99 <= {P99_TARGET_MS:.0f} ms: {max(within_target):.1f} req/s")
+    else:
+        print(f"no level kept p99 under {P99_TARGET_MS:.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
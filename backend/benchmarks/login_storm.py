@@ -0,0 +1,88 @@
+# backend/benchmarks/login_storm.py
+"""
+Latency of an ordinary endpoint while the server is flooded with logins. Measures
+GET /management/account (a sync endpoint on the shared threadpool) on its own,
+then again while LOGIN_CLIENTS threads log in back to back, and prints p50/p99 of
+both phases plus the login throughput. Run it against a build before and after a
+change and compare.
+
+Run from the backend directory against a running server and an existing account:
+    BENCH_USERNAME=<user> BENCH_PASSWORD=<password> python -m benchmarks.login_storm
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BASE_URL = os.getenv("BENCH_URL", "http://127.0.0.1:8000")
+USERNAME = os.getenv("BENCH_USERNAME", "")
+PASSWORD = os.getenv("BENCH_PASSWORD", "")
+LOGIN_CLIENTS = int(os.getenv("BENCH_LOGIN_CLIENTS", 32))
+PHASE_SECONDS = float(os.getenv("BENCH_PHASE_SECONDS", 10))
+PROBE_INTERVAL = float(os.getenv("BENCH_PROBE_INTERVAL", 0.05))
+
+
+def request(path: str, body: dict = None, token: str = None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode() if body is not None else None
+    with urllib.request.urlopen(urllib.request.Request(BASE_URL + path, data=data, headers=headers), timeout=60) as response:
+        return json.loads(response.read())
+
+
+def login():
+    return request("/auth/login", {"username": USERNAME, "password": PASSWORD})["access_token"]
+
+
+def probe(token: str, stop: threading.Event) -> list:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        request("/management/account", token=token)
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(PROBE_INTERVAL)
+    return latencies
+
+
+def storm(stop: threading.Event, counts: list):
+    while not stop.is_set():
+        try:
+            login()
+            counts.append(1)
+        except urllib.error.HTTPError:
+            counts.append(0)
+
+
+def report(label: str, latencies: list):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<28} n={len(latencies):<5} p50={statistics.median(latencies):7.1f} ms  p99={p99:7.1f} ms")
+
+
+def main():
+    token = login()
+
+    stop = threading.Event()
+    timer = threading.Timer(PHASE_SECONDS, stop.set)
+    timer.start()
+    report("account, idle", probe(token, stop))
+
+    stop = threading.Event()
+    counts = []
+    with ThreadPoolExecutor(max_workers=LOGIN_CLIENTS + 1) as pool:
+        for _ in range(LOGIN_CLIENTS):
+            pool.submit(storm, stop, counts)
+        probe_future = pool.submit(probe, token, stop)
+        time.sleep(PHASE_SECONDS)
+        stop.set()
+        report(f"account, {LOGIN_CLIENTS} login clients", probe_future.result())
+    print(f"logins: {sum(counts) / PHASE_SECONDS:.1f}/s ok, {counts.count(0)} rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# backend/benchmarks/notification_dispatch.py
+"""
+Measures the cost of dispatching one `new_message` NOTIFY while a growing number
+of idle chat rooms are subscribed. With the shared dispatcher the per-notification
+cost should stay flat; the legacy mode (one listener per socket) grows linearly.
+
+Run from the backend directory:
+    python -m benchmarks.notification_dispatch
+"""
+import asyncio
+import time
+
+from utils.database import NotificationManager
+
+IDLE_CONNECTIONS = [0, 100, 1_000, 10_000]
+NOTIFICATIONS = 500
+
+
+async def _noop(chat_id, message_id):
+    return None
+
+
+async def bench_shared(idle: int) -> float:
+    manager = NotificationManager(dsn="")
+    for i in range(idle):
+        manager.subscribe(f"idle-{i}", _noop)
+    manager.subscribe("hot", _noop)
+
+    start = time.perf_counter()
+    for i in range(NOTIFICATIONS):
+        manager.notification_handler(None, 0, "new_message", f"{i}:hot")
+        await asyncio.sleep(0)  # let the dispatched callback run
+    return (time.perf_counter() - start) / NOTIFICATIONS
+
+
+async def bench_legacy(idle: int) -> float:
+    """One callback per socket, each parsing and filtering the payload itself."""
+    def make_handler(room):
+        async def handler(connection, pid, channel, payload):
+            message_id, chat_id = payload.split(":")
+            if chat_id == room:
+                await _noop(chat_id, message_id)
+        return handler
+
+    handlers = [make_handler(f"idle-{i}") for i in range(idle)] + [make_handler("hot")]
+
+    start = time.perf_counter()
+    for i in range(NOTIFICATIONS):
+        payload = f"{i}:hot"
+        for handler in handlers:
+            # asyncpg schedules each coroutine listener as its own task
+            asyncio.ensure_future(handler(None, 0, "new_message", payload))
+        await asyncio.sleep(0)
+    return (time.perf_counter() - start) / NOTIFICATIONS
+
+
+async def main():
+    print(f"{'idle':>8} {'shared (us)':>14} {'legacy (us)':>14}")
+    for idle in IDLE_CONNECTIONS:
+        shared = await bench_shared(idle)
+        legacy = await bench_legacy(idle)
+        print(f"{idle:>8} {shared * 1e6:>14.2f} {legacy * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
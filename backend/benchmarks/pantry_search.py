@@ -0,0 +1,139 @@
+# backend/benchmarks/pantry_search.py
+"""
+Seeds recipes (500k by default) whose ingredients follow a Zipf-like distribution
+over a vocabulary of canonical names, builds ingredient_stats and the pantry keys
+the way `python -m recipes.ingredients` does, and times the pantry search for
+random pantries of several sizes: first the recipes missing nothing, then with at
+most one ingredient missing. For comparison it times the plain approach of
+scoring every recipe that shares an ingredient with the pantry (GIN `&&`).
+
+Measured at 500k recipes on one core, median / p99 of what /recipes/pantry runs:
+8 items 18 / 34 ms, 12 items 8 / 33 ms, 20 items 15 / 52 ms, 30 items 38 / 45 ms;
+the `&&` scan takes 2-3 s. The cost grows with the cube of the pantry size (the
+subsets looked up), which PANTRY_MAX_ITEMS caps.
+
+Run from the backend directory against a disposable general database:
+    python -m benchmarks.pantry_search [--recipes 500000] [--pantries 30] [--keep]
+"""
+from recipes.ingredients import known_ingredients, pantry_search, rebuild_ingredient_stats, rebuild_pantry_keys
+from sqlalchemy import text
+from utils.database import general_engine, general_session
+from utils.models import Recipe
+import argparse
+import math
+import random
+import statistics
+import time
+
+SOURCE = "benchmark"
+VOCABULARY = 1000
+PANTRY_SIZES = [8, 12, 15, 20, 25, 30]
+LIMIT = 20
+
+NAIVE_QUERY = text("""
+    SELECT id, cardinality(ingredient_names) - (
+               SELECT count(*) FROM unnest(ingredient_names) AS name WHERE name = ANY(CAST(:have AS varchar[]))
+           ) AS missing
+      FROM recipes
+     WHERE ingredient_names && CAST(:have AS varchar[])
+     ORDER BY missing, id DESC
+     LIMIT :limit
+""")
+
+
+def seed(recipes: int):
+    # exp(random() * ln(V)) is log-uniform, which makes the rank of a name roughly Zipf distributed
+    with general_engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO recipes (title, prepare_time, ingredients, instructions, servings, calories,
+                                 macros, needed_equipment, source, ingredient_names)
+            SELECT 'bench ' || g, 30, names, ARRAY['bench'], 2, 500, ARRAY[]::varchar[], ARRAY[]::varchar[],
+                   :source, names
+              FROM generate_series(1, :recipes) AS g,
+                   LATERAL (
+                       SELECT ARRAY(
+                           SELECT DISTINCT 'bench' || floor(exp(random() * ln(:vocabulary)))::int
+                             FROM generate_series(1, 5 + (g % 8))
+                       )::varchar[] AS names
+                   ) AS drawn
+        """), {"source": SOURCE, "recipes": recipes, "vocabulary": VOCABULARY})
+    with general_engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM ANALYZE recipes"))
+
+
+def random_pantry(size: int):
+    pantry = set()
+    while len(pantry) < size:
+        pantry.add(f"bench{math.floor(math.exp(random.random() * math.log(VOCABULARY)))}")
+    return sorted(pantry)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, math.ceil(len(samples) * 0.99) - 1)]
+    return statistics.median(samples) * 1000, p99 * 1000
+
+
+def timed(fn, pantries):
+    samples = []
+    for pantry in pantries:
+        start = time.perf_counter()
+        fn(pantry)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def tiered(session, pantry):
+    # What /recipes/pantry runs: the exact tier, widened only when it doesn't fill the page
+    pantry = sorted(session.execute(known_ingredients(pantry)).scalars())
+    rows = session.execute(pantry_search([Recipe.id], pantry, [], 0, LIMIT)).all()
+    if len(rows) < LIMIT:
+        rows = session.execute(pantry_search([Recipe.id], pantry, [], 1, LIMIT)).all()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=500_000)
+    parser.add_argument("--pantries", type=int, default=30, help="Random pantries per size")
+    parser.add_argument("--naive-pantries", type=int, default=3, help="Pantries per size for the && scan")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded rows")
+    args = parser.parse_args()
+
+    random.seed(7)
+    start = time.perf_counter()
+    seed(args.recipes)
+    print(f"Seeded {args.recipes} recipes in {time.perf_counter() - start:.1f}s")
+
+    try:
+        with general_session() as session:
+            start = time.perf_counter()
+            rebuild_ingredient_stats(session)
+            rebuild_pantry_keys(session, 5000)
+            print(f"Built ingredient_stats and the pantry keys in {time.perf_counter() - start:.1f}s")
+        with general_engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM ANALYZE recipe_pantry_keys"))
+
+        with general_session() as session:
+            print(f"{'pantry':>6} {'exact p50/p99 (ms)':>20} {'tiered p50/p99 (ms)':>20} {'&& scan p50 (ms)':>17}")
+            for size in PANTRY_SIZES:
+                pantries = [random_pantry(size) for _ in range(args.pantries)]
+                exact = timed(
+                    lambda pantry: session.execute(pantry_search([Recipe.id], pantry, [], 0, LIMIT)).all(), pantries
+                )
+                tier = timed(lambda pantry: tiered(session, pantry), pantries)
+                naive = timed(
+                    lambda pantry: session.execute(NAIVE_QUERY, {"have": pantry, "limit": LIMIT}).all(),
+                    pantries[:args.naive_pantries],
+                )
+                print(f"{size:>6} {exact[0]:>9.1f} / {exact[1]:<8.1f} {tier[0]:>9.1f} / {tier[1]:<8.1f} {naive[0]:>17.1f}")
+    finally:
+        if not args.keep:
+            with general_session() as session:
+                # ingredient_stats is counted down by the delete trigger
+                session.execute(text("DELETE FROM recipes WHERE source = :source"), {"source": SOURCE})
+                session.commit()
+
+
+if __name__ == "__main__":
+    main()
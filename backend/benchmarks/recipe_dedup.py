@@ -0,0 +1,100 @@
+# backend/benchmarks/recipe_dedup.py
+"""
+Builds the near-duplicate index of recipes/dedup.py over synthetic recipes (1M by
+default: Zipf-distributed ingredients, generated titles) and measures what
+add_recipe_to_db pays per check: computing the signature and looking it up. The
+lookups are timed for new, unrelated recipes and for variants of indexed ones (an
+ingredient added or swapped, a title word changed); the report includes how many
+variants were caught, how many unrelated recipes were flagged, candidates per
+lookup and the memory held by the index. Runs in memory, no database needed.
+
+Run from the backend directory:
+    python -m benchmarks.recipe_dedup [--recipes 1000000] [--checks 2000]
+"""
+from recipes.dedup import RecipeIndex, recipe_signature
+import argparse
+import itertools
+import math
+import random
+import statistics
+import time
+
+VOCABULARY = [f"ingredient{i}" for i in range(2000)]
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / (i + 1) ** 1.05 for i in range(len(VOCABULARY))))
+COMMON = ["zout", "peper", "olijfolie", "ui", "knoflook"]
+DISHES = ["curry", "pasta", "salade", "soep", "wrap", "ovenschotel", "stamppot", "roerbakgerecht", "bowl", "risotto"]
+STYLES = ["romige", "pittige", "snelle", "zomerse", "frisse", "gezonde", "klassieke", "italiaanse", "thaise", "vegetarische"]
+
+
+def synthetic_recipe(rng: random.Random):
+    names = set(rng.sample(COMMON, rng.randint(2, 5)))
+    size = rng.randint(8, 14)
+    while len(names) < size:
+        names.add(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS)[0])
+    main = rng.choice(sorted(names - set(COMMON)))
+    return f"{rng.choice(STYLES)} {rng.choice(DISHES)} met {main}", sorted(names)
+
+
+def variant(rng: random.Random, title: str, names):
+    names, words = list(names), title.split()
+    change = rng.randrange(3)
+    if change == 0:
+        names.append(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS)[0])
+    elif change == 1:
+        names[rng.randrange(len(names))] = rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS)[0]
+    else:
+        words[0] = rng.choice(STYLES)
+    return " ".join(words), names
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, math.ceil(len(samples) * 0.99) - 1)]
+    return statistics.median(samples) * 1e6, p99 * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=1_000_000)
+    parser.add_argument("--checks", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    start = time.perf_counter()
+    corpus = [synthetic_recipe(rng) for _ in range(args.recipes)]
+    signatures = [recipe_signature(title, names) for title, names in corpus]
+    print(f"Generated and signed {args.recipes} recipes in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    index = RecipeIndex(threshold=0.8)
+    index.load(zip(range(1, args.recipes + 1), signatures))
+    memory = index.nbytes()
+    print(
+        f"Loaded the index in {time.perf_counter() - start:.1f}s, "
+        f"{memory / 2**20:.0f} MiB ({memory / args.recipes:.0f} bytes per recipe)"
+    )
+
+    for label, make in (
+        ("unrelated", lambda i: (None, synthetic_recipe(rng))),
+        ("variants", lambda i: (i + 1, variant(rng, *corpus[i]))),
+    ):
+        sign_times, check_times, candidates, found = [], [], 0, 0
+        for i in rng.sample(range(args.recipes), args.checks):
+            expected, (title, names) = make(i)
+            begin = time.perf_counter()
+            signature = recipe_signature(title, names)
+            signed = time.perf_counter()
+            duplicate = index.find_duplicate(signature)
+            sign_times.append(signed - begin)
+            check_times.append(time.perf_counter() - signed)
+            candidates += len(index._candidates(signature))
+            found += duplicate is not None if expected is None else duplicate == expected
+        sign, check = percentiles(sign_times), percentiles(check_times)
+        print(
+            f"{label:<10} signature p50/p99 {sign[0]:.0f}/{sign[1]:.0f} us  lookup p50/p99 {check[0]:.0f}/{check[1]:.0f} us  "
+            f"candidates {candidates / args.checks:.1f}  {'flagged' if expected is None else 'caught'} {found / args.checks:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
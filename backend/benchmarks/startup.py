@@ -0,0 +1,75 @@
+# backend/benchmarks/startup.py
+"""
+Worker boot time. Each run starts a fresh interpreter, so nothing is cached in
+sys.modules, and times `import main` and then the app's lifespan startup (database
+bootstrap, LISTEN connection, background tasks). It also imports the app with the
+database pointed at a closed port, which has to succeed: importing must not touch
+the database. Prints the median of --runs runs and exits with status 1 when a
+median exceeds --max-import / --max-startup, so it can guard boot time in CI.
+
+Run from the backend directory against a reachable database:
+    python -m benchmarks.startup [--runs 5] [--max-import 1.5] [--max-startup 1.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+
+async def boot():
+    start = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter() - start
+
+print(json.dumps({"import": imported, "startup": asyncio.run(boot())}))
+"""
+
+
+def run_probe(source: str, env: dict = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", source], capture_output=True, text=True, env={**os.environ, **(env or {})}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and startup time of a worker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import", type=float, default=None, help="Fail above this median, in seconds")
+    parser.add_argument("--max-startup", type=float, default=None, help="Fail above this median, in seconds")
+    args = parser.parse_args()
+
+    offline = run_probe("import main", {"DATABASE_IP": "127.0.0.1", "DATABASE_PORT": "1"})
+    print(f"import without a database:  {'ok' if offline.returncode == 0 else 'FAILED'}")
+    failed = offline.returncode != 0
+    if failed:
+        print(offline.stderr[-2000:])
+
+    timings = []
+    for _ in range(args.runs):
+        result = run_probe(PROBE)
+        if result.returncode != 0:
+            print(result.stderr[-2000:])
+            sys.exit(1)
+        timings.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    for phase, limit in (("import", args.max_import), ("startup", args.max_startup)):
+        values = [timing[phase] for timing in timings]
+        median = statistics.median(values)
+        verdict = ""
+        if limit is not None:
+            verdict = "  ok" if median <= limit else f"  FAILED (limit {limit:.2f}s)"
+            failed = failed or median > limit
+        print(f"{phase:<8} median={median:.3f}s  min={min(values):.3f}s  max={max(values):.3f}s{verdict}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
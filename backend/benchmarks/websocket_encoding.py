@@ -0,0 +1,76 @@
+# backend/benchmarks/websocket_encoding.py
+"""
+Bytes on the wire and server CPU per broadcast for each chat WebSocket encoding.
+A broadcast encodes the frame once per codec and hands it to every socket in the
+room, so CPU is measured per message, not per recipient.
+
+"+ permessage-deflate" rows emulate the transport extension uvicorn negotiates
+when the client offers it: one deflate stream per socket, with context takeover,
+so unlike the codec's own deflate its CPU is paid once per recipient.
+
+Needs no server:
+    python -m benchmarks.websocket_encoding [--messages 20000]
+"""
+from chat.protocol import CODECS
+from datetime import datetime, timedelta
+import argparse
+import random
+import statistics
+import time
+import zlib
+
+SENTENCES = [
+    "Wat kan ik vanavond koken met kipfilet en broccoli?",
+    "Probeer een roerbakschotel met knoflook, gember en sojasaus, klaar in 20 minuten.",
+    "Heb je een vegetarisch alternatief met linzen?",
+    "Ja: een linzencurry met spinazie en tomaat. Per portie ongeveer 450 kcal en 24 g eiwit.",
+    "Bedankt!",
+]
+WORDS = " ".join(SENTENCES).split()
+
+
+def sample_messages(count: int):
+    start = datetime(2025, 1, 1)
+    for index in range(count):
+        content = " ".join(random.choices(WORDS, k=random.randint(3, 80)))
+        yield {
+            "id": 1_000_000 + index,
+            "timestamp": (start + timedelta(seconds=index)).isoformat(),
+            "sender": random.choice(["assistant", "u4f2a91c0"]),
+            "content": content,
+            "type": random.choice(["message", "notification"]),
+        }
+
+
+def measure(codec, messages, per_message_deflate: bool):
+    compressor = zlib.compressobj(wbits=-15) if per_message_deflate else None
+    sizes = []
+    start = time.perf_counter()
+    for message in messages:
+        frame = codec.encode(message)
+        if compressor is not None:
+            raw = frame.encode() if isinstance(frame, str) else frame
+            frame = (compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+        sizes.append(len(frame))
+    elapsed = time.perf_counter() - start
+    return statistics.mean(sizes), sum(sizes), elapsed / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat WebSocket encoding benchmark")
+    parser.add_argument("--messages", type=int, default=20_000)
+    args = parser.parse_args()
+
+    random.seed(7)
+    messages = list(sample_messages(args.messages))
+
+    print(f"{'encoding':<42}{'bytes/frame':>12}{'total KiB':>12}{'us/broadcast':>14}")
+    for name, codec in CODECS.items():
+        for per_message_deflate in (False, True):
+            label = name + (" + permessage-deflate" if per_message_deflate else "")
+            mean_size, total, cpu = measure(codec, messages, per_message_deflate)
+            print(f"{label:<42}{mean_size:>12.1f}{total / 1024:>12.0f}{cpu:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
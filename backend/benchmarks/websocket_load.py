@@ -0,0 +1,80 @@
+# backend/benchmarks/websocket_load.py
+"""
+Load test for the chat WebSocket: opens CLIENTS sockets in each of the given rooms,
+has every client send MESSAGES frames and records how long each frame takes to reach
+the other sockets in its room. Run it against a build before and after a change and
+compare the p50/p99 lines.
+
+Run from the backend directory against a running server:
+    BENCH_TOKEN=<jwt> BENCH_CHAT_IDS=<id>,<id> python -m benchmarks.websocket_load
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+
+import websockets
+
+WS_URL = os.getenv("BENCH_WS_URL", "ws://127.0.0.1:8000/chat/room")
+TOKEN = os.getenv("BENCH_TOKEN", "")
+CHAT_IDS = [chat_id for chat_id in os.getenv("BENCH_CHAT_IDS", "").split(",") if chat_id]
+CLIENTS = int(os.getenv("BENCH_CLIENTS_PER_ROOM", 5))
+MESSAGES = int(os.getenv("BENCH_MESSAGES_PER_CLIENT", 50))
+SEND_INTERVAL = float(os.getenv("BENCH_SEND_INTERVAL", 0.01))
+
+
+async def run_client(chat_id: str, latencies: list, ready: asyncio.Barrier):
+    client_id = uuid.uuid4().hex[:8]
+    async with websockets.connect(f"{WS_URL}?chatid={chat_id}&token={TOKEN}") as ws:
+        async def receive():
+            while True:
+                frame = json.loads(await ws.recv())
+                content = frame.get("content", "")
+                if not content.startswith("bench:") or frame.get("type") != "message":
+                    continue
+                _, sender, sent_at = content.split(":")
+                if sender != client_id:
+                    latencies.append(time.perf_counter() - float(sent_at))
+
+        receiver = asyncio.create_task(receive())
+        await ready.wait()
+        for _ in range(MESSAGES):
+            await ws.send(f"bench:{client_id}:{time.perf_counter()}")
+            await asyncio.sleep(SEND_INTERVAL)
+        # Give the last frames time to arrive
+        await asyncio.sleep(1)
+        receiver.cancel()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def main():
+    if not TOKEN or not CHAT_IDS:
+        raise SystemExit("Set BENCH_TOKEN and BENCH_CHAT_IDS")
+
+    latencies: list = []
+    ready = asyncio.Barrier(CLIENTS * len(CHAT_IDS))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(chat_id, latencies, ready)
+        for chat_id in CHAT_IDS
+        for _ in range(CLIENTS)
+    ))
+    elapsed = time.perf_counter() - start
+
+    if not latencies:
+        raise SystemExit("No frames were delivered")
+    print(f"rooms={len(CHAT_IDS)} clients/room={CLIENTS} messages/client={MESSAGES} elapsed={elapsed:.1f}s")
+    print(f"delivered={len(latencies)}")
+    print(f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms "
+          f"mean={statistics.mean(latencies) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
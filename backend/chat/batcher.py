@@ -0,0 +1,119 @@
+# backend/chat/batcher.py
+from datetime import datetime as dt
+from typing import List, NamedTuple, Tuple
+from utils.database import chat_async_session
+from utils.models import ChatRoomManager
+from utils.metrics import register_collector
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("uvicorn")
+
+CHAT_WRITE_BATCHING = os.getenv("CHAT_WRITE_BATCHING", "false").lower() in ("1", "true", "yes")
+CHAT_BATCH_MAX_DELAY_MS = float(os.getenv("CHAT_BATCH_MAX_DELAY_MS", 5))
+CHAT_BATCH_MAX_ROWS = int(os.getenv("CHAT_BATCH_MAX_ROWS", 500))
+
+
+class StoredMessage(NamedTuple):
+    id: int
+    timestamp: dt
+
+
+class MessageBatcher:
+    """
+    Write-behind group commit for chat messages. Messages from every room are
+    gathered for up to `max_delay_ms` or `max_rows` and written in one multi-row
+    INSERT inside one transaction. `add` only returns once the batch holding the
+    message has committed, so callers acknowledge and broadcast durable messages.
+    """
+
+    def __init__(
+        self,
+        session_factory=chat_async_session,
+        max_delay_ms: float = CHAT_BATCH_MAX_DELAY_MS,
+        max_rows: int = CHAT_BATCH_MAX_ROWS,
+    ):
+        self.session_factory = session_factory
+        self.max_delay = max_delay_ms / 1000
+        self.max_rows = max_rows
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._timer = None
+        self._flushes = set()
+        self.batches = 0
+        self.rows = 0
+        self.failures = 0
+        self.row_failures = 0
+
+    async def add(self, chat_id, user_id: str, message: str) -> StoredMessage:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((chat_id, user_id, message, dt.utcnow()), future))
+
+        if len(self._pending) >= self.max_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[tuple, asyncio.Future]]):
+        try:
+            async with self.session_factory() as session:
+                stored = await session.run_sync(ChatRoomManager.add_messages, [row for row, _ in batch])
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Error writing chat message batch of {len(batch)}, retrying row by row: {e}")
+            # One bad row must not fail everyone else's messages in the batch
+            for row, future in batch:
+                await self._flush_row(row, future)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), (message_id, timestamp) in zip(batch, stored):
+            if not future.done():
+                future.set_result(StoredMessage(message_id, timestamp))
+
+    async def _flush_row(self, row: tuple, future: asyncio.Future):
+        try:
+            async with self.session_factory() as session:
+                (message_id, timestamp), = await session.run_sync(ChatRoomManager.add_messages, [row])
+        except Exception as e:
+            self.row_failures += 1
+            logger.error(f"Error writing chat message for chat {row[0]}: {e}")
+            if not future.done():
+                future.set_exception(e)
+            return
+        self.rows += 1
+        if not future.done():
+            future.set_result(StoredMessage(message_id, timestamp))
+
+    async def close(self):
+        """Flush whatever is pending and wait for in-flight batches."""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def metrics(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches_total": self.batches,
+            "rows_total": self.rows,
+            "failures_total": self.failures,
+            "row_failures_total": self.row_failures,
+        }
+
+
+message_batcher = MessageBatcher()
+register_collector("chat_batcher", message_batcher.metrics)
@@ -0,0 +1,126 @@
+# backend/chat/broadcast.py
+from fastapi import WebSocket
+from chat.protocol import CODECS, JSON, Frame
+from collections import deque
+from enum import Enum
+from typing import Callable, Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("uvicorn")
+
+
+class SlowConsumerPolicy(str, Enum):
+    drop_oldest = "drop_oldest"  # Discard the oldest queued frame to make room
+    coalesce = "coalesce"  # Replace the backlog with a single resync frame
+    evict = "evict"  # Close the socket so the client reconnects and resyncs
+
+
+SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", 64))
+SLOW_CONSUMER_POLICY = SlowConsumerPolicy(os.getenv("CHAT_SLOW_CONSUMER_POLICY", SlowConsumerPolicy.drop_oldest.value))
+
+# Tells a client that frames were skipped and it should call /sync-messages
+RESYNC_FRAMES = {name: codec.encode({"type": "resync"}) for name, codec in CODECS.items()}
+
+# Close code 1013: "try again later"
+EVICTED_CLOSE_CODE = 1013
+
+
+class BroadcastStats:
+    """Counters shared by every connection of a ConnectionManager."""
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.evicted = 0
+        self.send_errors = 0
+
+
+class ClientConnection:
+    """
+    A WebSocket with a bounded outbound queue drained by its own writer task, so
+    enqueueing a frame never waits on the network.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        room: str,
+        stats: BroadcastStats,
+        on_close: Optional[Callable[["ClientConnection"], None]] = None,
+        max_queue: int = SEND_QUEUE_SIZE,
+        policy: SlowConsumerPolicy = SLOW_CONSUMER_POLICY,
+        codec=JSON,
+    ):
+        self.websocket = websocket
+        self.room = room
+        self.stats = stats
+        self.on_close = on_close
+        self.max_queue = max_queue
+        self.policy = policy
+        self.codec = codec
+        self.resync_frame = RESYNC_FRAMES[codec.name]
+        self.queue: deque[Frame] = deque()
+        self.closed = False
+        self._evicted = False
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, frame: Frame):
+        """Queue a frame for delivery, applying the slow-consumer policy when the queue is full."""
+        if self.closed or self._evicted:
+            return
+
+        if len(self.queue) >= self.max_queue:
+            if self.policy == SlowConsumerPolicy.evict:
+                self.stats.evicted += 1
+                self.stats.dropped += len(self.queue) + 1
+                self.queue.clear()
+                self._evicted = True
+                self._ready.set()
+                return
+            if self.policy == SlowConsumerPolicy.coalesce:
+                self.stats.coalesced += 1
+                self.stats.dropped += sum(1 for queued in self.queue if queued is not self.resync_frame)
+                self.queue.clear()
+                self.queue.append(self.resync_frame)
+            else:
+                self.queue.popleft()
+                self.stats.dropped += 1
+
+        self.queue.append(frame)
+        self._ready.set()
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._ready.wait()
+                if self._evicted:
+                    await self.websocket.close(code=EVICTED_CLOSE_CODE)
+                    break
+                while self.queue:
+                    frame = self.queue.popleft()
+                    if self.codec.binary:
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+                    self.stats.sent += 1
+                if not self._evicted:
+                    self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats.send_errors += 1
+            logger.error(f"Error sending to WebSocket in room {self.room}: {e}")
+        finally:
+            self.closed = True
+            self.queue.clear()
+            if self.on_close:
+                self.on_close(self)
+
+    def close(self):
+        """Stop the writer task; queued frames are discarded."""
+        self.closed = True
+        self._writer.cancel()
@@ -0,0 +1,215 @@
+# backend/chat/broker.py
+from typing import Awaitable, Callable, List, Optional, Tuple
+from utils.database import LISTEN_RECONNECT_MAX_SECONDS, chat_db_url
+from utils.metrics import register_collector
+import asyncio
+import asyncpg
+import json
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger("uvicorn")
+
+# "local" for a single process, "postgres" when running several uvicorn workers
+CHAT_BROKER = os.getenv("CHAT_BROKER", "local")
+BROADCAST_CHANNEL = "chat_broadcast"
+
+# Identifies this process in published batches so it can skip its own echoes
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# NOTIFY payloads are capped at 8000 bytes; stay clear of it
+MAX_PAYLOAD_BYTES = 7000
+
+Deliver = Callable[[str, dict], Awaitable[None]]
+
+
+class LocalBroker:
+    """Stand-in for single-process deployments: there is nobody else to tell."""
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    def publish(self, room: str, message: dict):
+        pass
+
+    async def stop(self):
+        pass
+
+    def metrics(self) -> dict:
+        return {
+            "published_total": 0,
+            "received_total": 0,
+            "pending": 0,
+            "local_only_total": 0,
+            "connected": 1,
+            "reconnects_total": 0,
+        }
+
+
+class PostgresBroker:
+    """
+    Fans room broadcasts out to the other workers over LISTEN/NOTIFY. Everything
+    published during one event-loop tick is coalesced into as few NOTIFY payloads
+    as possible, and each payload carries the worker id so the sender ignores it.
+
+    A lost connection is re-established with backoff, like the LISTEN connection of
+    utils.database.NotificationManager. Meanwhile broadcasts only reach this
+    worker's sockets; the other workers' clients catch up through the NOTIFY of the
+    message insert or their next fetch.
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.connection: Optional[asyncpg.Connection] = None
+        self.deliver: Optional[Deliver] = None
+        self._pending: List[Tuple[str, dict]] = []
+        self._flush_scheduled = False
+        self._flush_lock = asyncio.Lock()
+        self._tasks = set()
+        self._reconnect_task = None
+        self._closing = False
+        self.published = 0
+        self.received = 0
+        self.local_only = 0
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.connection is not None and not self.connection.is_closed()
+
+    async def start(self, deliver: Deliver):
+        """Start listening; if the database can't be reached yet, keep retrying in the background."""
+        self.deliver = deliver
+        self._closing = False
+        if not await self._listen():
+            self._schedule_reconnect()
+
+    async def _listen(self) -> bool:
+        try:
+            connection = await asyncpg.connect(self.dsn)
+            await connection.add_listener(BROADCAST_CHANNEL, self._on_notify)
+            connection.add_termination_listener(self._on_terminated)
+        except Exception as e:
+            logger.error(f"Chat broker failed to connect: {e}")
+            return False
+        self.connection = connection
+        logger.info(f"Chat broker listening on '{BROADCAST_CHANNEL}' as worker {WORKER_ID}")
+        return True
+
+    async def stop(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self.connection:
+            connection, self.connection = self.connection, None
+            await connection.remove_listener(BROADCAST_CHANNEL, self._on_notify)
+            await connection.close()
+
+    def _on_terminated(self, connection):
+        if self._closing or connection is not self.connection:
+            return
+        logger.error("Chat broker lost its connection; broadcasts stay local until it reconnects")
+        self.connection = None
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._closing or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 0.5
+        while not self._closing:
+            await asyncio.sleep(delay)
+            if await self._listen():
+                self.reconnects += 1
+                return
+            delay = min(delay * 2, LISTEN_RECONNECT_MAX_SECONDS)
+
+    def publish(self, room: str, message: dict):
+        if not self.connected:
+            # The caller already delivered it to this worker's sockets
+            self.local_only += 1
+            return
+        self._pending.append((room, message))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._schedule_flush)
+
+    def _schedule_flush(self):
+        self._flush_scheduled = False
+        self._track(asyncio.ensure_future(self._flush()))
+
+    async def _flush(self):
+        events, self._pending = self._pending, []
+        if not events:
+            return
+        if not self.connected:
+            self.local_only += len(events)
+            return
+
+        payloads, batch, size = [], [], 0
+        for room, message in events:
+            event = json.dumps([room, message], separators=(",", ":"))
+            if len(event) > MAX_PAYLOAD_BYTES:
+                # Too big for NOTIFY: receivers load it by id instead
+                event = json.dumps([room, {"id": message.get("id")}], separators=(",", ":"))
+            if batch and size + len(event) > MAX_PAYLOAD_BYTES:
+                payloads.append(batch)
+                batch, size = [], 0
+            batch.append(event)
+            size += len(event) + 1
+
+        if batch:
+            payloads.append(batch)
+
+        async with self._flush_lock:
+            try:
+                await self.connection.executemany(
+                    "SELECT pg_notify($1, $2)",
+                    [(BROADCAST_CHANNEL, f'{{"w":"{WORKER_ID}","e":[{",".join(batch)}]}}') for batch in payloads],
+                )
+                self.published += len(events)
+            except Exception as e:
+                logger.error(f"Error publishing chat broadcast batch: {e}")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            batch = json.loads(payload)
+        except ValueError:
+            logger.error("Malformed chat broadcast payload")
+            return
+        if batch.get("w") == WORKER_ID:
+            return
+        for room, message in batch.get("e", []):
+            self.received += 1
+            self._track(asyncio.ensure_future(self.deliver(room, message)))
+
+    def _track(self, task: asyncio.Task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def metrics(self) -> dict:
+        return {
+            "published_total": self.published,
+            "received_total": self.received,
+            "pending": len(self._pending),
+            "local_only_total": self.local_only,
+            "connected": int(self.connected),
+            "reconnects_total": self.reconnects,
+        }
+
+
+def create_broker():
+    if CHAT_BROKER == "postgres":
+        return PostgresBroker(chat_db_url)
+    if CHAT_BROKER != "local":
+        raise ValueError(f"Unknown CHAT_BROKER '{CHAT_BROKER}', expected 'local' or 'postgres'")
+    return LocalBroker()
+
+
+chat_broker = create_broker()
+register_collector("chat_broker", chat_broker.metrics)
@@ -0,0 +1,278 @@
+# backend/chat/cache.py
+from fastapi.concurrency import run_in_threadpool
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from utils.database import chat_session, notification_manager
+from utils.models import ChatRoomManager, chat_uuid
+from utils.metrics import register_collector
+import asyncio
+import logging
+import os
+import threading
+
+logger = logging.getLogger("uvicorn")
+
+CHAT_CACHE_MESSAGES_PER_CHAT = int(os.getenv("CHAT_CACHE_MESSAGES_PER_CHAT", 100))
+CHAT_CACHE_MAX_CHATS = int(os.getenv("CHAT_CACHE_MAX_CHATS", 10000))
+CHAT_CACHE_MAX_BYTES = int(os.getenv("CHAT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Rough per-message overhead of the tuple, ints and datetime on top of the strings
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+class CachedMessage(NamedTuple):
+    id: int
+    user_id: str
+    message: str
+    timestamp: datetime
+
+
+def _key(chat_id) -> str:
+    # NOTIFY payloads carry the canonical form, so every key must use it too
+    return str(chat_uuid(chat_id))
+
+
+def _message_size(message: CachedMessage) -> int:
+    return MESSAGE_OVERHEAD_BYTES + len(message.user_id) + len(message.message)
+
+
+class ChatBuffer:
+    """The newest messages of one chat, in id order. `complete` means it holds the whole chat."""
+
+    def __init__(self, maxlen: int):
+        self.messages: deque[CachedMessage] = deque()
+        self.maxlen = maxlen
+        self.complete = False
+        self.size = 0
+
+    def add(self, message: CachedMessage) -> int:
+        """Insert a message in id order and return the change in size."""
+        if any(cached.id == message.id for cached in reversed(self.messages)):
+            return 0
+        delta = _message_size(message)
+        if self.messages and message.id < self.messages[-1].id:
+            position = next(i for i, cached in enumerate(self.messages) if cached.id > message.id)
+            if position == 0 and not self.complete:
+                # Older than everything we hold: we can't tell what sits in between
+                return 0
+            self.messages.insert(position, message)
+        else:
+            self.messages.append(message)
+        while len(self.messages) > self.maxlen:
+            delta -= _message_size(self.messages.popleft())
+            self.complete = False
+        self.size += delta
+        return delta
+
+
+class RecentMessageCache:
+    """
+    Per-chat ring buffers of the most recent messages with an LRU over chats and a
+    memory cap. A chat is only cached once a read has primed it with the newest page
+    from the database; after that the write path and the NOTIFY dispatcher keep it
+    current, so recent-page and `since` queries don't need the database.
+
+    A chat is subscribed to only once primed, so a message another process commits
+    while a page is being read reaches no subscriber. Every NOTIFY therefore counts
+    as a write to its chat, and `prime` refuses a page read before the latest one.
+
+    Those notifications are what keeps the cache right, so nothing is cached while
+    the LISTEN connection is down and everything is dropped when it goes down or
+    comes back. Deleted chats are dropped on every worker through chat_invalidate.
+    """
+
+    def __init__(
+        self,
+        per_chat: int = CHAT_CACHE_MESSAGES_PER_CHAT,
+        max_chats: int = CHAT_CACHE_MAX_CHATS,
+        max_bytes: int = CHAT_CACHE_MAX_BYTES,
+    ):
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self._chats: "OrderedDict[str, ChatBuffer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # Write sequence numbers, used to refuse priming with a snapshot a write raced past
+        self._write_seq = 0
+        self._last_writes: "OrderedDict[str, int]" = OrderedDict()
+        # Reads that started before the last clear() can't prime
+        self._cleared_seq = 0
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def read_token(self) -> int:
+        """Take before reading a page from the database and hand to `prime`."""
+        return self._write_seq
+
+    def prime(self, chat_id: str, messages, complete: bool, token: int):
+        """Seed a chat with the newest page read from the database."""
+        if not notification_manager.listening:
+            # Nothing would keep it current
+            return
+        chat_id = _key(chat_id)
+        with self._lock:
+            if self._last_writes.get(chat_id, -1) > token or self._cleared_seq > token:
+                return
+            buffer = ChatBuffer(self.per_chat)
+            for message in messages:
+                buffer.add(CachedMessage(message.id, message.user_id, message.message, message.timestamp))
+            buffer.complete = complete and len(buffer.messages) == len(messages)
+
+            current = self._chats.get(chat_id)
+            if current is not None:
+                # Only replace a buffer with one that reaches further back
+                if current.complete or len(current.messages) >= len(buffer.messages):
+                    return
+                self._bytes -= current.size
+            self._chats[chat_id] = buffer
+            self._bytes += buffer.size
+            self._evict()
+            primed = chat_id in self._chats
+        if primed:
+            notification_manager.subscribe(chat_id, self.on_notification)
+
+    def append(self, chat_id: str, message: CachedMessage):
+        """Record a message that was just written or announced."""
+        chat_id = _key(chat_id)
+        with self._lock:
+            self._record_write(chat_id)
+            buffer = self._chats.get(chat_id)
+            if buffer is None:
+                return
+            self._bytes += buffer.add(message)
+            self._evict()
+
+    def on_remote_write(self, chat_id: str, message_id: str):
+        # Called for every new_message NOTIFY, also for chats that aren't cached (yet)
+        chat_id = _key(chat_id)
+        with self._lock:
+            self._record_write(chat_id)
+
+    def _record_write(self, chat_id: str):
+        # Called with the lock held
+        self._write_seq += 1
+        self._last_writes[chat_id] = self._write_seq
+        self._last_writes.move_to_end(chat_id)
+        while len(self._last_writes) > self.max_chats:
+            self._last_writes.popitem(last=False)
+
+    def get(self, chat_id: str, message_id: int) -> Optional[CachedMessage]:
+        chat_id = _key(chat_id)
+        with self._lock:
+            buffer = self._chats.get(chat_id)
+            if buffer is None:
+                return None
+            return next((message for message in buffer.messages if message.id == message_id), None)
+
+    def recent(self, chat_id: str, limit: int) -> Optional[List[CachedMessage]]:
+        """The newest `limit` messages, oldest first, or None on a miss."""
+        chat_id = _key(chat_id)
+        with self._lock:
+            buffer = self._chats.get(chat_id)
+            if buffer is None or (len(buffer.messages) < limit and not buffer.complete):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._chats.move_to_end(chat_id)
+            return list(buffer.messages)[-limit:]
+
+    def since(self, chat_id: str, timestamp: datetime) -> Optional[List[CachedMessage]]:
+        """Messages newer than `timestamp`, or None if the buffer may not reach back that far."""
+        chat_id = _key(chat_id)
+        with self._lock:
+            buffer = self._chats.get(chat_id)
+            if buffer is None or not (buffer.complete or (buffer.messages and buffer.messages[0].timestamp <= timestamp)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._chats.move_to_end(chat_id)
+            return [message for message in buffer.messages if message.timestamp > timestamp]
+
+    def invalidate(self, chat_id: str):
+        chat_id = _key(chat_id)
+        with self._lock:
+            buffer = self._chats.pop(chat_id, None)
+            if buffer is not None:
+                self._bytes -= buffer.size
+            self._write_seq += 1
+            self._last_writes[chat_id] = self._write_seq
+        if buffer is not None:
+            notification_manager.unsubscribe(chat_id, self.on_notification)
+
+    def clear(self):
+        """Drop every cached chat, e.g. because notifications may have been missed."""
+        with self._lock:
+            chats, self._chats = self._chats, OrderedDict()
+            self._bytes = 0
+            self._write_seq += 1
+            self._cleared_seq = self._write_seq
+        for chat_id in chats:
+            notification_manager.unsubscribe(chat_id, self.on_notification)
+        if chats:
+            logger.info(f"Cleared {len(chats)} chats from the message cache")
+
+    def _evict(self):
+        # Called with the lock held
+        while self._chats and (len(self._chats) > self.max_chats or self._bytes > self.max_bytes):
+            chat_id, buffer = self._chats.popitem(last=False)
+            self._bytes -= buffer.size
+            self.evictions += 1
+            notification_manager.unsubscribe(chat_id, self.on_notification)
+
+    async def resolve(self, chat_id: str, message_id: int) -> Optional[CachedMessage]:
+        """
+        Return a message by id from the cache, or load it once from the database and
+        cache it. Concurrent callers for the same message share one query.
+        """
+        chat_id = _key(chat_id)
+        cached = self.get(chat_id, message_id)
+        if cached is not None:
+            return cached
+
+        key = (chat_id, message_id)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await inflight
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            def fetch_message():
+                with chat_session() as chat_db:
+                    return ChatRoomManager.get_message_by_id(chat_db, chat_id, message_id)
+
+            row = await run_in_threadpool(fetch_message)
+            message = CachedMessage(row.id, row.user_id, row.message, row.timestamp) if row else None
+            if message is not None:
+                self.append(chat_id, message)
+            future.set_result(message)
+            return message
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def on_notification(self, chat_id: str, message_id: str):
+        # Keeps primed chats current with writes made by other processes
+        await self.resolve(chat_id, int(message_id))
+
+    def metrics(self) -> dict:
+        return {
+            "chats": len(self._chats),
+            "bytes": self._bytes,
+            "hits_total": self.hits,
+            "misses_total": self.misses,
+            "evictions_total": self.evictions,
+        }
+
+
+message_cache = RecentMessageCache()
+notification_manager.on_message(message_cache.on_remote_write)
+notification_manager.on_invalidate(message_cache.invalidate)
+notification_manager.on_reset(message_cache.clear)
+register_collector("chat_cache", message_cache.metrics)
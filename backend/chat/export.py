@@ -0,0 +1,88 @@
+# backend/chat/export.py
+from fastapi.responses import StreamingResponse
+from utils.database import chat_session
+from utils.models import ChatRoomManager
+from utils.schemas import ExportFormat
+from typing import Iterable, Iterator
+import csv
+import heapq
+import io
+import json
+import logging
+import os
+
+logger = logging.getLogger("uvicorn")
+
+# Rows fetched per round trip of the server-side cursor, and per chunk written out
+EXPORT_BATCH_SIZE = int(os.getenv("CHAT_EXPORT_BATCH_SIZE", 1000))
+
+EXPORT_FIELDS = ("chat_id", "id", "user_id", "message", "timestamp")
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def _render(rows, fmt: ExportFormat) -> str:
+    if fmt == ExportFormat.csv:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            (str(row.chat_id), row.id, row.user_id, row.message, row.timestamp.isoformat()) for row in rows
+        )
+        return buffer.getvalue()
+    return "".join(
+        json.dumps({
+            "chat_id": str(row.chat_id),
+            "id": row.id,
+            "user_id": row.user_id,
+            "message": row.message,
+            "timestamp": row.timestamp.isoformat(),
+        }, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def export_chunks(chat_ids: Iterable, fmt: ExportFormat, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """
+    Render the messages of the given chats in `batch_size` chunks. Uses its own
+    session, because the request's session is closed before a streamed body is sent.
+    Archived chats are read from their archive and are not restored. Both reads share
+    one snapshot, so a chat archived or restored meanwhile is exported exactly once.
+    """
+    chat_ids = list(chat_ids)
+    if fmt == ExportFormat.csv:
+        yield ",".join(EXPORT_FIELDS) + "\r\n"
+    if not chat_ids:
+        return
+
+    session = chat_session()
+    try:
+        session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        rows = heapq.merge(
+            ChatRoomManager.stream_archived_messages(session, chat_ids),
+            ChatRoomManager.stream_messages(session, chat_ids, batch_size),
+            key=lambda row: (row.chat_id, row.id),
+        )
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield _render(batch, fmt)
+                batch.clear()
+        if batch:
+            yield _render(batch, fmt)
+    except Exception as e:
+        # Headers are already sent, so all we can do is cut the stream short
+        logger.error(f"Error exporting chats: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def export_response(chat_ids: Iterable, fmt: ExportFormat, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        export_chunks(chat_ids, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt.value}"'},
+    )
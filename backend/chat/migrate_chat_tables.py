@@ -0,0 +1,108 @@
+# backend/chat/migrate_chat_tables.py
+"""
+Copy the legacy per-chat `chat_<uuid>` tables into the partitioned `chat_messages`
+table, BATCH_SIZE rows per transaction. Progress is recorded in
+`chat_migration_progress` inside the same transaction as each batch, so the tool
+can be stopped and re-run at any point without duplicating messages.
+
+Run from the backend directory:
+    python -m chat.migrate_chat_tables [--batch-size 5000] [--drop]
+"""
+from sqlalchemy import insert, text
+from utils.database import chat_engine
+from utils.models import chat_metadata, chat_messages, legacy_chat_tables
+import argparse
+import logging
+import uuid
+
+logger = logging.getLogger("uvicorn")
+logging.basicConfig(level=logging.INFO)
+
+LEGACY_TABLE_PATTERN = r"^chat_[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
+
+
+def ensure_progress_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS chat_migration_progress ("
+        " table_name TEXT PRIMARY KEY,"
+        " last_id INTEGER NOT NULL DEFAULT 0,"
+        " done BOOLEAN NOT NULL DEFAULT FALSE)"
+    ))
+
+
+def list_legacy_tables(conn):
+    rows = conn.execute(
+        text("SELECT tablename FROM pg_tables WHERE schemaname = 'public' AND tablename ~ :pattern ORDER BY tablename"),
+        {"pattern": LEGACY_TABLE_PATTERN},
+    )
+    return [row.tablename for row in rows]
+
+
+def migrate_table(table_name: str, batch_size: int) -> int:
+    """Stream one legacy table into chat_messages in keyset-ordered batches."""
+    chat_id = uuid.UUID(table_name[len("chat_"):])
+    legacy = legacy_chat_tables.get(chat_id)
+    copied = 0
+
+    with chat_engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO chat_migration_progress (table_name) VALUES (:name) ON CONFLICT DO NOTHING"),
+            {"name": table_name},
+        )
+
+    while True:
+        with chat_engine.begin() as conn:
+            progress = conn.execute(
+                text("SELECT last_id, done FROM chat_migration_progress WHERE table_name = :name FOR UPDATE"),
+                {"name": table_name},
+            ).one()
+            if progress.done:
+                return copied
+
+            rows = conn.execute(
+                legacy.batch, {"last_id": progress.last_id, "batch_size": batch_size}
+            ).fetchall()
+
+            if not rows:
+                conn.execute(
+                    text("UPDATE chat_migration_progress SET done = TRUE WHERE table_name = :name"),
+                    {"name": table_name},
+                )
+                return copied
+
+            # Historical messages must not wake up connected clients
+            conn.execute(text("SET LOCAL chat.skip_notify = 'on'"))
+            conn.execute(insert(chat_messages), [
+                {"chat_id": chat_id, "user_id": row.user_id, "message": row.message, "timestamp": row.timestamp}
+                for row in rows
+            ])
+            conn.execute(
+                text("UPDATE chat_migration_progress SET last_id = :last_id WHERE table_name = :name"),
+                {"last_id": rows[-1].id, "name": table_name},
+            )
+            copied += len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate chat_<id> tables into chat_messages")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop", action="store_true", help="Drop each legacy table once it is fully copied")
+    args = parser.parse_args()
+
+    chat_metadata.create_all(bind=chat_engine)
+    with chat_engine.begin() as conn:
+        ensure_progress_table(conn)
+        tables = list_legacy_tables(conn)
+
+    logger.info(f"Found {len(tables)} legacy chat tables")
+    for table_name in tables:
+        copied = migrate_table(table_name, args.batch_size)
+        logger.info(f"Copied {copied} messages from {table_name}")
+        if args.drop:
+            with chat_engine.begin() as conn:
+                conn.execute(text(f'DROP TABLE "{table_name}"'))
+            logger.info(f"Dropped {table_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# backend/chat/protocol.py
+"""
+Wire encodings for the chat WebSocket. JSON text frames stay the default; clients on
+slow networks can ask for MessagePack binary frames with short keys, optionally
+deflated, either through the WebSocket subprotocol or the `protocol` query param:
+
+    Sec-WebSocket-Protocol: foodmate.msgpack          (or ?protocol=msgpack)
+    Sec-WebSocket-Protocol: foodmate.msgpack.deflate  (or ?protocol=msgpack.deflate)
+
+MessagePack frames are maps with these keys:
+    i  message id                  s  sender
+    t  timestamp (msgpack Timestamp)  c  content
+    y  type: 0 message, 1 notification, 2 resync
+
+Deflated frames start with one flag byte: 0x00 when the rest is plain MessagePack,
+0x01 when it is raw deflate (wbits=-15). Only frames over DEFLATE_MIN_BYTES are
+compressed, small ones are not worth it. A client frame that does not decode to
+text, or inflates past MAX_FRAME_BYTES, raises ProtocolError.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Optional, Union
+import json
+import os
+import zlib
+
+import msgpack
+
+DEFLATE_MIN_BYTES = int(os.getenv("CHAT_DEFLATE_MIN_BYTES", 256))
+MAX_FRAME_BYTES = int(os.getenv("CHAT_MAX_FRAME_BYTES", 64 * 1024))
+
+SHORT_KEYS = {"id": "i", "timestamp": "t", "sender": "s", "content": "c", "type": "y"}
+MESSAGE_TYPES = {"message": 0, "notification": 1, "resync": 2}
+
+Frame = Union[str, bytes]
+
+
+class ProtocolError(ValueError):
+    """A client frame that can't be decoded; `code` is the WebSocket close code to answer with."""
+
+    def __init__(self, message: str, code: int = 1007):
+        super().__init__(message)
+        self.code = code
+
+
+class JsonCodec:
+    """The original protocol: one JSON object per text frame."""
+
+    name = "json"
+    binary = False
+
+    def encode(self, message: dict) -> Frame:
+        return json.dumps(message)
+
+    def decode(self, frame: Frame) -> str:
+        if isinstance(frame, str):
+            return frame
+        try:
+            return frame.decode()
+        except UnicodeDecodeError:
+            raise ProtocolError("Binary frame is not UTF-8")
+
+
+class MsgpackCodec:
+    """MessagePack binary frames with short keys, optionally deflated."""
+
+    binary = True
+
+    def __init__(self, deflate: bool = False):
+        self.deflate = deflate
+        self.name = "msgpack.deflate" if deflate else "msgpack"
+
+    def encode(self, message: dict) -> Frame:
+        packed = {}
+        for key, value in message.items():
+            if key == "timestamp" and isinstance(value, str):
+                # Stored timestamps are naive UTC
+                value = msgpack.Timestamp.from_datetime(datetime.fromisoformat(value).replace(tzinfo=timezone.utc))
+            elif key == "type":
+                value = MESSAGE_TYPES.get(value, value)
+            packed[SHORT_KEYS.get(key, key)] = value
+        frame = msgpack.packb(packed)
+        if not self.deflate:
+            return frame
+        if len(frame) < DEFLATE_MIN_BYTES:
+            return b"\x00" + frame
+        compressor = zlib.compressobj(wbits=-15)
+        return b"\x01" + compressor.compress(frame) + compressor.flush()
+
+    def decode(self, frame: Frame) -> str:
+        """Message content sent by the client: a text frame, or a binary frame holding {"c": content}."""
+        if isinstance(frame, str):
+            return frame
+        if self.deflate:
+            frame = self._inflate(frame[1:]) if frame[:1] == b"\x01" else frame[1:]
+        try:
+            message = msgpack.unpackb(frame)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise ProtocolError(f"Invalid MessagePack frame: {e}")
+        if not isinstance(message, dict) or not isinstance(message.get("c"), str):
+            # Only text is stored; anything else would fail the whole write batch
+            raise ProtocolError("Frame has no text content", code=1003)
+        return message["c"]
+
+    @staticmethod
+    def _inflate(data: bytes) -> bytes:
+        # Bounded, so a small frame can't inflate into gigabytes
+        decompressor = zlib.decompressobj(wbits=-15)
+        try:
+            frame = decompressor.decompress(data, MAX_FRAME_BYTES)
+        except zlib.error as e:
+            raise ProtocolError(f"Invalid deflate data: {e}")
+        if decompressor.unconsumed_tail:
+            raise ProtocolError(f"Frame inflates past {MAX_FRAME_BYTES} bytes", code=1009)
+        return frame
+
+
+JSON = JsonCodec()
+CODECS: Dict[str, Union[JsonCodec, MsgpackCodec]] = {
+    codec.name: codec for codec in (JSON, MsgpackCodec(), MsgpackCodec(deflate=True))
+}
+SUBPROTOCOL_PREFIX = "foodmate."
+
+
+def negotiate(subprotocols: list, requested: Optional[str]):
+    """
+    Pick the codec for a new socket. Returns (codec, subprotocol to echo back or None).
+    The first subprotocol we support wins; otherwise the query param; otherwise JSON.
+    """
+    for subprotocol in subprotocols:
+        if subprotocol.startswith(SUBPROTOCOL_PREFIX):
+            codec = CODECS.get(subprotocol[len(SUBPROTOCOL_PREFIX):])
+            if codec is not None:
+                return codec, subprotocol
+    return CODECS.get(requested or JSON.name, JSON), None
@@ -0,0 +1,143 @@
+# backend/chat/retention.py
+"""
+Chat retention. Chats idle for CHAT_ARCHIVE_AFTER_DAYS (no metadata change and no
+message) are moved out of chat_messages into one compressed chat_archives row each,
+which keeps the hot table, and its indexes, small enough to stay in shared_buffers.
+Archived chats are restored transparently the first time their history is read.
+With CHAT_ARCHIVE_RETENTION_DAYS set, archives older than that are deleted for good,
+together with the chat itself.
+
+Work is done one chat (archiving) or CHAT_RETENTION_BATCH_SIZE chats (purging) per
+transaction, with a short pause in between, so it never holds long locks. Only one
+worker runs it at a time, guarded by an advisory lock.
+
+Runs periodically inside the app when CHAT_ARCHIVE_AFTER_DAYS > 0, or once by hand
+from the backend directory:
+    python -m chat.retention
+"""
+from datetime import datetime as dt, timedelta
+from sqlalchemy import text
+from fastapi.concurrency import run_in_threadpool
+from utils.database import chat_engine, chat_session, general_session
+from utils.models import ChatRoomManager, ChatsMetadata
+from utils.metrics import register_collector
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("uvicorn")
+
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", 0))  # 0 disables archiving
+CHAT_ARCHIVE_RETENTION_DAYS = int(os.getenv("CHAT_ARCHIVE_RETENTION_DAYS", 0))  # 0 keeps archives forever
+CHAT_RETENTION_INTERVAL_MINUTES = float(os.getenv("CHAT_RETENTION_INTERVAL_MINUTES", 60))
+CHAT_RETENTION_BATCH_SIZE = int(os.getenv("CHAT_RETENTION_BATCH_SIZE", 100))
+CHAT_RETENTION_PAUSE_MS = float(os.getenv("CHAT_RETENTION_PAUSE_MS", 10))
+
+# pg_try_advisory_lock key shared by every worker
+RETENTION_LOCK_ID = 7_310_014
+
+
+class RetentionStats:
+    def __init__(self):
+        self.runs = 0
+        self.chats_archived = 0
+        self.messages_archived = 0
+        self.chats_restored = 0
+        self.chats_purged = 0
+
+    def metrics(self):
+        return {
+            "runs_total": self.runs,
+            "chats_archived_total": self.chats_archived,
+            "messages_archived_total": self.messages_archived,
+            "chats_restored_total": self.chats_restored,
+            "chats_purged_total": self.chats_purged,
+        }
+
+
+retention_stats = RetentionStats()
+register_collector("chat_retention", retention_stats.metrics)
+
+
+def restore_if_archived(chat_db, chat_id) -> bool:
+    """Bring an archived chat back into chat_messages; False when it was not archived."""
+    restored = ChatRoomManager.restore_chat(chat_db, chat_id)
+    if restored is None:
+        return False
+    retention_stats.chats_restored += 1
+    logger.info(f"Restored {restored} archived messages of chat {chat_id}")
+    return True
+
+
+def archive_idle_chats(general_db, chat_db, cutoff: dt) -> int:
+    """Archive every chat idle since `cutoff`; returns the number of chats archived."""
+    archived = 0
+    after_id = None
+    while True:
+        query = general_db.query(ChatsMetadata.id).filter(ChatsMetadata.last_activity < cutoff)
+        if after_id is not None:
+            query = query.filter(ChatsMetadata.id > after_id)
+        candidates = [row.id for row in query.order_by(ChatsMetadata.id).limit(CHAT_RETENTION_BATCH_SIZE).all()]
+        if not candidates:
+            return archived
+        after_id = candidates[-1]
+
+        for chat_id in ChatRoomManager.idle_chat_ids(chat_db, candidates, cutoff):
+            retention_stats.messages_archived += ChatRoomManager.archive_chat(chat_db, chat_id)
+            retention_stats.chats_archived += 1
+            archived += 1
+            time.sleep(CHAT_RETENTION_PAUSE_MS / 1000)
+
+
+def purge_expired_archives(general_db, chat_db, archived_before: dt) -> int:
+    """Delete archives older than `archived_before` and their chats; returns the number purged."""
+    purged = 0
+    while True:
+        chat_ids = ChatRoomManager.purge_archives(chat_db, archived_before, CHAT_RETENTION_BATCH_SIZE)
+        if not chat_ids:
+            return purged
+        general_db.query(ChatsMetadata).filter(ChatsMetadata.id.in_(chat_ids)).delete(synchronize_session=False)
+        general_db.commit()
+        purged += len(chat_ids)
+        retention_stats.chats_purged += len(chat_ids)
+        time.sleep(CHAT_RETENTION_PAUSE_MS / 1000)
+
+
+def run_retention(archive_after_days: int = CHAT_ARCHIVE_AFTER_DAYS, retention_days: int = CHAT_ARCHIVE_RETENTION_DAYS):
+    """One retention pass. Returns (archived, purged), or None when another worker holds the lock."""
+    with chat_engine.connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": RETENTION_LOCK_ID}).scalar():
+            return None
+        general_db = general_session()
+        chat_db = chat_session()
+        try:
+            now = dt.utcnow()
+            archived = archive_idle_chats(general_db, chat_db, now - timedelta(days=archive_after_days))
+            purged = 0
+            if retention_days > 0:
+                purged = purge_expired_archives(general_db, chat_db, now - timedelta(days=retention_days))
+            retention_stats.runs += 1
+            logger.info(f"Chat retention: archived {archived} chats, purged {purged} archives")
+            return archived, purged
+        finally:
+            general_db.close()
+            chat_db.close()
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": RETENTION_LOCK_ID})
+
+
+async def retention_loop():
+    """Run a retention pass every CHAT_RETENTION_INTERVAL_MINUTES, off the event loop."""
+    while True:
+        try:
+            await run_in_threadpool(run_retention)
+        except Exception as e:
+            logger.error(f"Error during chat retention: {e}")
+        await asyncio.sleep(CHAT_RETENTION_INTERVAL_MINUTES * 60)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if CHAT_ARCHIVE_AFTER_DAYS <= 0:
+        raise SystemExit("Set CHAT_ARCHIVE_AFTER_DAYS to archive chats")
+    run_retention()
@@ -1,88 +1,175 @@
 # backend/chat/routes.py
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import inspect, select
-from utils.schemas import (UserRead, CreateChatSchema, ChatSummary,ChatResponseSchema, UpdateChatMetadata,ChatMessageRead)
-from utils.models import User, ChatsMetadata,ChatRoomManager, create_chat_model
-from utils.database import Base, notification_manager, chat_session, general_session
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, BackgroundTasks, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select
+from utils.schemas import (UserRead, CreateChatSchema, ChatSummary,ChatResponseSchema, UpdateChatMetadata,ChatMessageRead, ChatSearchResult, ChatMessagePreview, ExportFormat)
+from utils.models import User, ChatsMetadata,ChatRoomManager, chat_uuid
+from utils.database import notification_manager, chat_async_session, get_chat_db, get_general_db
+from utils.replicas import get_chat_read_db, get_general_read_db, read_your_writes
 from utils.authutils import verify_token, get_current_user
-from utils.openai import process_openai_tasks, llm_model
-from typing import List
+from utils.openai import get_openai_client, process_openai_tasks, llm_model
+from utils.metrics import register_collector
+from utils.pagination import decode_cursor, set_next_cursor
+from chat.broadcast import BroadcastStats, ClientConnection
+from chat.protocol import JSON, ProtocolError, negotiate
+from chat.cache import CachedMessage, message_cache
+from chat.broker import chat_broker
+from chat.batcher import CHAT_WRITE_BATCHING, message_batcher
+from chat.export import export_response
+from chat.retention import restore_if_archived
+from collections import deque
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime as dt
-from openai import OpenAI
-import openai
 import uuid
-import json
 import logging
-import os
 
 # Set up logging
 logger = logging.getLogger("uvicorn")
-openai.log = logger
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
 router = APIRouter()
 
+DELIVERED_IDS_PER_ROOM = 256
+
 def generate_room_id():
     return uuid.uuid4().hex
 
 
-# General database connection
-def get_general_db():
-    db = general_session()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-# Chat database connection
-def get_chat_db():
-    db = chat_session()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: dict[str, List[WebSocket]] = {}
+        self.active_connections: dict[str, dict[WebSocket, ClientConnection]] = {}
+        self.stats = BroadcastStats()
+        # Ids recently delivered per room; a message can arrive both from the broker and from NOTIFY
+        self.delivered: dict[str, tuple[deque, set]] = {}
 
-    async def connect(self, websocket: WebSocket, room: str):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, room: str, codec=JSON, subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
         if room not in self.active_connections:
-            self.active_connections[room] = []
-        self.active_connections[room].append(websocket)
+            self.active_connections[room] = {}
+            self.delivered[room] = (deque(maxlen=DELIVERED_IDS_PER_ROOM), set())
+            # One subscription per room, shared by every socket in it
+            notification_manager.subscribe(room, self.handle_notification)
+        self.active_connections[room][websocket] = ClientConnection(
+            websocket, room, self.stats, on_close=self._on_client_closed, codec=codec
+        )
 
     def disconnect(self, websocket: WebSocket, room: str):
-        self.active_connections[room].remove(websocket)
-        if not self.active_connections[room]:
+        connections = self.active_connections.get(room)
+        if not connections or websocket not in connections:
+            return
+        connections.pop(websocket).close()
+        if not connections:
             del self.active_connections[room]
+            del self.delivered[room]
+            notification_manager.unsubscribe(room, self.handle_notification)
+
+    def _on_client_closed(self, client: ClientConnection):
+        # Writer task ended (send error or eviction): stop routing frames to it
+        self.disconnect(client.websocket, client.room)
 
-    async def broadcast(self, message: str, room: str):
-        # Use self.active_connections instead of self.rooms
-        for connection in self.active_connections.get(room, []):
-            await connection.send_text(message)
+    def _already_delivered(self, room: str, message_id) -> bool:
+        # A room without a delivered entry has no sockets left, so there is nothing to do either
+        return room not in self.delivered or (message_id is not None and message_id in self.delivered[room][1])
 
-    async def broadcast_to_others(self, sender: WebSocket, message: str, room: str):
+    def _record_delivery(self, room: str, message_id):
+        order, seen = self.delivered[room]
+        if len(order) == order.maxlen:
+            seen.discard(order[0])
+        order.append(message_id)
+        seen.add(message_id)
+
+    async def handle_notification(self, room: str, message_id: str):
+        """A message was inserted into this chat, possibly by another process."""
+        await self.deliver(room, {"id": int(message_id), "type": "notification"})
+
+    async def deliver(self, room: str, message: dict, exclude: Optional[WebSocket] = None):
         """
-        Broadcast a message to all clients in a room except the sender.
+        Queue a message for every socket of a room held by this worker, at most once per
+        message id. Messages that only carry an id are loaded through the message cache.
         """
-        for connection in self.active_connections.get(room, []):
-            if connection != sender:
-                try:
-                    await connection.send_text(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting message: {e}")
-                    await self.disconnect(connection, room)
+        try:
+            message_id = message.get("id")
+            # Before loading, so a message that already went out costs no lookup
+            if room not in self.active_connections or self._already_delivered(room, message_id):
+                return
+
+            if "content" not in message:
+                stored = await message_cache.resolve(room, message_id)
+                if stored is None:
+                    return
+                message = {
+                    "id": stored.id,
+                    "timestamp": stored.timestamp.isoformat(),
+                    "sender": stored.user_id,
+                    "content": stored.message,
+                    "type": message.get("type", "notification"),
+                }
+
+                # Again after the await: the writer's own broadcast, which excludes the sender, may have gone out
+                if self._already_delivered(room, message_id):
+                    return
+
+            # Encoded once per codec in use, not once per socket
+            frames = {}
+            for websocket, client in list(self.active_connections.get(room, {}).items()):
+                if websocket is not exclude:
+                    frame = frames.get(client.codec.name)
+                    if frame is None:
+                        frame = frames[client.codec.name] = client.codec.encode(message)
+                    client.send(frame)
+            # Only recorded once sent, so a failed attempt doesn't hide the message from a later one
+            if message_id is not None and room in self.delivered:
+                self._record_delivery(room, message_id)
+        except Exception as e:
+            logger.error(f"Error delivering message to room {room}: {e}")
+
+    async def broadcast(self, room: str, message: dict, exclude: Optional[WebSocket] = None):
+        """Deliver a message to this worker's sockets and publish it to the other workers."""
+        await self.deliver(room, message, exclude)
+        chat_broker.publish(room, message)
+
+    def metrics(self) -> dict:
+        depths = [
+            len(client.queue)
+            for connections in self.active_connections.values()
+            for client in connections.values()
+        ]
+        return {
+            "rooms": len(self.active_connections),
+            "connections": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "frames_sent_total": self.stats.sent,
+            "frames_dropped_total": self.stats.dropped,
+            "coalesced_total": self.stats.coalesced,
+            "evicted_total": self.stats.evicted,
+            "send_errors_total": self.stats.send_errors,
+        }
 
 
 manager = ConnectionManager()
+register_collector("chat_broadcast", manager.metrics)
+
+
+async def restore_and_read(chat_db: AsyncSession, chat_id: str, read):
+    """
+    Restore an archived chat and return `read(session)` on the restored rows with a
+    message cache token taken before reading, or None when the chat was not archived.
+    Runs on the primary, even for a replica session.
+    """
+    # Short pages are common, and restoring takes a primary session and a row lock; check without either first
+    if not await chat_db.run_sync(ChatRoomManager.archived_chat_ids, [chat_id]):
+        return None
+    if chat_db.info.get("replica"):
+        async with chat_async_session() as primary_db:
+            return await restore_and_read(primary_db, chat_id, read)
+    if not await chat_db.run_sync(restore_if_archived, chat_id):
+        return None
+    message_cache.invalidate(chat_id)
+    token = message_cache.read_token()
+    return await chat_db.run_sync(read), token
 
 @router.websocket("/room")
 async def chat_endpoint(websocket: WebSocket):
@@ -94,70 +181,68 @@ async def chat_endpoint(websocket: WebSocket):
         return
 
     try:
-        user = verify_token(token)
+        user = await verify_token(token)
     except Exception as e:
         logger.error(f"Token verification failed: {e}")
         await websocket.close(code=1008)
         return
 
-    # Connect WebSocket to the room
-    await manager.connect(websocket, room)
-
+    # Canonical UUID text, as used by NOTIFY payloads, the broker and the cache
     try:
-        # Register the listener for database notifications
-        async def notification_handler(connection, pid, channel, payload):
-            try:
-                message_id, chat_id = payload.split(":")
-                if chat_id == room:
-                    # Fetch the latest message from the database
-                    chat_db = next(get_chat_db())
-                    latest_message = ChatRoomManager.get_message_by_id(chat_db, room, message_id)
-                    if latest_message:
-                        broadcast_message = {
-                            "timestamp": latest_message.timestamp.isoformat(),
-                            "sender": latest_message.user_id,
-                            "content": latest_message.message,
-                            "type": "notification",
-                        }
-                        await manager.broadcast(json.dumps(broadcast_message), room)
-            except Exception as e:
-                logger.error(f"Error handling notification: {e}")
-
-        # Add listener for notifications
-        await notification_manager.connection.add_listener('new_message', notification_handler)
+        room = str(chat_uuid(room))
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+
+    codec, subprotocol = negotiate(websocket.scope.get("subprotocols", []), websocket.query_params.get("protocol"))
+
+    # Connect WebSocket to the room; this also subscribes the room to database notifications
+    await manager.connect(websocket, room, codec, subprotocol)
 
+    try:
         # Handle messages from the WebSocket
         while True:
-            data = await websocket.receive_text()
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+            try:
+                data = codec.decode(received["text"] if received.get("text") is not None else received.get("bytes") or "")
+            except ProtocolError as e:
+                logger.info(f"Closing WebSocket in room {room}: {e}")
+                await websocket.close(code=e.code)
+                break
             if data:
-                timestamp = dt.utcnow().isoformat()
-                chat_db = next(get_chat_db())
-                ChatRoomManager.add_message(chat_db, room, user.username, data)
+                # Persist on the async engine so the INSERT never blocks the event loop
+                if CHAT_WRITE_BATCHING:
+                    stored = await message_batcher.add(room, user.username, data)
+                else:
+                    async with chat_async_session() as chat_db:
+                        stored = await chat_db.run_sync(ChatRoomManager.add_message, room, user.username, data)
+                message_cache.append(room, CachedMessage(stored.id, user.username, data, stored.timestamp))
+                read_your_writes.mark(user.username)
                 broadcast_message = {
-                    "timestamp": timestamp,
+                    "id": stored.id,
+                    "timestamp": stored.timestamp.isoformat(),
                     "sender": user.username,
                     "content": data,
                     "type": "message",
                 }
-                await manager.broadcast_to_others(websocket, json.dumps(broadcast_message), room)
+                await manager.broadcast(room, broadcast_message, exclude=websocket)
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, room)
         logger.info(f"WebSocket disconnected from room {room}.")
     except Exception as e:
         logger.error(f"Unexpected WebSocket error: {e}")
         await websocket.close()
     finally:
-        if notification_manager.connection:
-            await notification_manager.connection.remove_listener('new_message', notification_handler)
+        manager.disconnect(websocket, room)
 
 
 @router.post("/new", response_model=ChatResponseSchema)
-def create_chat(
+async def create_chat(
     data: dict,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_general_db),
-    chat_db: Session = Depends(get_chat_db),
+    db: AsyncSession = Depends(get_general_db),
     current_user=Depends(get_current_user),
     display_name: str = None,
 
@@ -174,12 +259,15 @@ def create_chat(
         # Use only the current user ID as the participant
 
 
-        assistant = client.beta.assistants.create(
+        # The OpenAI client is blocking; keep it off the event loop
+        client = get_openai_client()
+        assistant = await run_in_threadpool(
+            client.beta.assistants.create,
             name=thread_name,
             tools=[],
             model=llm_model,
         )
-        thread = client.beta.threads.create()
+        thread = await run_in_threadpool(client.beta.threads.create)
 
         new_chat = ChatsMetadata(
             participants=[str(current_user.id)],  # List containing only the current user ID
@@ -188,15 +276,10 @@ def create_chat(
         )
 
         db.add(new_chat)
-        db.commit()
-        db.refresh(new_chat)  # Refresh to get the auto-generated ID
-        background_tasks.add_task(process_openai_tasks, client=client, data=data, db=db, chat_db=chat_db, assistant=assistant,thread=thread,chat=new_chat)
-        chat_table_name = str(new_chat.id)  # Use the chat ID as the table name
-        inspector = inspect(chat_db.bind)
-        if not inspector.has_table(chat_table_name):
-            # Dynamically create the table
-            ChatMessageTable = create_chat_model(chat_table_name, Base.metadata)
-            Base.metadata.create_all(bind=chat_db.bind, tables=[ChatMessageTable])
+        await db.commit()
+        await db.refresh(new_chat)  # Refresh to get the auto-generated ID
+        # Runs after the response, on sessions of its own
+        background_tasks.add_task(process_openai_tasks, client=client, data=data, assistant=assistant,thread=thread,chat=new_chat)
         # print("response to be sent",new_chat)
         return new_chat
 
@@ -206,52 +289,170 @@ def create_chat(
 
 
 @router.get("/chats", response_model=List[ChatSummary])
-def get_user_chats(
-    db: Session = Depends(get_general_db),
-    chat_db: Session = Depends(get_chat_db),
+async def get_user_chats(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_general_read_db),
+    chat_db: AsyncSession = Depends(get_chat_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Retrieve all chats for the user authenticated by the token
-    and ensure all chat tables exist in the chat database.
+    Retrieve the chats of the authenticated user, most recently active first, with
+    the last message and unread count of each. Further pages are fetched with the
+    cursor from the X-Next-Cursor header.
     """
-    try:
+    position = decode_cursor(cursor) if cursor else None
 
-        # Fetch all chats the user participates in
-        chats = (
-            db.query(ChatsMetadata)
-            .filter(ChatsMetadata.participants.cast(JSONB).op("@>")([str(current_user.id)]))
-            .order_by(ChatsMetadata.last_activity.desc())
-            .all()
-        )
-        for chat in chats:
-            print(chat.display_name,chat.last_activity)
+    try:
+        # Fetch one page of the chats the user participates in (GIN index on participants)
+        query = select(ChatsMetadata).where(ChatsMetadata.participants.contains([str(current_user.id)]))
+        if position:
+            last_activity = dt.fromisoformat(position["last_activity"])
+            query = query.where(or_(
+                ChatsMetadata.last_activity < last_activity,
+                and_(ChatsMetadata.last_activity == last_activity, ChatsMetadata.id < UUID(position["id"])),
+            ))
+        query = query.order_by(ChatsMetadata.last_activity.desc(), ChatsMetadata.id.desc()).limit(limit)
+        chats = (await db.execute(query)).scalars().all()
         if not chats:
             return []
 
-        # Check and create missing tables in chat_db
-        inspector = inspect(chat_db.bind)
-        for chat in chats:
-            chat_table_name = str(chat.id)  # Convert UUID to string
-            if not inspector.has_table(chat_table_name):
-                # Dynamically create the table and add it to the database
-                ChatMessageTable = create_chat_model(chat_table_name, Base.metadata)
-                Base.metadata.create_all(bind=chat_db.bind, tables=[ChatMessageTable])
+        if len(chats) == limit:
+            set_next_cursor(response, {"last_activity": chats[-1].last_activity.isoformat(), "id": str(chats[-1].id)})
+
+        previews = await chat_db.run_sync(
+            ChatRoomManager.get_chat_previews, [chat.id for chat in chats], current_user.username
+        )
 
-        # Convert chats to Pydantic schemas
-        return [ChatSummary.from_orm(chat) for chat in chats]
+        summaries = []
+        for chat in chats:
+            preview = previews.get(chat.id)
+            summaries.append(ChatSummary(
+                id=chat.id,
+                display_name=chat.display_name,
+                last_activity=chat.last_activity,
+                last_message=ChatMessagePreview.from_orm(preview) if preview is not None and preview.id is not None else None,
+                unread_count=preview.unread_count if preview is not None else 0,
+            ))
+        return summaries
 
     except Exception as e:
         logger.error(f"Error fetching user chats: {e}")
         raise HTTPException(status_code=500, detail="An error occurred while fetching user chats")
 
 
+@router.post("/{chat_id}/read")
+async def mark_chat_read(
+    chat_id: UUID,
+    message_id: int,
+    db: AsyncSession = Depends(get_general_db),
+    chat_db: AsyncSession = Depends(get_chat_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Mark every message up to `message_id` as read for the authenticated user.
+    """
+    chat = await db.get(ChatsMetadata, chat_id)
+    # Not found either way, so other users' chat ids can't be probed
+    if not chat or not chat.user_is_participant(current_user.id):
+        raise HTTPException(status_code=404, detail="Chat not found")
+    try:
+        await chat_db.run_sync(ChatRoomManager.mark_read, chat_id, current_user.username, message_id)
+        return {"detail": "Chat marked as read"}
+
+    except Exception as e:
+        logger.error(f"Error marking chat {chat_id} as read: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while marking the chat as read")
+
+
+@router.get("/search", response_model=List[ChatSearchResult])
+async def search_chats(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    chat_id: Optional[UUID] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_general_read_db),
+    chat_db: AsyncSession = Depends(get_chat_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Full-text search across all chats of the authenticated user, or a single one of
+    them with `chat_id`. Results are ranked and highlighted; further pages are
+    fetched with the cursor from the X-Next-Cursor header.
+    """
+    position = decode_cursor(cursor) if cursor else {}
+
+    try:
+        query = select(ChatsMetadata.id).where(ChatsMetadata.participants.contains([str(current_user.id)]))
+        if chat_id is not None:
+            query = query.where(ChatsMetadata.id == chat_id)
+        chat_ids = (await db.execute(query)).scalars().all()
+        if not chat_ids:
+            return []
+
+        results = await chat_db.run_sync(
+            lambda session: ChatRoomManager.search_messages(
+                session, chat_ids, q, limit=limit,
+                after_rank=position.get("rank"), after_id=position.get("id"),
+            )
+        )
+        if len(results) == limit:
+            set_next_cursor(response, {"rank": results[-1].rank, "id": results[-1].id})
+
+        return [ChatSearchResult.from_orm(result) for result in results]
+
+    except Exception as e:
+        logger.error(f"Error searching chats: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while searching chats")
+
+
+@router.get("/export")
+async def export_user_chats(
+    fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    db: AsyncSession = Depends(get_general_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream the messages of every chat of the authenticated user as NDJSON or CSV.
+    Archived chats are exported from their archive without being restored.
+    """
+    try:
+        chat_ids = (await db.execute(
+            select(ChatsMetadata.id).where(ChatsMetadata.participants.contains([str(current_user.id)]))
+        )).scalars().all()
+    except Exception as e:
+        logger.error(f"Error listing chats to export: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while exporting chats")
+
+    return export_response(chat_ids, fmt, f"foodmate-chats-{current_user.username}")
+
+
+@router.get("/{chat_id}/export")
+async def export_chat(
+    chat_id: UUID,
+    fmt: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    db: AsyncSession = Depends(get_general_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream the full transcript of a chat as NDJSON or CSV, from its archive if it has one.
+    """
+    chat = await db.get(ChatsMetadata, chat_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    if not chat.user_is_participant(current_user.id):
+        raise HTTPException(status_code=403, detail="User is not authorized to export this chat")
+
+    return export_response([chat_id], fmt, f"foodmate-chat-{chat_id}")
 
 
 @router.delete("/delete/{chat_id}", response_model=ChatResponseSchema)
-def delete_chat(
+async def delete_chat(
         chat_id: UUID,
-        db: Session = Depends(get_general_db),
+        db: AsyncSession = Depends(get_general_db),
+        chat_db: AsyncSession = Depends(get_chat_db),
         current_user: User = Depends(get_current_user)
 ):
     """
@@ -259,7 +460,7 @@ def delete_chat(
     """
     try:
         # Fetch the chat metadata by chat_id
-        chat = db.query(ChatsMetadata).filter(ChatsMetadata.id == chat_id).first()
+        chat = await db.get(ChatsMetadata, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -268,11 +469,12 @@ def delete_chat(
             raise HTTPException(status_code=403, detail="User is not authorized to delete this chat")
         # print('hi')
         # Remove all chat messages
-        ChatRoomManager.remove_chat(db, chat_id)
+        await chat_db.run_sync(ChatRoomManager.remove_chat, chat_id)
+        message_cache.invalidate(str(chat_id))
         # print("this works")
         # Remove the chatroom metadata entry
-        db.delete(chat)
-        db.commit()
+        await db.delete(chat)
+        await db.commit()
 
         return chat  # Return the deleted chat metadata as a confirmation response
 
@@ -281,20 +483,55 @@ def delete_chat(
         raise HTTPException(status_code=500, detail="An error occurred while deleting the chat")
 
 @router.get("/{chat_id}/messages", response_model=List[ChatMessageRead])
-def get_chat_messages(
+async def get_chat_messages(
     chat_id: str,
-    chat_db: Session = Depends(get_chat_db),
+    response: Response,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    chat_db: AsyncSession = Depends(get_chat_read_db),
     current_user: User = Depends(get_current_user)
 ):
-    print(current_user.username)
     """
-    Retrieve all messages of a specific chat using ChatRoomManager.
+    Retrieve one page of messages of a specific chat, oldest first.
+    Defaults to the most recent page; older or newer pages are requested with
+    `before_id`/`after_id` or the opaque cursor returned in the X-Next-Cursor header.
     """
+    if cursor:
+        position = decode_cursor(cursor)
+        before_id, after_id = position.get("before_id"), position.get("after_id")
+
     try:
-        # Fetch all messages using the ChatRoomManager
-        raw_messages = ChatRoomManager.get_all_messages(chat_db, chat_id)
-        # for message in raw_messages:
-            # print("sent" if message.user_id == current_user.username else "received")
+        raw_messages = None
+        if before_id is None and after_id is None:
+            raw_messages = message_cache.recent(chat_id, limit)
+        if raw_messages is None:
+            token = message_cache.read_token()
+            raw_messages = await chat_db.run_sync(
+                lambda session: ChatRoomManager.get_messages_page(
+                    session, chat_id, before_id=before_id, after_id=after_id, limit=limit
+                )
+            )
+            replica = chat_db.info.get("replica", False)
+            # A short newest page may mean the chat was archived; bring it back and read again
+            if before_id is None and after_id is None and len(raw_messages) < limit:
+                restored = await restore_and_read(
+                    chat_db, chat_id, lambda session: ChatRoomManager.get_messages_page(session, chat_id, limit=limit)
+                )
+                if restored is not None:
+                    (raw_messages, token), replica = restored, False
+            # A lagging replica could leave a message out, and the cache would keep that gap
+            if before_id is None and after_id is None and not replica:
+                message_cache.prime(chat_id, raw_messages, complete=len(raw_messages) < limit, token=token)
+
+        # A full page means there may be more in the direction we are paging
+        if len(raw_messages) == limit:
+            if after_id is not None:
+                set_next_cursor(response, {"after_id": raw_messages[-1].id})
+            else:
+                set_next_cursor(response, {"before_id": raw_messages[0].id})
+
         # Convert raw results to Pydantic schemas
         return [
             ChatMessageRead(
@@ -313,41 +550,32 @@ def get_chat_messages(
 
 
 @router.get("/{chat_id}/sync-messages", response_model=List[ChatMessageRead])
-def sync_messages(
+async def sync_messages(
     chat_id: str,
     since: str,
-    chat_db: Session = Depends(get_chat_db),
+    chat_db: AsyncSession = Depends(get_chat_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Fetch messages for a chat since the given timestamp using ChatRoomManager.
     """
     try:
-        # Validate chat table existence
-        inspector = inspect(chat_db.bind)
-        table_name = f"chat_{chat_id}"
-        if not inspector.has_table(table_name):
-            raise HTTPException(status_code=404, detail="Chat not found")
-
         # Parse 'since' timestamp
         try:
             since_timestamp = dt.fromisoformat(since)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid timestamp format")
 
-        # Fetch messages since the given timestamp
-        ChatMessageModel = create_chat_model(chat_id, Base.metadata)
-        stmt = (
-            select(
-                ChatMessageModel.c.id,
-                ChatMessageModel.c.user_id,
-                ChatMessageModel.c.message,
-                ChatMessageModel.c.timestamp
-            )
-            .where(ChatMessageModel.c.timestamp > since_timestamp)
-            .order_by(ChatMessageModel.c.timestamp)
-        )
-        raw_messages = chat_db.execute(stmt).fetchall()
+        # Fetch messages since the given timestamp, from the recent-message cache when it reaches back far enough
+        raw_messages = message_cache.since(chat_id, since_timestamp)
+        if raw_messages is None:
+            raw_messages = await chat_db.run_sync(ChatRoomManager.get_messages_since, chat_id, since_timestamp)
+            if not raw_messages:
+                restored = await restore_and_read(
+                    chat_db, chat_id, lambda session: ChatRoomManager.get_messages_since(session, chat_id, since_timestamp)
+                )
+                if restored is not None:
+                    raw_messages = restored[0]
 
         # Convert raw results to Pydantic schemas
         return [
@@ -365,10 +593,10 @@ def sync_messages(
         raise HTTPException(status_code=500, detail="An error occurred while syncing messages")
 
 @router.put("/{chat_id}/metadata")
-def update_chat_metadata(
+async def update_chat_metadata(
     chat_id: UUID,
     metadata: UpdateChatMetadata,
-    db: Session = Depends(get_general_db),
+    db: AsyncSession = Depends(get_general_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -376,7 +604,7 @@ def update_chat_metadata(
     """
     try:
         # Fetch the chat
-        chat = db.query(ChatsMetadata).filter(ChatsMetadata.id == chat_id).first()
+        chat = await db.get(ChatsMetadata, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -391,12 +619,12 @@ def update_chat_metadata(
         chat.last_activity = dt.utcnow()
 
         # Commit the changes
-        db.commit()
+        await db.commit()
 
         return {"detail": "Chat metadata updated successfully"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
 
 
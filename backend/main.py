@@ -2,12 +2,24 @@ from sys import prefix
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from auth.routes import router as auth_router  # Absolute import
-from chat.routes import router as chat_router  # Includes chat-related routes
+from chat.routes import router as chat_router, manager as connection_manager  # Includes chat-related routes
+from chat.broker import chat_broker
+from chat.batcher import message_batcher
+from chat.retention import CHAT_ARCHIVE_AFTER_DAYS, retention_loop
+from utils.revocation import load_revocations, revocation_loop
+from utils.passwords import password_hasher
 from management.routes import router as account_router
 from recipes.routes import router as recipes_router
-from utils.database import Base, general_engine as engine, notification_manager  # Absolute import
+from utils.database import chat_async_engine, general_async_engine, notification_manager  # Absolute import
+from utils.bootstrap import bootstrap
+from utils.replicas import READ_YOUR_WRITES_HEADER, chat_replicas, general_replicas, read_your_writes_middleware, replica_lag_loop
 from utils.authutils import get_current_user
+from utils.metrics import render_prometheus
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.sqlstats import DEBUG_HEADERS, SQL_DEBUG_HEADERS, SQLStatsMiddleware
+import asyncio
 import logging
 import os
 # from backend.utils.database import Base, notification_manager
@@ -29,10 +41,16 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, READ_YOUR_WRITES_HEADER, *(DEBUG_HEADERS if SQL_DEBUG_HEADERS else [])],
     )
 
-    # Create DB tables
-    Base.metadata.create_all(bind=engine)
+    # Query count and database time per request: /metrics histograms, X-DB-* headers in debug mode.
+    # Added before the "http" middleware so it sits inside it; those re-stream every response
+    # body, which would make every response look streamed.
+    app.add_middleware(SQLStatsMiddleware)
+
+    # Keeps a user's reads on the primary right after they write (see utils/replicas.py)
+    app.middleware("http")(read_your_writes_middleware)
 
     # Public routes (register and login)
     app.include_router(auth_router, prefix="/auth", tags=["auth"])
@@ -60,6 +78,10 @@ def create_app() -> FastAPI:
         dependencies=[Depends(get_current_user)],
     )
 
+    @app.get("/metrics", response_class=PlainTextResponse, tags=["metrics"])
+    def metrics():
+        return render_prometheus()
+
     return app
 
 # Lifespan handler to start notification listening
@@ -67,21 +89,44 @@ async def lifespan(app: FastAPI):
     logger.info("Registered lifespan app")
     # Startup operations
     try:
+        await bootstrap()  # Create missing databases and tables before anything connects to them
         await notification_manager.connect()  # Establish connection to the database
+        await chat_broker.start(connection_manager.deliver)  # Fan room broadcasts out to other workers
+        await load_revocations()  # Build the token revocation filter before the first request needs it
     except Exception as e:
         logger.error(f"Error during startup: {e}")
         raise e  # Exit the app startup if connection fails
 
+    # Move idle chats to the archive in the background
+    retention_task = asyncio.create_task(retention_loop()) if CHAT_ARCHIVE_AFTER_DAYS > 0 else None
+    # Pick up tokens revoked by other workers
+    revocation_task = asyncio.create_task(revocation_loop())
+    # Track replica lag when read replicas are configured
+    replica_task = (
+        asyncio.create_task(replica_lag_loop()) if general_replicas.replicas or chat_replicas.replicas else None
+    )
+
     # Pass control to the app
     yield
 
     # Shutdown operations
-    if notification_manager.connection:
-        try:
-            await notification_manager.connection.close()
-            logger.info("Database connection closed successfully.")
-        except Exception as e:
-            logger.error(f"Error during shutdown: {e}")
+    if retention_task:
+        retention_task.cancel()
+    revocation_task.cancel()
+    if replica_task:
+        replica_task.cancel()
+    password_hasher.close()
+    await message_batcher.close()
+    await chat_broker.stop()
+    try:
+        await notification_manager.close()  # Also stops reconnecting if the connection was lost
+        logger.info("Database connection closed successfully.")
+    except Exception as e:
+        logger.error(f"Error during shutdown: {e}")
+    await chat_async_engine.dispose()
+    await general_async_engine.dispose()
+    await general_replicas.dispose()
+    await chat_replicas.dispose()
 
 
 
@@ -1,39 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from utils.database import general_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import get_general_db
 from utils.schemas import UserRead, UserCreate, UserUpdate
 from utils.models import User
 from utils.authutils import get_current_user
+from utils.authcache import auth_cache
 
 router = APIRouter()
 
-def get_db():
-    db = general_session()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-
 @router.get("/account", response_model=UserRead)
-def get_user_account(current_user: User = Depends(get_current_user)):
+async def get_user_account(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.put("/account", response_model=UserRead)
-def update_user_account(
+async def update_user_account(
     user_data: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_general_db)
 ):
-    db_user = db.query(User).filter(User.id == current_user.id).first()
+    db_user = await db.get(User, current_user.id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     for key, value in user_data.dict(exclude_unset=True).items():
         setattr(db_user, key, value)
 
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    auth_cache.invalidate_user(db_user.username)
     return db_user
 
@@ -0,0 +1,272 @@
+# backend/recipes/ingredients.py
+"""
+Canonical ingredient names for the free-text ingredient lines of a recipe, e.g.
+"200 g kipfilet, in blokjes" -> "kipfilet" and "2 teentjes knoflook" -> "knoflook".
+Quantities, units, parentheses, preparation notes after a comma and descriptive
+words are dropped, then known plurals and synonyms are mapped onto one name.
+
+The names are stored in `recipes.ingredient_names` (GIN indexed) when a recipe is
+saved, and pantry searches normalize their terms with the same function, so both
+sides agree even where the mapping is imperfect.
+
+The pantry search ("what can I cook with this") ranks recipes by how few of their
+ingredients the pantry lacks. A recipe missing at most m ingredients has at least
+PANTRY_KEY_COUNT - m of its PANTRY_KEY_COUNT rarest ingredients in the pantry, so
+each recipe is indexed in `recipe_pantry_keys` under those subsets of its rarest
+ingredients, and a search looks up the same-sized subsets of the pantry. Only the
+few recipes found that way have their ingredients counted, instead of every recipe
+that shares something common like salt with the pantry. Rarity comes from
+`ingredient_stats`; it only affects how selective the keys are, not the results.
+Pantry names no recipe uses are left out of the lookup first (`known_ingredients`).
+
+The subsets grow with the cube of the pantry size, and so does the search: over
+500k recipes (benchmarks/pantry_search.py) a page takes about 8 ms at the median
+for 12 pantry items and 30-40 ms for 30, with a p99 around 50 ms, where scoring
+every recipe sharing an ingredient takes 2-3 s. PANTRY_MAX_ITEMS keeps it there.
+
+Recipes saved before these columns existed, or imported in bulk, are indexed with
+(which also refreshes the rarity of every recipe's keys):
+    python -m recipes.ingredients [--batch-size 1000]
+"""
+from itertools import combinations
+from sqlalchemy import String, any_, delete, func, insert, literal, select, text, true, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from typing import Dict, Iterable, List, Optional
+from utils.database import general_session
+from utils.models import IngredientStat, Recipe, RecipePantryKey
+import argparse
+import logging
+import re
+import unicodedata
+
+logger = logging.getLogger("uvicorn")
+
+# Recipes are generated in Dutch, but the model sometimes answers in English
+UNITS = {
+    "g", "gr", "gram", "grams", "kg", "kilo", "mg", "ml", "cl", "dl", "l", "liter", "litre", "el", "tl", "eetlepel",
+    "eetlepels", "theelepel", "theelepels", "tbsp", "tsp", "tablespoon", "tablespoons", "teaspoon", "teaspoons",
+    "cup", "cups", "kop", "kopje", "kopjes", "oz", "lb", "lbs", "pound", "pounds", "stuk", "stuks", "plak", "plakken",
+    "plakje", "plakjes", "snuf", "snufje", "mespunt", "handje", "handvol", "bos", "bosje", "blik", "blikje", "pak",
+    "pakje", "zak", "zakje", "potje", "scheut", "scheutje", "teen", "teentje", "teentjes", "tenen", "clove", "cloves",
+    "pinch", "dash", "handful", "can", "cans", "slice", "slices", "piece", "pieces", "bunch", "sprig", "takje",
+    "takjes", "blaadje", "blaadjes", "x", "of", "van", "a", "an", "een",
+}
+DESCRIPTORS = {
+    "vers", "verse", "gedroogd", "gedroogde", "fijngehakt", "fijngehakte", "gehakt", "gehakte", "gesneden",
+    "gesnipperd", "gesnipperde", "geraspt", "geraspte", "gekookt", "gekookte", "ongezouten", "gezouten", "grote",
+    "groot", "kleine", "klein", "middelgrote", "rijpe", "rijp", "biologisch", "biologische", "naar", "smaak",
+    "optioneel", "extra", "fresh", "dried", "chopped", "minced", "diced", "sliced", "grated", "cooked", "large",
+    "small", "medium", "ripe", "organic", "optional", "to", "taste", "finely", "fijn", "ca", "circa", "about",
+}
+# A note follows these once the name has started ("tomaten uit blik", "olie om in te bakken")
+PREPOSITIONS = {"uit", "in", "voor", "om", "zonder", "for", "from", "without"}
+# Plurals and synonyms onto one name; anything not listed is kept as written
+ALIASES = {
+    "uien": "ui", "rode ui": "ui", "rode uien": "ui", "onion": "ui", "onions": "ui",
+    "tomaten": "tomaat", "tomato": "tomaat", "tomatoes": "tomaat", "cherrytomaatjes": "cherrytomaat",
+    "cherrytomaten": "cherrytomaat", "eieren": "ei", "egg": "ei", "eggs": "ei",
+    "kipfilets": "kipfilet", "kippenborst": "kipfilet", "kipborst": "kipfilet", "chicken breast": "kipfilet",
+    "chicken breasts": "kipfilet", "knoflookteen": "knoflook", "knoflookteentjes": "knoflook", "garlic": "knoflook",
+    "aardappelen": "aardappel", "aardappels": "aardappel", "potato": "aardappel", "potatoes": "aardappel",
+    "wortelen": "wortel", "wortels": "wortel", "carrot": "wortel", "carrots": "wortel",
+    "paprika's": "paprika", "champignons": "champignon", "mushrooms": "champignon", "courgettes": "courgette",
+    "olijfolie extra vierge": "olijfolie", "olive oil": "olijfolie", "zout en peper": "zout",
+    "salt": "zout", "pepper": "peper", "zwarte peper": "peper", "black pepper": "peper", "rice": "rijst",
+    "basmatirijst": "rijst", "zilvervliesrijst": "rijst", "milk": "melk", "butter": "boter", "cheese": "kaas",
+    "geraspte kaas": "kaas", "spinach": "spinazie", "broccoliroosjes": "broccoli", "salmon": "zalm", "zalmfilet": "zalm",
+    "zalmfilets": "zalm", "lentils": "linzen", "chickpeas": "kikkererwten", "citroenen": "citroen", "lemon": "citroen",
+    "limoenen": "limoen", "lime": "limoen",
+}
+
+PANTRY_KEY_COUNT = 3
+# Deeper than this, the key subsets stop being selective
+PANTRY_MAX_MISSING = 1
+# The search looks up every subset of up to PANTRY_KEY_COUNT pantry items
+PANTRY_MAX_ITEMS = 30
+
+_PARENTHESES = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_QUANTITY = re.compile(r"^[\d.,/½¼¾⅓⅔\-– ]+")
+_NUMBER_WITH_UNIT = re.compile(r"^\d+[.,]?\d*(?=[a-z])")
+_NON_WORD = re.compile(r"[^\w' -]+")
+
+
+def strip_accents(text: str) -> str:
+    """The text without diacritics, e.g. "crème brûlée" -> "creme brulee"."""
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def normalize_ingredient(line: str) -> Optional[str]:
+    """The canonical name in one ingredient line, or None if nothing is left of it."""
+    text = _PARENTHESES.sub(" ", line.lower())
+    # What follows a comma is how to prepare it ("1 ui, fijngehakt")
+    text = text.split(",")[0].split(";")[0]
+    text = _NON_WORD.sub(" ", text.replace("½", " ½ ")).strip()
+    text = _QUANTITY.sub("", text)
+    words = []
+    for word in text.split():
+        word = _NUMBER_WITH_UNIT.sub("", word)  # "200g"
+        if not words and (word in UNITS or not word.strip("-'")):
+            continue
+        if word in DESCRIPTORS:
+            continue
+        if words and word in PREPOSITIONS:
+            break
+        words.append(word)
+    name = " ".join(words).strip(" -'")
+    if not name:
+        return None
+    name = ALIASES.get(name, name)
+    return ALIASES.get(strip_accents(name), strip_accents(name))
+
+
+def ingredient_names(lines: Iterable[str]) -> List[str]:
+    """The distinct canonical names of a recipe's ingredient lines, sorted."""
+    return sorted({name for name in map(normalize_ingredient, lines or []) if name})
+
+
+def pantry_keys(names: List[str], counts: Dict[str, int]) -> List[str]:
+    """The recipe's index tokens: for each m, its rarest ingredients less m, as "m:name|name"."""
+    keys = sorted(sorted(set(names), key=lambda name: (counts.get(name, 0), name))[:PANTRY_KEY_COUNT])
+    tokens = []
+    for missing in range(PANTRY_MAX_MISSING + 1):
+        if len(keys) <= missing:
+            # Too few ingredients to miss more than this: matches any pantry
+            tokens.append(f"{missing}:*")
+        else:
+            tokens += [f"{missing}:" + "|".join(subset) for subset in combinations(keys, len(keys) - missing)]
+    return tokens
+
+
+def pantry_query_keys(have: List[str], max_missing: int) -> List[str]:
+    """The tokens of every recipe that misses at most `max_missing` ingredients of `have`."""
+    have = sorted(set(have))
+    tokens = [f"{max_missing}:*"]
+    for size in range(1, PANTRY_KEY_COUNT - max_missing + 1):
+        tokens += [f"{max_missing}:" + "|".join(subset) for subset in combinations(have, size)]
+    return tokens
+
+
+def index_recipe(session: Session, recipe: Recipe):
+    """Count the names of a new recipe and add its pantry keys; call once it has an id, before committing."""
+    names = sorted(set(recipe.ingredient_names or []))
+    if not names:
+        return
+    # Sorted, so concurrent saves lock the shared names in the same order
+    session.execute(
+        pg_insert(IngredientStat)
+        .values([{"name": name, "recipes": 1} for name in names])
+        .on_conflict_do_update(index_elements=[IngredientStat.name], set_={"recipes": IngredientStat.recipes + 1})
+    )
+    counts = dict(session.execute(
+        select(IngredientStat.name, IngredientStat.recipes).where(IngredientStat.name.in_(names))
+    ).all())
+    session.execute(
+        insert(RecipePantryKey), [{"key": key, "recipe_id": recipe.id} for key in pantry_keys(names, counts)]
+    )
+
+
+def known_ingredients(names: List[str]) -> Select:
+    """The names among `names` that some recipe uses; the others can only add keys that match nothing."""
+    return select(IngredientStat.name).where(IngredientStat.name.in_(names), IngredientStat.recipes > 0)
+
+
+def pantry_search(columns, have: List[str], avoid: List[str], max_missing: int, limit: int) -> Select:
+    """
+    Recipes missing at most `max_missing` of their ingredients from `have` and using
+    none of `avoid`, fewest missing first, then most matched. Selects `columns` plus
+    `matched` and `missing`.
+    """
+    have_array = literal(sorted(set(have)), ARRAY(String))
+    names = func.unnest(Recipe.ingredient_names).table_valued("name").render_derived(name="names")
+    coverage = select(func.count().label("matched")).select_from(names).where(
+        names.c.name == any_(have_array)
+    ).lateral("coverage")
+    missing = func.cardinality(Recipe.ingredient_names) - coverage.c.matched
+    candidates = select(RecipePantryKey.recipe_id).where(
+        RecipePantryKey.key == any_(literal(pantry_query_keys(have, max_missing), ARRAY(String)))
+    )
+    stmt = (
+        select(*columns, coverage.c.matched, missing.label("missing"))
+        .select_from(Recipe)
+        .join(coverage, true())
+        # An array of ids rather than IN (subquery): the planner then probes recipes by primary key
+        # instead of joining them in bulk when it overestimates the candidates
+        .where(Recipe.id == any_(func.array(candidates.scalar_subquery())))
+        .where(func.cardinality(Recipe.ingredient_names) > 0, missing <= max_missing)
+    )
+    if avoid:
+        stmt = stmt.where(~Recipe.ingredient_names.overlap(literal(sorted(set(avoid)), ARRAY(String))))
+    return stmt.order_by(missing, coverage.c.matched.desc(), Recipe.id.desc()).limit(limit)
+
+
+def normalize_missing(session: Session, batch_size: int) -> int:
+    """Fill in ingredient_names for recipes saved without them; returns how many were updated."""
+    updated, last_id = 0, 0
+    while True:
+        rows = session.execute(
+            select(Recipe.id, Recipe.ingredients)
+            .where(Recipe.id > last_id, Recipe.ingredient_names == [])
+            .order_by(Recipe.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        session.execute(update(Recipe), [
+            {"id": row.id, "ingredient_names": ingredient_names(row.ingredients)} for row in rows
+        ])
+        session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+        logger.info(f"Normalized the ingredients of {updated} recipes")
+
+
+def rebuild_ingredient_stats(session: Session):
+    session.execute(delete(IngredientStat))
+    session.execute(text(
+        "INSERT INTO ingredient_stats (name, recipes) "
+        "SELECT name, count(*) FROM recipes, unnest(ingredient_names) AS name GROUP BY name"
+    ))
+    session.commit()
+
+
+def rebuild_pantry_keys(session: Session, batch_size: int) -> int:
+    """Recompute the pantry keys of every recipe against the current ingredient_stats."""
+    counts = dict(session.execute(select(IngredientStat.name, IngredientStat.recipes)).all())
+    indexed, last_id = 0, 0
+    while True:
+        rows = session.execute(
+            select(Recipe.id, Recipe.ingredient_names).where(Recipe.id > last_id).order_by(Recipe.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return indexed
+        ids = [row.id for row in rows]
+        session.execute(delete(RecipePantryKey).where(RecipePantryKey.recipe_id.in_(ids)))
+        keys = [
+            {"key": key, "recipe_id": row.id}
+            for row in rows if row.ingredient_names
+            for key in pantry_keys(row.ingredient_names, counts)
+        ]
+        if keys:
+            session.execute(insert(RecipePantryKey), keys)
+        session.commit()
+        indexed += len(rows)
+        last_id = ids[-1]
+        if indexed % (batch_size * 50) == 0:
+            logger.info(f"Indexed {indexed} recipes")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Normalize recipe ingredients and rebuild the pantry index")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    with general_session() as session:
+        logger.info(f"Normalized {normalize_missing(session, args.batch_size)} recipes")
+        rebuild_ingredient_stats(session)
+        logger.info(f"Indexed {rebuild_pantry_keys(session, args.batch_size)} recipes for the pantry search")
+
+
+if __name__ == "__main__":
+    main()
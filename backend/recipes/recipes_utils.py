@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Session
 from typing import Dict
+from recipes.dedup import find_duplicate, recipe_index, recipe_signature
+from recipes.ingredients import index_recipe, ingredient_names
 from utils.models import Recipe
 from utils.schemas import RecipeBase
 from pydantic import ValidationError
@@ -12,6 +14,14 @@ def add_recipe_to_db(recipe_data: Recipe, db: Session) -> Recipe:
     if not recipe_data:
         raise ValueError("Recipe data is None. Ensure valid data is passed.")
 
+    names = ingredient_names(recipe_data.ingredients)
+    signature = recipe_signature(recipe_data.title, names)
+    # A variant of a recipe we already have is not saved again; callers get the existing one
+    duplicate = find_duplicate(db, signature)
+    if duplicate is not None:
+        logger.info(f"'{recipe_data.title}' is a near-duplicate of recipe {duplicate.id} '{duplicate.title}', not saving it")
+        return duplicate
+
     # Create a new Recipe object
     print(recipe_data)
     recipe = Recipe(
@@ -26,16 +36,22 @@ def add_recipe_to_db(recipe_data: Recipe, db: Session) -> Recipe:
         source=recipe_data.source,
         image_url=recipe_data.image_url,
         ingredients=recipe_data.ingredients,
+        ingredient_names=names,
+        minhash=signature,
         instructions=recipe_data.instructions,
         # macros=recipe_data.macros
 
     )
 
 
-    # Add and commit the Recipe object
+    # Add and commit the Recipe object, together with its entries in the pantry index
     db.add(recipe)
+    db.flush()
+    index_recipe(db, recipe)
     db.commit()
     db.refresh(recipe)
+    if signature is not None:
+        recipe_index.add(recipe.id, signature)
 
     return recipe
 
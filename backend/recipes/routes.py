@@ -1,41 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from utils.database import general_session, Base, general_engine
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from utils.database import get_general_db
+from utils.replicas import get_general_read_db
 from utils.authutils import get_current_user  # Assuming this function decodes and verifies JWT
 from utils import models, schemas
+from utils.pagination import decode_cursor, set_next_cursor
+from recipes.ingredients import PANTRY_MAX_ITEMS, PANTRY_MAX_MISSING, known_ingredients, normalize_ingredient, pantry_search
 import logging
 
 router = APIRouter()
-
-def get_db():
-    db = general_session()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 logger = logging.getLogger("uvicorn")
 
-Base.metadata.create_all(bind=general_engine)
-logger.info(f"Tables in metadata: {Base.metadata.tables.keys()}")
-logger.info("Recipe tables created successfully.")
-
 
 # Protect routes by requiring authentication
 @router.post("/create", response_model=schemas.RecipeRead)
-def create_recipe(recipe_data: schemas.RecipeBase, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_recipe(recipe_data: schemas.RecipeBase, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_general_db)):
     recipe = models.Recipe(
         title=recipe_data.title,
         instructions=recipe_data.instructions,
     )
     db.add(recipe)
-    db.commit()
-    db.refresh(recipe)
+    await db.commit()
+    await db.refresh(recipe)
     return recipe
 
 @router.post("/rate")
-def rate_recipe(rating_data: schemas.RecipeRating, user_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def rate_recipe(rating_data: schemas.RecipeRating, user_id: int, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_general_db)):
     # user_id might come from the JWT (current_user is already authenticated)
     rating = models.UserRecipeRating(
         user_id=user_id,
@@ -43,13 +35,135 @@ def rate_recipe(rating_data: schemas.RecipeRating, user_id: int, current_user: m
         rating=rating_data.rating
     )
     db.add(rating)
-    db.commit()
+    # Fold the rating into the recipe's average in the same transaction; both sides read the old values
+    await db.execute(
+        update(models.Recipe)
+        .where(models.Recipe.id == rating_data.recipe_id)
+        .values(
+            rating_avg=(models.Recipe.rating_avg * models.Recipe.rating_count + rating_data.rating)
+            / (models.Recipe.rating_count + 1),
+            rating_count=models.Recipe.rating_count + 1,
+        )
+    )
+    await db.commit()
     return {"detail": "Rating saved"}
 
-@router.get("/list", response_model=list[schemas.RecipeRead])
-def list_recipes(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(models.Recipe).all()
+# Only the columns of RecipeSummary, so list pages don't load ingredients and instructions
+SUMMARY_COLUMNS = [getattr(models.Recipe, field) for field in schemas.RecipeSummary.model_fields]
+
+
+@router.get("/list", response_model=list[schemas.RecipeSummary])
+async def list_recipes(
+    response: Response,
+    cuisine: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None, description="Only recipes with all of these tags"),
+    equipment: Optional[List[str]] = Query(None, description="Only recipes that need nothing beyond this equipment"),
+    ingredients: Optional[List[str]] = Query(None, description="Only recipes that use all of these ingredients"),
+    exclude_ingredients: Optional[List[str]] = Query(None, description="Only recipes that use none of these"),
+    min_calories: Optional[float] = Query(None, ge=0),
+    max_calories: Optional[float] = Query(None, ge=0),
+    max_prepare_time: Optional[int] = Query(None, ge=0),
+    min_servings: Optional[int] = Query(None, ge=1),
+    max_servings: Optional[int] = Query(None, ge=1),
+    sort: Literal["recent", "rating"] = "recent",
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_general_read_db),
+):
+    """
+    List recipe summaries matching the filters, newest or best rated first. Further
+    pages are fetched with the cursor from the X-Next-Cursor header and the same
+    filters and sort.
+    """
+    Recipe = models.Recipe
+    query = select(*SUMMARY_COLUMNS)
+    if cuisine is not None:
+        query = query.where(Recipe.cuisine == cuisine)
+    if tags:
+        query = query.where(Recipe.tags.contains(tags))
+    if equipment is not None:
+        query = query.where(Recipe.needed_equipment.contained_by(equipment))
+    if ingredients:
+        query = query.where(Recipe.ingredient_names.contains(_ingredient_names(ingredients)))
+    if exclude_ingredients:
+        query = query.where(~Recipe.ingredient_names.overlap(_ingredient_names(exclude_ingredients)))
+    if min_calories is not None:
+        query = query.where(Recipe.calories >= min_calories)
+    if max_calories is not None:
+        query = query.where(Recipe.calories <= max_calories)
+    if max_prepare_time is not None:
+        query = query.where(Recipe.prepare_time <= max_prepare_time)
+    if min_servings is not None:
+        query = query.where(Recipe.servings >= min_servings)
+    if max_servings is not None:
+        query = query.where(Recipe.servings <= max_servings)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None and position.get("sort") != sort:
+        raise HTTPException(status_code=400, detail="Cursor belongs to a different sort")
+    try:
+        if sort == "rating":
+            if position:
+                query = query.where(
+                    tuple_(Recipe.rating_avg, Recipe.id) < (float(position["rating"]), int(position["id"]))
+                )
+            query = query.order_by(Recipe.rating_avg.desc(), Recipe.id.desc())
+        else:
+            if position:
+                query = query.where(Recipe.id < int(position["id"]))
+            query = query.order_by(Recipe.id.desc())
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    recipes = (await db.execute(query.limit(limit))).all()
+    if len(recipes) == limit:
+        last = recipes[-1]
+        set_next_cursor(response, {"sort": sort, "id": last.id, "rating": last.rating_avg})
+    return recipes
+
+
+def _ingredient_names(terms: List[str]) -> List[str]:
+    # Normalized like the stored names, so "2 tomaten" finds recipes with "tomaat"
+    return sorted({name for name in map(normalize_ingredient, terms) if name})
+
+
+@router.get("/pantry", response_model=list[schemas.PantryMatch])
+async def search_pantry(
+    have: List[str] = Query(..., description="Ingredients in the pantry"),
+    avoid: Optional[List[str]] = Query(None, description="Ingredients the recipes must not use"),
+    max_missing: int = Query(PANTRY_MAX_MISSING, ge=0, le=PANTRY_MAX_MISSING),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_general_read_db),
+):
+    """
+    Recipes that can be cooked with the pantry, or by buying at most `max_missing`
+    ingredients: fewest missing first, then the most ingredients used.
+    """
+    have_names = _ingredient_names(have)
+    if not have_names:
+        return []
+    if len(have_names) > PANTRY_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {PANTRY_MAX_ITEMS} pantry ingredients")
+    avoid_names = _ingredient_names(avoid or [])
+    have_names = sorted((await db.execute(known_ingredients(have_names))).scalars())
+
+    columns = [*SUMMARY_COLUMNS, models.Recipe.ingredient_names]
+    # Recipes missing nothing rank first and their lookup is much narrower, so only widen if they don't fill the page
+    rows = (await db.execute(pantry_search(columns, have_names, avoid_names, 0, limit))).all()
+    if len(rows) < limit and max_missing > 0:
+        rows = (await db.execute(pantry_search(columns, have_names, avoid_names, max_missing, limit))).all()
+
+    pantry = set(have_names)
+    return [
+        schemas.PantryMatch(
+            **row._mapping, missing_ingredients=[name for name in row.ingredient_names if name not in pantry]
+        )
+        for row in rows
+    ]
+
 
 @router.get("/{recipe_id}", response_model=schemas.RecipeRead)
-def get_recipe(recipe_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(models.Recipe).filter_by(id=recipe_id).first()
+async def get_recipe(recipe_id: int, current_user: models.User = Depends(get_current_user), db: AsyncSession = Depends(get_general_read_db)):
+    return (await db.execute(select(models.Recipe).filter_by(id=recipe_id))).scalars().first()
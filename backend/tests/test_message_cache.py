@@ -0,0 +1,58 @@
+# backend/tests/test_message_cache.py
+"""
+Needs the chat database from .env; skipped when it can't be reached. Run from the
+backend directory:
+    python -m pytest tests
+"""
+from chat.cache import RecentMessageCache
+from utils.database import chat_session, notification_manager
+from utils.models import ChatRoomManager
+import asyncio
+import pytest
+import uuid
+
+
+async def _wait_for_notification(cache: RecentMessageCache, token: int):
+    for _ in range(50):
+        if cache.read_token() > token:
+            return
+        await asyncio.sleep(0.05)
+
+
+def test_prime_refuses_a_page_read_before_a_remote_write():
+    async def scenario():
+        await notification_manager.connect()
+        if not notification_manager.listening:
+            await notification_manager.close()
+            pytest.skip("chat database not reachable")
+        cache = RecentMessageCache()
+        notification_manager.on_message(cache.on_remote_write)
+        chat_id = str(uuid.uuid4())
+        try:
+            with chat_session() as reader, chat_session() as writer:
+                ChatRoomManager.add_message(writer, chat_id, "alice", "first")
+
+                # The read this worker primes the cache with...
+                token = cache.read_token()
+                page = ChatRoomManager.get_messages_page(reader, chat_id, limit=50)
+                reader.commit()
+                # ...and a message another worker commits before the prime
+                ChatRoomManager.add_message(writer, chat_id, "bob", "second")
+                await _wait_for_notification(cache, token)
+
+                cache.prime(chat_id, page, complete=len(page) < 50, token=token)
+                assert cache.recent(chat_id, 50) is None
+
+                # A read taken after that write is accepted and has both messages
+                token = cache.read_token()
+                page = ChatRoomManager.get_messages_page(reader, chat_id, limit=50)
+                cache.prime(chat_id, page, complete=len(page) < 50, token=token)
+                assert [message.message for message in cache.recent(chat_id, 50)] == ["first", "second"]
+
+                ChatRoomManager.remove_chat(writer, chat_id)
+        finally:
+            notification_manager.message_callbacks.discard(cache.on_remote_write)
+            cache.clear()
+            await notification_manager.close()
+
+    asyncio.run(scenario())
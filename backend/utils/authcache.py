@@ -0,0 +1,132 @@
+# backend/utils/authcache.py
+from collections import OrderedDict
+from typing import Optional, Tuple
+from utils.metrics import register_collector
+import os
+import threading
+import time
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+
+class _TTLCache:
+    """LRU dict whose entries also expire; callers hold the owner's lock."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+
+    def get(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AuthCache:
+    """
+    Per-worker cache for get_current_user and verify_token: decoded claims by token
+    and a read-only UserRead snapshot by username, both for at most `ttl` seconds
+    (and never past the token's own expiry). Changing or revoking something calls
+    `invalidate_user` / `invalidate_token`; other workers catch up within `ttl`.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self._claims = _TTLCache(max_entries)
+        self._users = _TTLCache(max_entries)
+        self._lock = threading.Lock()
+        # Invalidation sequence numbers, used to refuse storing a snapshot an update raced past
+        self._seq = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self.claim_hits = 0
+        self.claim_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+
+    def get_claims(self, token: str) -> Optional[dict]:
+        with self._lock:
+            claims = self._claims.get(token, time.monotonic())
+            if claims is None:
+                self.claim_misses += 1
+            else:
+                self.claim_hits += 1
+            return claims
+
+    def put_claims(self, token: str, claims: dict):
+        ttl = self.ttl
+        if "exp" in claims:
+            ttl = min(ttl, claims["exp"] - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._claims.put(token, claims, time.monotonic() + ttl)
+
+    def read_token(self) -> int:
+        """Take before loading a user from the database and hand to `put_user`."""
+        return self._seq
+
+    def get_user(self, username: str):
+        with self._lock:
+            user = self._users.get(username, time.monotonic())
+            if user is None:
+                self.user_misses += 1
+            else:
+                self.user_hits += 1
+            return user
+
+    def put_user(self, username: str, user, token: int):
+        with self._lock:
+            if self._invalidated.get(username, -1) > token:
+                return
+            self._users.put(username, user, time.monotonic() + self.ttl)
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            self._users.pop(username)
+            self._seq += 1
+            self._invalidated[username] = self._seq
+            self._invalidated.move_to_end(username)
+            while len(self._invalidated) > self._users.max_entries:
+                self._invalidated.popitem(last=False)
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            self._claims.pop(token)
+
+    def metrics(self):
+        with self._lock:
+            claim_lookups = self.claim_hits + self.claim_misses
+            user_lookups = self.user_hits + self.user_misses
+            return {
+                "claims": len(self._claims),
+                "users": len(self._users),
+                "claim_hits_total": self.claim_hits,
+                "claim_misses_total": self.claim_misses,
+                "user_hits_total": self.user_hits,
+                "user_misses_total": self.user_misses,
+                "claim_hit_ratio": self.claim_hits / claim_lookups if claim_lookups else 0,
+                "user_hit_ratio": self.user_hits / user_lookups if user_lookups else 0,
+            }
+
+
+auth_cache = AuthCache()
+register_collector("auth_cache", auth_cache.metrics)
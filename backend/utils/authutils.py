@@ -3,22 +3,23 @@ from datetime import datetime, timedelta
 import datetime as dt
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 # from utils import models
 from utils.models import User, BlacklistedToken
-from utils.database import general_session
+from utils.schemas import UserRead
+from utils.database import general_async_session, get_general_db
+from utils.authcache import auth_cache
+from utils.passwords import pwd_context
+from utils.revocation import load_revocations, revocation_list, token_id
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import uuid
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-def get_db():
-    db = general_session()
-    try:
-        yield db
-    finally:
-        db.close()
 
 import logging
 logging.basicConfig(level=logging.INFO)  # Configure logging level globally
@@ -45,7 +46,6 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY not found in environment variables")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
@@ -67,29 +67,60 @@ def authenticate_user(username: str, password: str, db: Session):
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.now(dt.UTC) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt, expire
 
 # Add token to blacklist
-def add_token_to_blacklist(token: str, db: Session):
-    """Add the token to the blacklist table."""
-    blacklisted_token = BlacklistedToken(token=token)
-    db.add(blacklisted_token)
-    db.commit()
+async def add_token_to_blacklist(token: str, db: AsyncSession):
+    """Revoke the token until it expires. Raises JWTError for tokens that are invalid anyway."""
+    claims = decode_token(token)
+    jti = token_id(token, claims)
+    expires_at = datetime.fromtimestamp(claims["exp"], dt.UTC).replace(tzinfo=None) if "exp" in claims else None
+    await db.execute(pg_insert(BlacklistedToken).values(jti=jti, expires_at=expires_at).on_conflict_do_nothing())
+    await db.commit()
+    revocation_list.add(jti)
+    auth_cache.invalidate_token(token)
 
 
 # Check if token is blacklisted
-def is_token_blacklisted(token: str, db: Session) -> bool:
-    """Check if the token is in the blacklist."""
-    return db.query(BlacklistedToken).filter(BlacklistedToken.token == token).first() is not None
+async def is_token_blacklisted(token: str, db: AsyncSession, claims: Optional[dict] = None) -> bool:
+    """Check if the token was revoked; a Bloom filter answers without a query for almost every token."""
+    claims = claims if claims is not None else decode_token(token)
+    jti = token_id(token, claims)
+    if not revocation_list.loaded:
+        # Normally done in the lifespan; off the event loop and only once if it wasn't
+        await load_revocations()
+    return revocation_list.might_be_revoked(jti) and await db.run_sync(revocation_list.confirm, jti)
+
+
+def decode_token(token: str) -> dict:
+    """Decode and verify a JWT, reusing the claims of tokens seen recently. Raises JWTError."""
+    payload = auth_cache.get_claims(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        auth_cache.put_claims(token, payload)
+    return payload
+
+
+async def get_user_snapshot(username: str, db: AsyncSession) -> Optional[UserRead]:
+    """Read-only snapshot of a user for authentication, from the auth cache when possible."""
+    user = auth_cache.get_user(username)
+    if user is None:
+        read_token = auth_cache.read_token()
+        db_user = (await db.execute(select(User).where(User.username == username))).scalars().first()
+        if db_user is None:
+            return None
+        user = UserRead.from_orm(db_user)
+        auth_cache.put_user(username, user, read_token)
+    return user
 
 
 # Get the current user and check if the token is blacklisted
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_general_db)):
     logger.debug(f"Token passed to get_current_user: {token}")
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         logger.debug(f"Decoded payload: {payload}")
         if username is None:
@@ -98,7 +129,13 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
                 detail="Invalid credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        user = db.query(User).filter(User.username == username).first()
+        if await is_token_blacklisted(token, db, payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        user = await get_user_snapshot(username, db)
         logger.debug(f"Found user: {user}")
         if user is None:
             raise HTTPException(
@@ -116,11 +153,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         )
 
 
-def verify_token(token: str):
+async def verify_token(token: str):
     """Verifies a JWT token and returns the associated user."""
     try:
         # Decode the token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(
@@ -128,9 +165,14 @@ def verify_token(token: str):
                 detail="Invalid token payload",
             )
 
-        # Check if the user exists in the database
-        with general_session() as db:
-            user = db.query(User).filter(User.username == username).first()
+        # Check if the user exists (a session only connects on a cache miss)
+        async with general_async_session() as db:
+            if await is_token_blacklisted(token, db, payload):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token has been revoked",
+                )
+            user = await get_user_snapshot(username, db)
             if user is None:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -141,4 +183,4 @@ def verify_token(token: str):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
-        ) from e
\ No newline at end of file
+        ) from e
@@ -0,0 +1,115 @@
+# backend/utils/bootstrap.py
+"""
+Database bootstrap, run from the app's lifespan instead of at import time. It
+creates the databases if they are missing, then creates the tables and applies the
+idempotent upgrades of the general and chat schemas, each step for all databases in
+parallel.
+
+Applying a schema is skipped when the fingerprint stored in that database's
+`schema_fingerprints` table matches the one computed from the current models, so
+a warm restart only looks the fingerprints up. Set SKIP_DB_BOOTSTRAP to skip the
+whole thing when the schema is managed elsewhere (or for tooling that only imports
+the app).
+"""
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.schema import DDL, CreateIndex, CreateTable
+from utils.database import (Base, chat_db_config, chat_engine, ensure_database_exists, general_db_config,
+                            general_engine, recipe_db_config)
+from utils.models import (CHAT_SCHEMA_UPGRADES, GENERAL_SCHEMA_UPGRADES, chat_metadata, init_chat_schema,
+                          init_general_schema)
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+logger = logging.getLogger("uvicorn")
+
+SKIP_DB_BOOTSTRAP = os.getenv("SKIP_DB_BOOTSTRAP", "false").lower() in ("1", "true", "yes", "on")
+
+# Held while a worker applies a schema, so workers booting together do it once
+SCHEMA_LOCK_ID = 5_271_020
+
+
+def schema_fingerprint(metadata, upgrades) -> str:
+    """Hash of the DDL the models would emit (including after_create hooks) plus the upgrade statements."""
+    dialect = postgresql.dialect()
+    digest = hashlib.sha256()
+    for table in metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+        for listener in table.dispatch.after_create:
+            if isinstance(listener, DDL):
+                digest.update(listener.statement.encode())
+    for statement in upgrades:
+        digest.update(statement.encode())
+    return digest.hexdigest()
+
+
+def _stored_fingerprint(conn, name: str):
+    try:
+        return conn.execute(
+            text("SELECT fingerprint FROM schema_fingerprints WHERE name = :name"), {"name": name}
+        ).scalar()
+    except ProgrammingError:
+        # Table not created yet: a fresh database
+        conn.rollback()
+        return None
+
+
+def apply_schema(engine, name: str, init_schema, fingerprint: str) -> bool:
+    """Run `init_schema(engine)` unless the database already has this fingerprint; True if it ran."""
+    with engine.connect() as conn:
+        if _stored_fingerprint(conn, name) == fingerprint:
+            return False
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": SCHEMA_LOCK_ID})
+        try:
+            # Another worker may have finished while we waited for the lock
+            if _stored_fingerprint(conn, name) == fingerprint:
+                return False
+            conn.commit()
+            init_schema(engine)
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_fingerprints "
+                "(name VARCHAR PRIMARY KEY, fingerprint VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL DEFAULT now())"
+            ))
+            conn.execute(text(
+                "INSERT INTO schema_fingerprints (name, fingerprint) VALUES (:name, :fingerprint) "
+                "ON CONFLICT (name) DO UPDATE SET fingerprint = excluded.fingerprint, applied_at = now()"
+            ), {"name": name, "fingerprint": fingerprint})
+            conn.commit()
+            return True
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SCHEMA_LOCK_ID})
+            conn.commit()
+
+
+async def bootstrap():
+    """Create missing databases and bring both schemas up to date."""
+    if SKIP_DB_BOOTSTRAP:
+        logger.info("Skipping database bootstrap (SKIP_DB_BOOTSTRAP)")
+        return
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_in_threadpool(ensure_database_exists, config)
+        for config in (general_db_config, chat_db_config, recipe_db_config)
+    ))
+    general_applied, chat_applied = await asyncio.gather(
+        run_in_threadpool(
+            apply_schema, general_engine, "general", init_general_schema,
+            schema_fingerprint(Base.metadata, GENERAL_SCHEMA_UPGRADES),
+        ),
+        run_in_threadpool(
+            apply_schema, chat_engine, "chat", init_chat_schema,
+            schema_fingerprint(chat_metadata, CHAT_SCHEMA_UPGRADES),
+        ),
+    )
+    logger.info(
+        f"Database bootstrap done in {time.perf_counter() - start:.2f}s "
+        f"(general schema {'applied' if general_applied else 'up to date'}, "
+        f"chat schema {'applied' if chat_applied else 'up to date'})"
+    )
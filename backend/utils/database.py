@@ -1,6 +1,11 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from utils.metrics import register_collector
+from utils.pooling import (DB_SHARED_POOL, InstrumentedAsyncQueuePool, InstrumentedQueuePool, PoolBudget,
+                           pool_options, shared_pool_options)
+from utils.sqlstats import instrument_engine
 # from utils.models import Recipe, Ingredient, InstructionStep, UserRecipeRating
 import os
 import sql
@@ -8,9 +13,9 @@ import psycopg2
 from dotenv import load_dotenv
 import logging
 import json
+import asyncio
 import asyncpg
-from fastapi import WebSocket
-from typing import Dict
+from typing import Awaitable, Callable, Dict, Set
 
 # Setup Logging
 logger = logging.getLogger("uvicorn")
@@ -97,61 +102,234 @@ def ensure_database_exists(db_config):
     except Exception as e:
         logger.error(f"Error ensuring database '{db_config['name']}' exists: {e}")
 
-# Ensure both databases exist
-ensure_database_exists(general_db_config)
-ensure_database_exists(chat_db_config)
-ensure_database_exists(recipe_db_config)
+# Creating the databases is part of the startup bootstrap (utils/bootstrap.py), not of importing this module
+
+# Pool settings come from the environment (see utils/pooling.py)
+if DB_SHARED_POOL:
+    general_pool_options = chat_pool_options = shared_pool_options()
+    _budget_size = general_pool_options["pool_size"] + general_pool_options["max_overflow"]
+    sync_budget, async_budget = PoolBudget(_budget_size), PoolBudget(_budget_size, is_async=True)
+else:
+    general_pool_options, chat_pool_options = pool_options("GENERAL"), pool_options("CHAT")
+    sync_budget = async_budget = None
 
 # SQLAlchemy session setup
-general_engine = create_engine(general_db_url)
+general_engine = create_engine(
+    general_db_url, poolclass=InstrumentedQueuePool, pool_budget=sync_budget, **general_pool_options
+)
 general_session = sessionmaker(autocommit=False, autoflush=False, bind=general_engine)
 
-chat_engine = create_engine(chat_db_url)
+chat_engine = create_engine(
+    chat_db_url, poolclass=InstrumentedQueuePool, pool_budget=sync_budget, **chat_pool_options
+)
 chat_session = sessionmaker(autocommit=False, autoflush=False, bind=chat_engine)
+
+# Async engines for code running on the event loop: request handlers and WebSocket message writes.
+# The sync engines remain for scripts, background jobs and run_sync.
+general_async_engine = create_async_engine(
+    general_db_url.replace("postgresql://", "postgresql+asyncpg://", 1),
+    poolclass=InstrumentedAsyncQueuePool, pool_budget=async_budget, **general_pool_options,
+)
+general_async_session = async_sessionmaker(bind=general_async_engine, autoflush=False, expire_on_commit=False)
+
+chat_async_engine = create_async_engine(
+    chat_db_url.replace("postgresql://", "postgresql+asyncpg://", 1),
+    poolclass=InstrumentedAsyncQueuePool, pool_budget=async_budget, **chat_pool_options,
+)
+chat_async_session = async_sessionmaker(bind=chat_async_engine, autoflush=False, expire_on_commit=False)
+
+# Read through engine.pool on every scrape: dispose() replaces the pool object
+register_collector("db_pool_general", lambda: general_engine.pool.metrics())
+register_collector("db_pool_chat", lambda: chat_engine.pool.metrics())
+register_collector("db_pool_general_async", lambda: general_async_engine.sync_engine.pool.metrics())
+register_collector("db_pool_chat_async", lambda: chat_async_engine.sync_engine.pool.metrics())
+
+# Per-request query counts and timings (see utils/sqlstats.py)
+for _engine in (general_engine, chat_engine, general_async_engine.sync_engine, chat_async_engine.sync_engine):
+    instrument_engine(_engine)
+
+
+# FastAPI dependencies: one AsyncSession per request
+async def get_general_db():
+    async with general_async_session() as db:
+        yield db
+
+
+async def get_chat_db():
+    async with chat_async_session() as db:
+        yield db
 #
 # recipe_engine = create_engine(recipe_db_url)
 # recipe_session = sessionmaker(autocommit=False, autoflush=False, bind=recipe_engine)
 
 # Notification manager for chat database
+NEW_MESSAGE_CHANNEL = "new_message"
+# Payload: a chat id whose cached messages are stale everywhere, e.g. because it was deleted
+CHAT_INVALIDATE_CHANNEL = "chat_invalidate"
+LISTEN_RECONNECT_MAX_SECONDS = float(os.getenv("CHAT_LISTEN_RECONNECT_MAX_SECONDS", 30))
+
+
 class NotificationManager:
+    """
+    Owns the single asyncpg LISTEN connection for the chat database and fans
+    `new_message` notifications out to the callbacks subscribed to that chat, and
+    `chat_invalidate` ones to every invalidation callback.
+
+    When the connection drops it reconnects with backoff. Notifications sent in the
+    meantime are lost, so the reset callbacks run both when the loss is noticed and
+    after reconnecting; state kept current by notifications should be dropped there.
+    """
+
     def __init__(self, dsn: str):
         self.dsn = dsn
         self.connection = None
-        self.listeners: Dict[str, WebSocket] = {}
+        self.subscribers: Dict[str, Set[Callable[[str, str], Awaitable[None]]]] = {}
+        self.invalidation_callbacks: Set[Callable[[str], None]] = set()
+        self.message_callbacks: Set[Callable[[str, str], None]] = set()
+        self.reset_callbacks: Set[Callable[[], None]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._reconnect_task = None
+        self._closing = False
+        self.reconnects = 0
+
+    @property
+    def listening(self) -> bool:
+        return self.connection is not None and not self.connection.is_closed()
 
     async def connect(self):
+        """Connect and listen; on failure keep retrying in the background."""
+        self._closing = False
+        if not await self._listen():
+            self._schedule_reconnect()
+
+    async def _listen(self) -> bool:
         try:
             logger.info("Attempting to connect to PostgreSQL...")
-            self.connection = await asyncpg.connect(self.dsn)
-            await self.connection.add_listener('new_message', self.notification_handler)
+            connection = await asyncpg.connect(self.dsn)
+            await connection.add_listener(NEW_MESSAGE_CHANNEL, self.notification_handler)
+            await connection.add_listener(CHAT_INVALIDATE_CHANNEL, self.invalidation_handler)
+            connection.add_termination_listener(self._on_terminated)
+            self.connection = connection
             logger.info("Successfully connected to PostgreSQL and added notification listener.")
+            return True
         except Exception as e:
             logger.error(f"Failed to connect to PostgreSQL: {e}")
             self.connection = None
+            return False
+
+    async def close(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self.connection:
+            connection, self.connection = self.connection, None
+            await connection.remove_listener(NEW_MESSAGE_CHANNEL, self.notification_handler)
+            await connection.remove_listener(CHAT_INVALIDATE_CHANNEL, self.invalidation_handler)
+            await connection.close()
+
+    def _on_terminated(self, connection):
+        if self._closing or connection is not self.connection:
+            return
+        logger.error("Lost the chat notification connection; reconnecting")
+        self.connection = None
+        self._reset()
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._closing or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 0.5
+        while not self._closing:
+            await asyncio.sleep(delay)
+            if await self._listen():
+                self.reconnects += 1
+                # Whatever was cached while nobody listened may have missed a notification
+                self._reset()
+                return
+            delay = min(delay * 2, LISTEN_RECONNECT_MAX_SECONDS)
+
+    def _reset(self):
+        for callback in tuple(self.reset_callbacks):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error resetting after a notification connection change: {e}")
+
+    def invalidation_handler(self, connection, pid, channel, payload):
+        for callback in tuple(self.invalidation_callbacks):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Error invalidating chat {payload}: {e}")
 
-    async def notification_handler(self, connection, pid, channel, payload):
+    def notification_handler(self, connection, pid, channel, payload):
+        """Parse the payload once and only wake the subscribers of that chat."""
         try:
             message_id, chat_id = payload.split(':')
-            logger.info(f"New message in chat {chat_id} with ID: {message_id}")
-            if chat_id in self.listeners:
-                for websocket in self.listeners[chat_id]:
-                    await websocket.send_text(json.dumps({"message_id": message_id, "chat_id": chat_id}))
+        except ValueError:
+            logger.error(f"Malformed notification payload: {payload}")
+            return
+
+        for callback in tuple(self.message_callbacks):
+            try:
+                callback(chat_id, message_id)
+            except Exception as e:
+                logger.error(f"Error handling notification for chat {chat_id}: {e}")
+
+        callbacks = self.subscribers.get(chat_id)
+        if not callbacks:
+            return
+        for callback in tuple(callbacks):
+            task = asyncio.ensure_future(self._dispatch(callback, chat_id, message_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _dispatch(callback, chat_id: str, message_id: str):
+        try:
+            await callback(chat_id, message_id)
         except Exception as e:
-            logger.error(f"Error handling notification: {e}")
+            logger.error(f"Error handling notification for chat {chat_id}: {e}")
+
+    def subscribe(self, chat_id: str, callback: Callable[[str, str], Awaitable[None]]):
+        """Call `callback(chat_id, message_id)` for every new message in `chat_id`."""
+        self.subscribers.setdefault(chat_id, set()).add(callback)
+
+    def unsubscribe(self, chat_id: str, callback: Callable[[str, str], Awaitable[None]]):
+        callbacks = self.subscribers.get(chat_id)
+        if callbacks is None:
+            return
+        callbacks.discard(callback)
+        if not callbacks:
+            del self.subscribers[chat_id]
+
+    def on_message(self, callback: Callable[[str, str], None]):
+        """Call `callback(chat_id, message_id)` synchronously for every new message, subscribed to or not."""
+        self.message_callbacks.add(callback)
+
+    def on_invalidate(self, callback: Callable[[str], None]):
+        """Call `callback(chat_id)` whenever any process publishes a chat_invalidate for it."""
+        self.invalidation_callbacks.add(callback)
 
-    def register_listener(self, chat_id: str, websocket: WebSocket):
-        if chat_id not in self.listeners:
-            self.listeners[chat_id] = []
-        self.listeners[chat_id].append(websocket)
+    def on_reset(self, callback: Callable[[], None]):
+        """Call `callback()` when notifications may have been missed: on connection loss and reconnect."""
+        self.reset_callbacks.add(callback)
 
-    def unregister_listener(self, chat_id: str, websocket: WebSocket):
-        if chat_id in self.listeners:
-            self.listeners[chat_id].remove(websocket)
-            if not self.listeners[chat_id]:
-                del self.listeners[chat_id]
+    def metrics(self) -> dict:
+        # The LISTEN connection is dedicated and long-lived, so it sits outside the pools
+        return {
+            "connected": int(self.listening),
+            "chats": len(self.subscribers),
+            "reconnects_total": self.reconnects,
+        }
 
 # Initialize NotificationManager for chat database
 notification_manager = NotificationManager(dsn=chat_db_url)
+register_collector("db_listen", notification_manager.metrics)
 
 async def start_listening():
     await notification_manager.connect()
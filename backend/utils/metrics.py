@@ -0,0 +1,86 @@
+# backend/utils/metrics.py
+from bisect import bisect_left
+from typing import Callable, Dict, Sequence, Tuple
+import logging
+import threading
+
+logger = logging.getLogger("uvicorn")
+
+METRIC_PREFIX = "foodmate"
+
+# Components register a callable returning a flat dict of numeric values
+_collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+_histograms: Dict[str, "Histogram"] = {}
+
+
+def register_collector(name: str, collector: Callable[[], Dict[str, float]]):
+    """Expose the values returned by `collector` on the /metrics endpoint under `name`."""
+    _collectors[name] = collector
+
+
+class Histogram:
+    """A labelled Prometheus histogram; one series per distinct tuple of label values."""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        # label values -> [count per bucket (the last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: Tuple[str, ...], value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        name = f"{METRIC_PREFIX}_{self.name}"
+        lines = [f"# HELP {name} {self.help}", f"# TYPE {name} histogram"]
+        with self._lock:
+            series = [(values, list(counts), total) for values, (counts, total) in self._series.items()]
+        for values, counts, total in series:
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {float(total)}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def register_histogram(histogram: Histogram) -> Histogram:
+    """Expose `histogram` on the /metrics endpoint and return it."""
+    _histograms[histogram.name] = histogram
+    return histogram
+
+
+def collect() -> Dict[str, Dict[str, float]]:
+    snapshot = {}
+    for name, collector in _collectors.items():
+        try:
+            snapshot[name] = collector()
+        except Exception as e:
+            logger.error(f"Error collecting metrics for {name}: {e}")
+    return snapshot
+
+
+def render_prometheus() -> str:
+    """Render every registered collector in the Prometheus text exposition format."""
+    lines = []
+    for name, values in collect().items():
+        for key, value in values.items():
+            lines.append(f"{METRIC_PREFIX}_{name}_{key} {float(value)}")
+    for histogram in _histograms.values():
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
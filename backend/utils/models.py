@@ -1,11 +1,17 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, UniqueConstraint,select,inspect, Table, insert
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Text, DateTime, Float, UniqueConstraint,select, Table, insert, delete, MetaData, DDL, event, Index, Computed, func, text, literal_column, literal, true, and_, or_, PrimaryKeyConstraint, bindparam, LargeBinary
+from sqlalchemy.sql import Select
+from collections import OrderedDict
+from typing import NamedTuple
 from datetime import datetime as dt
 import datetime
 from sqlalchemy.orm import relationship, Mapped, Session
-from utils.database import Base
+from utils.database import Base, CHAT_INVALIDATE_CHANNEL
 
-from sqlalchemy.dialects.postgresql import JSON, UUID,JSONB, ARRAY
+from sqlalchemy.dialects.postgresql import JSON, UUID,JSONB, ARRAY, TSVECTOR, insert as pg_insert
 import uuid
+import json
+import os
+import zlib
 
 
 # recipe_ingredient_association = Table(
@@ -67,6 +73,47 @@ class Recipe(Base):
     tags = Column(ARRAY(String), nullable=True)
     source = Column(String, nullable=True)
     image_url = Column(String, nullable=True)
+    # Kept up to date by /recipes/rate, so the list can sort on rating without aggregating
+    rating_avg = Column(Float, nullable=False, default=0, server_default=text("0"))
+    rating_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    # Canonical names of the ingredients (see recipes/ingredients.py), for "uses" / "avoids" filters
+    ingredient_names = Column(ARRAY(String), nullable=False, default=list, server_default=text("'{}'"))
+    # MinHash signature of the title and ingredient names, for near-duplicate detection (see recipes/dedup.py)
+    minhash = Column(LargeBinary, nullable=True)
+
+    __table_args__ = (
+        # Filters and keyset orders of /recipes/list; the recent order uses the primary key
+        Index("ix_recipes_cuisine_id", "cuisine", "id"),
+        Index("ix_recipes_calories", "calories"),
+        Index("ix_recipes_prepare_time", "prepare_time"),
+        Index("ix_recipes_servings", "servings"),
+        Index("ix_recipes_rating", "rating_avg", "id"),
+        Index("ix_recipes_tags", "tags", postgresql_using="gin"),
+        Index("ix_recipes_needed_equipment", "needed_equipment", postgresql_using="gin"),
+        Index("ix_recipes_ingredient_names", "ingredient_names", postgresql_using="gin"),
+    )
+
+
+class IngredientStat(Base):
+    """In how many recipes each canonical ingredient name occurs."""
+    __tablename__ = "ingredient_stats"
+
+    name = Column(String, primary_key=True)
+    recipes = Column(Integer, nullable=False, default=0)
+
+
+class RecipePantryKey(Base):
+    """
+    Inverted index behind the pantry search: tokens built from the rarest ingredients
+    of each recipe (see recipes/ingredients.pantry_keys).
+    """
+    __tablename__ = "recipe_pantry_keys"
+
+    key = Column(String, primary_key=True)
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+
+    # The primary key leads with the key; deleting a recipe and reindexing it look rows up by recipe
+    __table_args__ = (Index("ix_recipe_pantry_keys_recipe_id", "recipe_id"),)
 
 
 # class Ingredient(general_Base):
@@ -100,8 +147,10 @@ class BlacklistedToken(Base):
     __tablename__ = "blacklisted_tokens"
 
     id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True, index=True, nullable=False)
-    revoked_at = Column(DateTime, default=dt.now(datetime.timezone.utc), nullable=False)
+    token = Column(String, unique=True, index=True, nullable=True)  # Only set on rows from before jti
+    jti = Column(String, unique=True, index=True)  # See utils/revocation.token_id
+    expires_at = Column(DateTime, index=True)  # Expiry of the revoked token; the row is pruned after it
+    revoked_at = Column(DateTime, default=dt.utcnow, nullable=False)
 
 class ChatsMetadata(Base):
     __tablename__ = "chats_metadata"
@@ -113,39 +162,174 @@ class ChatsMetadata(Base):
     last_activity = Column(DateTime, default=dt.utcnow, onupdate=dt.utcnow, nullable=False)
     thread_id = Column(String)
 
+    __table_args__ = (
+        # Serves the `participants @> '["<user id>"]'` lookup behind the chat list
+        Index("ix_chats_metadata_participants", "participants",
+              postgresql_using="gin", postgresql_ops={"participants": "jsonb_path_ops"}),
+    )
+
     def user_is_participant(self, user_id):
         """Check if a user is a participant in the chat."""
         return str(user_id) in self.participants
 
-def create_chat_table(chat_id: str, metadata):
-    table_name = f"{chat_id}"  # Dynamic table name for each chat
+# Idempotent upgrades for general databases created before an index existed
+GENERAL_SCHEMA_UPGRADES = [
+    "CREATE INDEX IF NOT EXISTS ix_chats_metadata_participants ON chats_metadata USING gin (participants jsonb_path_ops)",
+    "ALTER TABLE blacklisted_tokens ADD COLUMN IF NOT EXISTS jti VARCHAR",
+    "ALTER TABLE blacklisted_tokens ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE blacklisted_tokens ALTER COLUMN token DROP NOT NULL",
+    "UPDATE blacklisted_tokens SET jti = encode(sha256(convert_to(token, 'UTF8')), 'hex') WHERE jti IS NULL AND token IS NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_blacklisted_tokens_jti ON blacklisted_tokens (jti)",
+    "CREATE INDEX IF NOT EXISTS ix_blacklisted_tokens_expires_at ON blacklisted_tokens (expires_at)",
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS rating_avg DOUBLE PRECISION NOT NULL DEFAULT 0",
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS rating_count INTEGER NOT NULL DEFAULT 0",
+    "UPDATE recipes SET rating_avg = r.avg, rating_count = r.count FROM "
+    "(SELECT recipe_id, avg(rating) AS avg, count(*) AS count FROM user_recipe_ratings GROUP BY recipe_id) r "
+    "WHERE recipes.id = r.recipe_id AND recipes.rating_count <> r.count",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_cuisine_id ON recipes (cuisine, id)",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_calories ON recipes (calories)",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_prepare_time ON recipes (prepare_time)",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_servings ON recipes (servings)",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_rating ON recipes (rating_avg, id)",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_tags ON recipes USING gin (tags)",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_needed_equipment ON recipes USING gin (needed_equipment)",
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS ingredient_names VARCHAR[] NOT NULL DEFAULT '{}'",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_ingredient_names ON recipes USING gin (ingredient_names)",
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS minhash BYTEA",
+    # ingredient_stats is counted up by recipes.ingredients.index_recipe; deletes, however made, count it down
+    """CREATE OR REPLACE FUNCTION uncount_recipe_ingredients() RETURNS trigger AS $$
+BEGIN
+    UPDATE ingredient_stats SET recipes = greatest(ingredient_stats.recipes - deleted.count, 0)
+      FROM (SELECT name, count(*) AS count FROM deleted_recipes, unnest(ingredient_names) AS name GROUP BY name) AS deleted
+     WHERE ingredient_stats.name = deleted.name;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql""",
+    "CREATE OR REPLACE TRIGGER recipes_uncount_ingredients AFTER DELETE ON recipes "
+    "REFERENCING OLD TABLE AS deleted_recipes FOR EACH STATEMENT EXECUTE FUNCTION uncount_recipe_ingredients()",
+]
+
+
+def init_general_schema(engine):
+    """Create the general database tables and apply the idempotent upgrades."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in GENERAL_SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+
+# Chat messages live in the chat database, so they get their own metadata
+chat_metadata = MetaData()
+
+CHAT_MESSAGE_PARTITIONS = int(os.getenv("CHAT_MESSAGE_PARTITIONS", 16))
+# Text search configuration used for message search. Replies are generated in Dutch.
+# Changing it only affects rows written after the search_vector column is rebuilt.
+CHAT_SEARCH_LANGUAGE = os.getenv("CHAT_SEARCH_LANGUAGE", "dutch")
+
+# All chats share one table, hash-partitioned on chat_id. The (chat_id, id) primary
+# key doubles as the index every per-chat query runs on.
+chat_messages = Table(
+    "chat_messages",
+    chat_metadata,
+    Column("chat_id", UUID(as_uuid=True), nullable=False),
+    Column("id", BigInteger, autoincrement=True, nullable=False),
+    Column("user_id", String, nullable=False),
+    Column("message", Text, nullable=False),
+    Column("timestamp", DateTime, default=dt.utcnow, nullable=False),
+    Column(
+        "search_vector",
+        TSVECTOR,
+        Computed(f"to_tsvector('{CHAT_SEARCH_LANGUAGE}'::regconfig, message)", persisted=True),
+    ),
+    PrimaryKeyConstraint("chat_id", "id"),
+    Index("ix_chat_messages_search_vector", "search_vector", postgresql_using="gin"),
+    postgresql_partition_by="HASH (chat_id)",
+)
+
+# Last message each user has read per chat, for unread counts
+chat_read_state = Table(
+    "chat_read_state",
+    chat_metadata,
+    Column("chat_id", UUID(as_uuid=True), primary_key=True),
+    Column("user_id", String, primary_key=True),
+    Column("last_read_id", BigInteger, nullable=False, default=0),
+)
+
+# Unread counts stop at this value; the UI shows "99+" anyway
+UNREAD_COUNT_CAP = 100
+
+# Idle chats moved out of chat_messages by the retention job (chat/retention.py).
+# `payload` is the zlib-compressed JSON list of [id, user_id, message, timestamp]
+# rows; it is cleared once the chat is restored on access.
+chat_archives = Table(
+    "chat_archives",
+    chat_metadata,
+    Column("chat_id", UUID(as_uuid=True), primary_key=True),
+    Column("archived_at", DateTime, default=dt.utcnow, nullable=False),
+    Column("restored_at", DateTime),
+    Column("message_count", Integer, default=0, nullable=False),
+    Column("payload", LargeBinary),
+    Index("ix_chat_archives_archived_at", "archived_at", postgresql_where=text("payload IS NOT NULL")),
+)
+
+
+class ArchivedMessage(NamedTuple):
+    """A message read straight from a chat_archives payload, shaped like a chat_messages row."""
+    chat_id: uuid.UUID
+    id: int
+    user_id: str
+    message: str
+    timestamp: dt
+
+
+# Idempotent upgrades for chat databases created before a column or index existed
+CHAT_SCHEMA_UPGRADES = [
+    f"ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{CHAT_SEARCH_LANGUAGE}'::regconfig, message)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_search_vector ON chat_messages USING gin (search_vector)",
+]
+
+for remainder in range(CHAT_MESSAGE_PARTITIONS):
+    event.listen(chat_messages, "after_create", DDL(
+        f"CREATE TABLE IF NOT EXISTS chat_messages_p{remainder} PARTITION OF chat_messages "
+        f"FOR VALUES WITH (MODULUS {CHAT_MESSAGE_PARTITIONS}, REMAINDER {remainder})"
+    ))
+
+# NOTIFY 'new_message' with "<message_id>:<chat_id>" for every insert. Bulk jobs can
+# SET LOCAL chat.skip_notify = 'on' to stay quiet.
+event.listen(chat_messages, "after_create", DDL("""
+CREATE OR REPLACE FUNCTION notify_new_message() RETURNS trigger AS $$
+BEGIN
+    IF coalesce(current_setting('chat.skip_notify', true), '') <> 'on' THEN
+        PERFORM pg_notify('new_message', NEW.id || ':' || NEW.chat_id);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""))
+event.listen(chat_messages, "after_create", DDL(
+    "CREATE TRIGGER new_message_trigger AFTER INSERT ON chat_messages "
+    "FOR EACH ROW EXECUTE FUNCTION notify_new_message()"
+))
+
+
+def init_chat_schema(engine):
+    """Create the chat database tables and apply the idempotent upgrades."""
+    chat_metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in CHAT_SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+
+def chat_uuid(chat_id) -> uuid.UUID:
+    """Normalise a chat id given as str or UUID; raises ValueError for anything else."""
+    return chat_id if isinstance(chat_id, uuid.UUID) else uuid.UUID(str(chat_id))
 
-    # Define the table dynamically
-    table = Table(
-        table_name,
-        metadata,
-        Column('id', Integer, primary_key=True, autoincrement=True, nullable=False),  # Auto-incrementing index
-        Column('user_id', String, nullable=False),  # Sender
-        Column('message', Text, nullable=False),  # Message content
-        Column('timestamp', DateTime, default=dt.utcnow, nullable=False),  # Timestamp for message
-    )
-
-    # Add the notification trigger to the chat table
-    table_name = f"chat_{chat_id}"
-    trigger_sql = f"""
-    CREATE TRIGGER new_message_trigger
-    AFTER INSERT ON {table_name}
-    FOR EACH ROW
-    EXECUTE FUNCTION notify_new_message();
-    """
-    metadata.bind.execute(trigger_sql)  # Execute the SQL for the trigger
-
-    return table
-# Example of how we can create a dynamic model
 
 def create_chat_model(chat_id, metadata):
     """
-    Dynamically create a chat table model.
+    Describe a legacy per-chat `chat_<id>` table. Only used to migrate those tables
+    into `chat_messages` (see chat/migrate_chat_tables.py).
     """
     table_name = f"chat_{chat_id}"  # Use a prefix for chat table names
     return Table(
@@ -158,6 +342,99 @@ def create_chat_model(chat_id, metadata):
         extend_existing=True,  # Prevent "already defined" errors
     )
 
+
+CHAT_TABLE_CACHE_SIZE = int(os.getenv("CHAT_TABLE_CACHE_SIZE", 1024))
+
+
+class LegacyChatTable(NamedTuple):
+    table: Table
+    batch: Select  # keyset batch: rows with id > :last_id, :batch_size at a time
+
+
+class ChatTableRegistry:
+    """
+    Bounded LRU of legacy per-chat Table objects and their precompiled batch select.
+    Evicted tables are removed from the metadata again, so walking any number of
+    chats keeps memory flat instead of growing the metadata one table per chat.
+    """
+
+    def __init__(self, metadata: MetaData, max_size: int = CHAT_TABLE_CACHE_SIZE):
+        self.metadata = metadata
+        self.max_size = max_size
+        self._tables: "OrderedDict[str, LegacyChatTable]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chat_id) -> LegacyChatTable:
+        key = str(chat_uuid(chat_id))
+        entry = self._tables.get(key)
+        if entry is not None:
+            self._tables.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        table = create_chat_model(key, self.metadata)
+        batch = (
+            select(table.c.id, table.c.user_id, table.c.message, table.c.timestamp)
+            .where(table.c.id > bindparam("last_id"))
+            .order_by(table.c.id)
+            .limit(bindparam("batch_size"))
+        )
+        entry = self._tables[key] = LegacyChatTable(table, batch)
+        while len(self._tables) > self.max_size:
+            _, evicted = self._tables.popitem(last=False)
+            self.metadata.remove(evicted.table)
+            self.evictions += 1
+        return entry
+
+    def __len__(self):
+        return len(self._tables)
+
+    def metrics(self):
+        return {
+            "tables": len(self._tables),
+            "metadata_tables": len(self.metadata.tables),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+legacy_chat_tables = ChatTableRegistry(MetaData())
+
+
+# Per-chat statements are built once; only the bound parameters change per call
+_message_columns = (chat_messages.c.id, chat_messages.c.user_id, chat_messages.c.message, chat_messages.c.timestamp)
+_in_chat = chat_messages.c.chat_id == bindparam("chat_id")
+
+INSERT_MESSAGE = insert(chat_messages).returning(chat_messages.c.id, chat_messages.c.timestamp)
+SELECT_LATEST_MESSAGE = select(chat_messages).where(_in_chat).order_by(chat_messages.c.id.desc()).limit(1)
+SELECT_MESSAGE_BY_ID = select(*_message_columns).where(_in_chat, chat_messages.c.id == bindparam("message_id"))
+SELECT_ALL_MESSAGES = select(*_message_columns).where(_in_chat).order_by(chat_messages.c.id)
+SELECT_MESSAGES_SINCE = (
+    select(*_message_columns)
+    .where(_in_chat, chat_messages.c.timestamp > bindparam("since"))
+    .order_by(chat_messages.c.id)
+)
+SELECT_PAGE_AFTER = (
+    select(*_message_columns)
+    .where(_in_chat, chat_messages.c.id > bindparam("after_id"))
+    .order_by(chat_messages.c.id)
+    .limit(bindparam("limit"))
+)
+SELECT_PAGE_NEWEST = (
+    select(*_message_columns).where(_in_chat).order_by(chat_messages.c.id.desc()).limit(bindparam("limit"))
+)
+SELECT_PAGE_BEFORE = (
+    select(*_message_columns)
+    .where(_in_chat, chat_messages.c.id < bindparam("before_id"))
+    .order_by(chat_messages.c.id.desc())
+    .limit(bindparam("limit"))
+)
+DELETE_CHAT = delete(chat_messages).where(_in_chat)
+
 class ChatRoomManager:
     """
     Provides methods for managing chatrooms, such as removing all messages, adding a message,
@@ -166,81 +443,340 @@ class ChatRoomManager:
 
     @staticmethod
     def remove_chat(session, chat_id):
-        """Remove the entire table for a specific chat identified by chat_id, if it exists."""
-        table_name = f"chat_messages_{chat_id}"
+        """Remove all messages of a specific chat identified by chat_id, including its archive."""
+        chat_id = chat_uuid(chat_id)
+        session.execute(DELETE_CHAT, {"chat_id": chat_id})
+        session.execute(delete(chat_archives).where(chat_archives.c.chat_id == chat_id))
+        session.execute(delete(chat_read_state).where(chat_read_state.c.chat_id == chat_id))
+        # Sent on commit; every worker drops the chat from its message cache
+        session.execute(select(func.pg_notify(CHAT_INVALIDATE_CHANNEL, str(chat_id))))
+        session.commit()
+
+    @staticmethod
+    def idle_chat_ids(session, chat_ids, cutoff):
+        """
+        The chats among `chat_ids` that are not archived, were not restored since
+        `cutoff`, and have no message newer than `cutoff`.
+        """
+        chats = func.unnest(
+            literal([chat_uuid(chat_id) for chat_id in chat_ids], ARRAY(UUID(as_uuid=True)))
+        ).table_valued("chat_id").render_derived(name="chats")
+        newest = (
+            select(chat_messages.c.timestamp)
+            .where(chat_messages.c.chat_id == chats.c.chat_id)
+            .order_by(chat_messages.c.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        stmt = select(chats.c.chat_id).select_from(
+            chats.outerjoin(chat_archives, chat_archives.c.chat_id == chats.c.chat_id)
+        ).where(
+            chat_archives.c.payload.is_(None),
+            or_(chat_archives.c.restored_at.is_(None), chat_archives.c.restored_at < cutoff),
+            func.coalesce(newest, literal(cutoff, DateTime)) <= cutoff,
+        )
+        return session.execute(stmt).scalars().all()
 
-        # Use the inspector to check if the table exists
-        inspector = inspect(session.bind)
-        if inspector.has_table(table_name):
-            # Drop the table
-            drop_statement = f"DROP TABLE {table_name}"
-            session.execute(drop_statement)
-            session.commit()
+    @staticmethod
+    def archive_chat(session, chat_id):
+        """
+        Move every message of a chat into its compressed chat_archives row, in one
+        transaction. Rows are taken from the DELETE itself, so a message written
+        meanwhile is either archived or left in place, never lost. Returns the
+        number of messages moved.
+        """
+        chat_id = chat_uuid(chat_id)
+        deleted = session.execute(
+            delete(chat_messages).where(chat_messages.c.chat_id == chat_id).returning(*_message_columns)
+        ).fetchall()
+        archived = session.execute(
+            select(chat_archives.c.payload).where(chat_archives.c.chat_id == chat_id).with_for_update()
+        ).scalar()
+
+        rows = json.loads(zlib.decompress(archived)) if archived is not None else []
+        rows.extend(
+            [row.id, row.user_id, row.message, row.timestamp.isoformat()]
+            for row in sorted(deleted, key=lambda row: row.id)
+        )
+        payload = zlib.compress(json.dumps(rows, ensure_ascii=False).encode(), 9)
 
+        stmt = pg_insert(chat_archives).values(
+            chat_id=chat_id, archived_at=dt.utcnow(), restored_at=None, message_count=len(rows), payload=payload
+        )
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[chat_archives.c.chat_id],
+            set_={
+                "archived_at": stmt.excluded.archived_at,
+                "restored_at": None,
+                "message_count": stmt.excluded.message_count,
+                "payload": stmt.excluded.payload,
+            },
+        ))
+        session.commit()
+        return len(deleted)
 
+    @staticmethod
+    def archived_chat_ids(session, chat_ids):
+        """The chats among `chat_ids` whose messages currently live in chat_archives."""
+        stmt = select(chat_archives.c.chat_id).where(
+            chat_archives.c.chat_id.in_([chat_uuid(chat_id) for chat_id in chat_ids]),
+            chat_archives.c.payload.isnot(None),
+        )
+        return session.execute(stmt).scalars().all()
 
     @staticmethod
-    def add_message(session, chat_id, user_id, message):
-        """Add a message to a specific chat identified by chat_id."""
-        # Dynamically create the table
-        ChatMessageTable = create_chat_model(chat_id, Base.metadata)
-
-        # Insert the message into the table
-        stmt = insert(ChatMessageTable).values(
-            user_id=user_id,
-            message=message,
-            timestamp=dt.utcnow()
+    def restore_chat(session, chat_id):
+        """
+        Put an archived chat's messages back into chat_messages, keeping their ids.
+        Returns the number of messages restored, or None when the chat was not archived.
+        """
+        chat_id = chat_uuid(chat_id)
+        payload = session.execute(
+            select(chat_archives.c.payload)
+            .where(chat_archives.c.chat_id == chat_id, chat_archives.c.payload.isnot(None))
+            .with_for_update()
+        ).scalar()
+        if payload is None:
+            session.rollback()
+            return None
+
+        rows = json.loads(zlib.decompress(payload))
+        if rows:
+            # Restored history must not reach connected clients as new messages
+            session.execute(text("SET LOCAL chat.skip_notify = 'on'"))
+            session.execute(pg_insert(chat_messages).on_conflict_do_nothing(), [
+                {"chat_id": chat_id, "id": message_id, "user_id": user_id, "message": message,
+                 "timestamp": dt.fromisoformat(timestamp)}
+                for message_id, user_id, message, timestamp in rows
+            ])
+        session.execute(
+            chat_archives.update()
+            .where(chat_archives.c.chat_id == chat_id)
+            .values(payload=None, restored_at=dt.utcnow())
         )
-        session.execute(stmt)
         session.commit()
+        return len(rows)
+
+    @staticmethod
+    def purge_archives(session, archived_before, limit):
+        """
+        Delete up to `limit` archives older than `archived_before`, with their read
+        markers. Returns the ids of the purged chats.
+        """
+        chat_ids = session.execute(
+            select(chat_archives.c.chat_id)
+            .where(chat_archives.c.payload.isnot(None), chat_archives.c.archived_at < archived_before)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if chat_ids:
+            session.execute(delete(chat_archives).where(chat_archives.c.chat_id.in_(chat_ids)))
+            session.execute(delete(chat_read_state).where(chat_read_state.c.chat_id.in_(chat_ids)))
+        session.commit()
+        return chat_ids
+
+    @staticmethod
+    def add_message(session, chat_id, user_id, message):
+        """
+        Add a message to a specific chat identified by chat_id.
+        Returns the stored row's id and timestamp.
+        """
+        stored = session.execute(INSERT_MESSAGE, {
+            "chat_id": chat_uuid(chat_id),
+            "user_id": user_id,
+            "message": message,
+            "timestamp": dt.utcnow(),
+        }).first()
+        session.commit()
+        return stored
+
+    @staticmethod
+    def add_messages(session, messages):
+        """
+        Insert many (chat_id, user_id, message, timestamp) tuples in one transaction.
+        Ids are drawn from the sequence up front, so the returned (id, timestamp)
+        pairs line up with the input order.
+        """
+        ids = session.execute(
+            text("SELECT nextval('chat_messages_id_seq') FROM generate_series(1, :count)"),
+            {"count": len(messages)},
+        ).scalars().all()
+        session.execute(insert(chat_messages), [
+            {"chat_id": chat_uuid(chat_id), "id": message_id, "user_id": user_id, "message": message, "timestamp": timestamp}
+            for message_id, (chat_id, user_id, message, timestamp) in zip(ids, messages)
+        ])
+        session.commit()
+        return [(message_id, timestamp) for message_id, (_, _, _, timestamp) in zip(ids, messages)]
 
     @staticmethod
     def get_latest_message(session, chat_id):
         """Retrieve the latest message from a specific chat identified by chat_id."""
-        # Dynamically create the model for the specific chat_id
-        ChatMessageModel = create_chat_model(chat_id, Base.metadata)
-
         try:
-            return session.query(ChatMessageModel).order_by(ChatMessageModel.timestamp.desc()).first()
+            return session.execute(SELECT_LATEST_MESSAGE, {"chat_id": chat_uuid(chat_id)}).first()
         except Exception as e:
             print(f"Error retrieving latest message: {e}")
             return None
 
+    @staticmethod
+    def get_message_by_id(session, chat_id, message_id):
+        """Retrieve a single message from a specific chat by its id."""
+        return session.execute(
+            SELECT_MESSAGE_BY_ID, {"chat_id": chat_uuid(chat_id), "message_id": int(message_id)}
+        ).first()
 
     @staticmethod
     def get_all_messages(session, chat_id):
         """
-        Retrieve all messages from a specific chat, ordered by timestamp.
+        Retrieve all messages from a specific chat, ordered by id.
         """
-        # Dynamically create the model for the specific chat_id
-        ChatMessageModel = create_chat_model(chat_id, Base.metadata)
+        return session.execute(SELECT_ALL_MESSAGES, {"chat_id": chat_uuid(chat_id)}).fetchall()
 
-        # Correct usage of select by passing individual columns
-        stmt = select(
-            ChatMessageModel.c.id,
-            ChatMessageModel.c.user_id,
-            ChatMessageModel.c.message,
-            ChatMessageModel.c.timestamp
-        ).order_by(ChatMessageModel.c.timestamp)
+    @staticmethod
+    def stream_messages(session, chat_ids, batch_size=1000):
+        """
+        Yield every message of the given chats, ordered by chat and id, through a
+        server-side cursor; only `batch_size` rows are held in memory at a time.
+        """
+        stmt = (
+            select(chat_messages.c.chat_id, *_message_columns)
+            .where(chat_messages.c.chat_id.in_([chat_uuid(chat_id) for chat_id in chat_ids]))
+            .order_by(chat_messages.c.chat_id, chat_messages.c.id)
+            .execution_options(yield_per=batch_size)
+        )
+        yield from session.execute(stmt)
 
-        # Execute the query and fetch all results
-        return session.execute(stmt).fetchall()
+    @staticmethod
+    def stream_archived_messages(session, chat_ids, batch_size=100):
+        """
+        Yield the messages kept in chat_archives for the given chats, ordered by chat
+        and id, without restoring them. Only one archive is decompressed at a time.
+        """
+        stmt = (
+            select(chat_archives.c.chat_id, chat_archives.c.payload)
+            .where(
+                chat_archives.c.chat_id.in_([chat_uuid(chat_id) for chat_id in chat_ids]),
+                chat_archives.c.payload.isnot(None),
+            )
+            .order_by(chat_archives.c.chat_id)
+            .execution_options(yield_per=batch_size)
+        )
+        for chat_id, payload in session.execute(stmt):
+            for message_id, user_id, message, timestamp in json.loads(zlib.decompress(payload)):
+                yield ArchivedMessage(chat_id, message_id, user_id, message, dt.fromisoformat(timestamp))
 
     @staticmethod
-    def search_messages(session, chat_id, query):
-        """Search for messages in a specific chat containing a specific string."""
-        # Dynamically create the model for the specific chat_id
-        ChatMessageModel = create_chat_model(chat_id, Base.metadata)
+    def get_messages_since(session, chat_id, since):
+        """Retrieve the messages of a chat newer than the `since` timestamp, oldest first."""
+        return session.execute(SELECT_MESSAGES_SINCE, {"chat_id": chat_uuid(chat_id), "since": since}).fetchall()
+
+    @staticmethod
+    def search_messages(session, chat_ids, query, limit=20, after_rank=None, after_id=None):
+        """
+        Full-text search over the messages of the given chats through the GIN-indexed
+        search_vector. Results are ordered by rank, then id, and carry a highlighted
+        snippet. Pass the last row's rank and id to fetch the next page.
+        """
+        ts_query = func.websearch_to_tsquery(literal_column(f"'{CHAT_SEARCH_LANGUAGE}'::regconfig"), query)
+        rank = func.ts_rank(chat_messages.c.search_vector, ts_query)
+        highlight = func.ts_headline(
+            literal_column(f"'{CHAT_SEARCH_LANGUAGE}'::regconfig"),
+            chat_messages.c.message,
+            ts_query,
+            "StartSel=<mark>, StopSel=</mark>, MaxFragments=2",
+        ).label("highlight")
 
-        return session.query(ChatMessageModel).filter(ChatMessageModel.message.ilike(f"%{query}%")).all()
+        stmt = select(
+            chat_messages.c.chat_id,
+            chat_messages.c.id,
+            chat_messages.c.user_id,
+            chat_messages.c.message,
+            chat_messages.c.timestamp,
+            rank.label("rank"),
+            highlight,
+        ).where(
+            chat_messages.c.chat_id.in_([chat_uuid(chat_id) for chat_id in chat_ids]),
+            chat_messages.c.search_vector.op("@@")(ts_query),
+        )
+        if after_rank is not None and after_id is not None:
+            stmt = stmt.where(or_(
+                rank < after_rank,
+                and_(rank == after_rank, chat_messages.c.id < after_id),
+            ))
+        stmt = stmt.order_by(rank.desc(), chat_messages.c.id.desc()).limit(limit)
+        return session.execute(stmt).fetchall()
 
     @staticmethod
-    def get_paginated_messages(session, chat_id, page, per_page):
-        """Retrieve messages with pagination."""
-        offset = (page - 1) * per_page
-        # Dynamically create the model for the specific chat_id
-        ChatMessageModel = create_chat_model(chat_id, Base.metadata)
+    def get_chat_previews(session, chat_ids, user_id):
+        """
+        For each chat, its newest message and how many messages from others `user_id`
+        has not read yet (capped at UNREAD_COUNT_CAP). One round trip, with an index
+        seek per chat instead of a scan of its history.
+        """
+        chats = func.unnest(
+            literal([chat_uuid(chat_id) for chat_id in chat_ids], ARRAY(UUID(as_uuid=True)))
+        ).table_valued("chat_id").render_derived(name="chats")
+
+        last_message = (
+            select(chat_messages.c.id, chat_messages.c.user_id, chat_messages.c.message, chat_messages.c.timestamp)
+            .where(chat_messages.c.chat_id == chats.c.chat_id)
+            .order_by(chat_messages.c.id.desc())
+            .limit(1)
+            .lateral("last_message")
+        )
+        unread = (
+            select(chat_messages.c.id)
+            .where(
+                chat_messages.c.chat_id == chats.c.chat_id,
+                chat_messages.c.id > func.coalesce(chat_read_state.c.last_read_id, 0),
+                chat_messages.c.user_id != user_id,
+            )
+            .limit(UNREAD_COUNT_CAP)
+            .correlate(chats, chat_read_state)
+            .subquery("unread")
+        )
+        unread_count = select(func.count()).select_from(unread).scalar_subquery()
+
+        stmt = select(
+            chats.c.chat_id,
+            last_message.c.id,
+            last_message.c.user_id,
+            last_message.c.message,
+            last_message.c.timestamp,
+            unread_count.label("unread_count"),
+        ).select_from(
+            chats
+            .outerjoin(chat_read_state, and_(
+                chat_read_state.c.chat_id == chats.c.chat_id, chat_read_state.c.user_id == user_id
+            ))
+            .outerjoin(last_message, true())
+        )
 
-        return session.query(ChatMessageModel).limit(per_page).offset(offset).all()
+        return {row.chat_id: row for row in session.execute(stmt)}
 
+    @staticmethod
+    def mark_read(session, chat_id, user_id, message_id):
+        """Move a user's read marker forward to `message_id`; it never moves back."""
+        stmt = pg_insert(chat_read_state).values(chat_id=chat_uuid(chat_id), user_id=user_id, last_read_id=message_id)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[chat_read_state.c.chat_id, chat_read_state.c.user_id],
+            set_={"last_read_id": func.greatest(chat_read_state.c.last_read_id, stmt.excluded.last_read_id)},
+        )
+        session.execute(stmt)
+        session.commit()
 
+    @staticmethod
+    def get_messages_page(session, chat_id, before_id=None, after_id=None, limit=50):
+        """
+        Retrieve one keyset page of messages, oldest first. Without `after_id` the page
+        ends just before `before_id` (or at the newest message); with `after_id` it
+        starts right after it. Runs on the (chat_id, id) index, so every page costs the same.
+        """
+        params = {"chat_id": chat_uuid(chat_id), "limit": limit}
+        if after_id is not None:
+            return session.execute(SELECT_PAGE_AFTER, {**params, "after_id": after_id}).fetchall()
+
+        if before_id is not None:
+            rows = session.execute(SELECT_PAGE_BEFORE, {**params, "before_id": before_id}).fetchall()
+        else:
+            rows = session.execute(SELECT_PAGE_NEWEST, params).fetchall()
+        return list(reversed(rows))
@@ -1,23 +1,25 @@
-from openai.types.beta.threads import TextContentBlock
-from sqlalchemy.orm import Session
-from fastapi import Depends
 from utils.database import general_session, chat_session
 from utils.schemas import RecipeBase
 from utils.models import ChatRoomManager, ChatsMetadata
 from recipes.recipes_utils import add_recipe_to_db, transform_recipe_json
-from openai import OpenAI
-from openai.types.beta.thread import Thread
-from openai.types.beta.assistant import Assistant
+from functools import lru_cache
 
 
 from pydantic import BaseModel
-from typing import List, Literal
+from typing import TYPE_CHECKING, List, Literal
 
 import logging
 import json
+import os
 import traceback
 import re
 
+# The openai package takes about a second to import; load it on first use instead of at startup
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from openai.types.beta.assistant import Assistant
+    from openai.types.beta.thread import Thread
+
 # Define a message model
 class Message(BaseModel):
     role: Literal["user", "assistant", "system"]
@@ -28,23 +30,6 @@ class MessagesResponse(BaseModel):
     data: List[Message]
 
 
-def get_general_db():
-    db = general_session()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-# Chat database connection
-def get_chat_db():
-    db = chat_session()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 logger = logging.getLogger("uvicorn")
 
 wanted_response = RecipeBase.schema()
@@ -52,12 +37,11 @@ wanted_response = RecipeBase.schema()
 llm_model = "gpt-4o-mini"
 
 
-def get_db():
-    db = general_session()
-    try:
-        yield db
-    finally:
-        db.close()
+@lru_cache(maxsize=None)
+def get_openai_client() -> "OpenAI":
+    from openai import OpenAI
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 def sanitize_json(json_str):
     """
@@ -112,8 +96,13 @@ def extract_json_from_messages(message):
 
 
 
-def process_openai_tasks(data, client: OpenAI, assistant: Assistant,
-                         thread: Thread, chat : ChatsMetadata , db: Session = Depends(get_general_db), chat_db: Session = Depends(get_chat_db)):
+def process_openai_tasks(data, client: "OpenAI", assistant: "Assistant",
+                         thread: "Thread", chat : ChatsMetadata):
+    from openai.types.beta.threads import TextContentBlock
+
+    # Runs as a background task after the request's sessions are gone, so it opens its own
+    db = general_session()
+    chat_db = chat_session()
     try:
         instructions = (
             "You are a master dietitian. The user is Dutch, so generate 3 unique recipes in Dutch. "
@@ -148,7 +137,9 @@ def process_openai_tasks(data, client: OpenAI, assistant: Assistant,
                                         try:
                                             recipe = transform_recipe_json(recipe)
                                             processed_recipe = add_recipe_to_db(recipe, db)
-                                            recipes_list.append(processed_recipe.id)  # Append to the list
+                                            # Near-duplicates come back as the existing recipe, possibly twice
+                                            if processed_recipe.id not in recipes_list:
+                                                recipes_list.append(processed_recipe.id)  # Append to the list
                                             logger.info(f"Converted to RecipeBase: {processed_recipe.title}")
 
                                         except Exception as e:
@@ -169,3 +160,6 @@ def process_openai_tasks(data, client: OpenAI, assistant: Assistant,
                             print(f"Unexpected content block type: {type(content_block)} - {content_block}")
     except Exception as e:
         logger.error(f"Error in background OpenAI task: {e}")
+    finally:
+        db.close()
+        chat_db.close()
@@ -0,0 +1,30 @@
+# backend/utils/pagination.py
+from fastapi import HTTPException, Response
+from typing import Optional
+import base64
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(position: dict) -> str:
+    """Pack a keyset position into an opaque, URL-safe cursor."""
+    raw = json.dumps(position, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+def set_next_cursor(response: Response, position: Optional[dict]):
+    """Advertise the next page through the X-Next-Cursor header, if there is one."""
+    if position is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(position)
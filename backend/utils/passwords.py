@@ -0,0 +1,128 @@
+# backend/utils/passwords.py
+"""
+Password hashing off the request threads. bcrypt is deliberately slow, so hashing
+and verifying run in a small process pool with its own concurrency limit instead of
+on Starlette's shared threadpool, where a burst of logins used to starve every other
+sync endpoint. Calls beyond PASSWORD_HASH_CONCURRENCY wait their turn (the wait is
+reported on /metrics); past PASSWORD_HASH_MAX_WAITING callers get a 503 straight away.
+
+The work factor is BCRYPT_ROUNDS. Hashes made with another cost are rehashed on the
+next successful login.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from typing import Optional, Tuple
+from utils.metrics import register_collector
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("uvicorn")
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", PASSWORD_HASH_WORKERS))
+PASSWORD_HASH_MAX_WAITING = int(os.getenv("PASSWORD_HASH_MAX_WAITING", 100))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+# Run inside the pool's processes
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        concurrency: int = PASSWORD_HASH_CONCURRENCY,
+        max_waiting: int = PASSWORD_HASH_MAX_WAITING,
+    ):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self._executor = None
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.hashes = 0
+        self.verifies = 0
+        self.rehashes = 0
+        self.rejected = 0
+        self.queue_seconds_sum = 0.0
+        self.queue_seconds_max = 0.0
+        self.work_seconds_sum = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many login attempts, try again")
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        queued = started_at - queued_at
+        self.queue_seconds_sum += queued
+        self.queue_seconds_max = max(self.queue_seconds_max, queued)
+
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.work_seconds_sum += time.perf_counter() - started_at
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        self.hashes += 1
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; the second value is a new hash when the stored one uses another cost."""
+        self.verifies += 1
+        valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            self.rehashes += 1
+        return valid, new_hash
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self):
+        calls = self.hashes + self.verifies
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "hashes_total": self.hashes,
+            "verifies_total": self.verifies,
+            "rehashes_total": self.rehashes,
+            "rejected_total": self.rejected,
+            "queue_seconds_sum": self.queue_seconds_sum,
+            "queue_seconds_max": self.queue_seconds_max,
+            "queue_seconds_avg": self.queue_seconds_sum / calls if calls else 0,
+            "work_seconds_sum": self.work_seconds_sum,
+        }
+
+
+password_hasher = PasswordHasher()
+register_collector("password_hashing", password_hasher.metrics)
@@ -0,0 +1,173 @@
+# backend/utils/pooling.py
+"""
+Connection pool settings and telemetry for the SQLAlchemy engines. Every engine is
+configured from the environment: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+DB_POOL_RECYCLE and DB_POOL_PRE_PING, each of which can be overridden per database
+with a GENERAL_ or CHAT_ prefix (e.g. CHAT_DB_POOL_SIZE).
+
+The pools record how long checkouts wait, how often they have to open overflow
+connections and how often they time out, for /metrics.
+
+With DB_SHARED_POOL on (both databases on one server), the general and chat engines
+draw from one budget of DB_POOL_SIZE + DB_MAX_OVERFLOW checked-out connections
+instead of a budget each. Postgres connections are bound to one database, so the
+engines still keep their own connections; each keeps half of DB_POOL_SIZE idle and
+may grow to the whole budget while the other is quiet.
+"""
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.util import await_only
+from typing import Optional
+import asyncio
+import os
+import threading
+import time
+
+DB_SHARED_POOL = os.getenv("DB_SHARED_POOL", "false").lower() in ("1", "true", "yes", "on")
+
+
+def _setting(prefix: str, name: str, default: str) -> str:
+    return os.getenv(f"{prefix}_DB_{name}", os.getenv(f"DB_{name}", default))
+
+
+def pool_options(prefix: str) -> dict:
+    """create_engine keyword arguments for the database named by `prefix` (GENERAL or CHAT)."""
+    return {
+        "pool_size": int(_setting(prefix, "POOL_SIZE", "5")),
+        "max_overflow": int(_setting(prefix, "MAX_OVERFLOW", "10")),
+        "pool_timeout": float(_setting(prefix, "POOL_TIMEOUT", "30")),
+        "pool_recycle": int(_setting(prefix, "POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _setting(prefix, "POOL_PRE_PING", "true").lower() in ("1", "true", "yes", "on"),
+    }
+
+
+def shared_pool_options() -> dict:
+    """Per-engine options under DB_SHARED_POOL; the budget itself is enforced by PoolBudget."""
+    options = pool_options("SHARED")
+    budget = options["pool_size"] + options["max_overflow"]
+    options["pool_size"] = max(1, options["pool_size"] // 2)
+    options["max_overflow"] = budget - options["pool_size"]
+    return options
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds_sum = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflows = 0
+        self.timeouts = 0
+
+    def record_checkout(self, waited: float, queued: bool):
+        self.checkouts += 1
+        if queued:
+            self.waits += 1
+        self.wait_seconds_sum += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class PoolBudget:
+    """A limit on checked-out connections shared by several pools of one kind (sync or async)."""
+
+    def __init__(self, size: int, is_async: bool = False):
+        self.size = size
+        self.is_async = is_async
+        self._semaphore = None if is_async else threading.BoundedSemaphore(size)
+        self.in_use = 0
+
+    def acquire(self, timeout: float) -> bool:
+        if self.is_async:
+            # The async pools check out inside SQLAlchemy's greenlet, so awaiting is allowed here
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.size)
+            try:
+                await_only(asyncio.wait_for(self._semaphore.acquire(), timeout))
+            except asyncio.TimeoutError:
+                return False
+        elif not self._semaphore.acquire(timeout=timeout):
+            return False
+        self.in_use += 1
+        return True
+
+    def release(self):
+        self.in_use -= 1
+        self._semaphore.release()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that measures checkout waits and overflow, optionally within a shared PoolBudget."""
+
+    def __init__(self, creator, pool_budget: Optional[PoolBudget] = None, **kwargs):
+        # create_engine passes pool_budget through because it is a named argument here
+        super().__init__(creator, **kwargs)
+        self.stats = PoolStats()
+        self.budget = pool_budget
+
+    def _exhausted(self) -> bool:
+        """No idle connection and no room to open one: the checkout has to queue."""
+        if self.budget is not None and self.budget.in_use >= self.budget.size:
+            return True
+        return self.checkedin() == 0 and -1 < self._max_overflow <= self._overflow
+
+    def _do_get(self):
+        start = time.perf_counter()
+        queued = self._exhausted()
+        if self.budget is not None and not self.budget.acquire(self._timeout):
+            self.stats.timeouts += 1
+            raise exc.TimeoutError(
+                f"Shared pool budget of {self.budget.size} connections reached, "
+                f"connection timed out, timeout {self._timeout:.2f}"
+            )
+        overflow = self._overflow
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            if self.budget is not None:
+                self.budget.release()
+            raise
+        except BaseException:
+            if self.budget is not None:
+                self.budget.release()
+            raise
+        if self._overflow > overflow and self._overflow > 0:
+            self.stats.overflows += 1
+        # Includes opening a new connection when the pool had none idle
+        self.stats.record_checkout(time.perf_counter() - start, queued)
+        return record
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            if self.budget is not None:
+                self.budget.release()
+
+    def recreate(self):
+        # Engine.dispose() swaps in a recreated pool; keep the counters and the shared budget
+        pool = super().recreate()
+        pool.stats = self.stats
+        pool.budget = self.budget
+        return pool
+
+    def metrics(self):
+        stats = self.stats
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts_total": stats.checkouts,
+            "waits_total": stats.waits,
+            "wait_seconds_sum": stats.wait_seconds_sum,
+            "wait_seconds_max": stats.wait_seconds_max,
+            "wait_seconds_avg": stats.wait_seconds_sum / stats.checkouts if stats.checkouts else 0,
+            "overflow_total": stats.overflows,
+            "timeouts_total": stats.timeouts,
+            "budget_in_use": self.budget.in_use if self.budget is not None else 0,
+        }
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    pass
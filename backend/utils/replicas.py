@@ -0,0 +1,225 @@
+# backend/utils/replicas.py
+"""
+Read replicas for GET endpoints. GENERAL_DATABASE_REPLICAS and CHAT_DATABASE_REPLICAS
+take comma-separated DSNs; without them every read stays on the primary.
+
+Routes that only read take `get_general_read_db` / `get_chat_read_db`, which hand
+out a session on a replica whose lag is at most REPLICA_MAX_LAG_SECONDS (measured
+every REPLICA_LAG_CHECK_SECONDS), round robin, and on the primary when none
+qualifies. A user who wrote something in the last READ_YOUR_WRITES_SECONDS reads
+from the primary, so they see their own changes: the middleware records successful
+non-GET requests per user on this worker and, for the other workers, answers with
+an X-Primary-Until header that the frontend sends back (and a cookie, for
+same-site clients).
+
+A replica whose WAL receiver is not streaming counts as unavailable, since with
+nothing coming in it has replayed everything it received and would look caught
+up. Reading pg_stat_wal_receiver.status takes pg_read_all_stats (or pg_monitor)
+for the replica user; without it every replica stays unavailable.
+
+Replica sessions are marked with `session.info["replica"]`, so callers can avoid
+caching what they read there or writing through them.
+"""
+from fastapi import Depends, Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from utils.authutils import decode_token, get_current_user
+from utils.database import chat_async_session, general_async_session
+from utils.metrics import register_collector
+from utils.pooling import InstrumentedAsyncQueuePool, pool_options
+from utils.sqlstats import instrument_engine
+from collections import OrderedDict
+from jose import JWTError
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("uvicorn")
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 2))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", 1))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+READ_YOUR_WRITES_COOKIE = "foodmate_primary_until"
+READ_YOUR_WRITES_HEADER = "X-Primary-Until"
+
+# Zero when the replica has replayed everything it received, so an idle primary does not look like lag;
+# NULL when it isn't receiving anything, which the stale replay timestamp would otherwise hide
+LAG_QUERY = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+
+def _async_dsn(dsn: str) -> str:
+    return dsn.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+class Replica:
+    def __init__(self, dsn: str, prefix: str):
+        self.engine = create_async_engine(
+            _async_dsn(dsn), poolclass=InstrumentedAsyncQueuePool, **pool_options(prefix)
+        )
+        instrument_engine(self.engine.sync_engine)
+        self.session = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        self.host = self.engine.url.host
+        # Unknown until the first check; until then reads stay on the primary
+        self.lag = None
+
+    async def check(self):
+        try:
+            async with self.engine.connect() as conn:
+                lag = (await conn.execute(LAG_QUERY)).scalar()
+        except Exception as e:
+            if self.lag is not None:
+                logger.warning(f"Replica {self.host} unavailable: {e}")
+            self.lag = None
+            return
+        if lag is None and self.lag is not None:
+            logger.warning(f"Replica {self.host} unavailable: WAL receiver not streaming")
+        self.lag = None if lag is None else float(lag)
+
+
+class ReplicaSet:
+    """The primary and replicas of one database."""
+
+    def __init__(self, name: str, primary: async_sessionmaker, dsns, max_lag: float = REPLICA_MAX_LAG_SECONDS):
+        self.name = name
+        self.primary = primary
+        self.replicas = [Replica(dsn, name.upper()) for dsn in dsns]
+        for index, replica in enumerate(self.replicas):
+            register_collector(f"db_pool_{name}_replica{index}", replica.engine.sync_engine.pool.metrics)
+        self.max_lag = max_lag
+        self._next = itertools.count()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.lag_fallbacks = 0
+        self.sticky_reads = 0
+
+    def session(self, sticky: bool = False):
+        """A session for reads: on a replica that is caught up enough, otherwise on the primary."""
+        if self.replicas and not sticky:
+            usable = [replica for replica in self.replicas if replica.lag is not None and replica.lag <= self.max_lag]
+            if usable:
+                self.replica_reads += 1
+                session = usable[next(self._next) % len(usable)].session()
+                session.info["replica"] = True
+                return session
+            self.lag_fallbacks += 1
+        elif sticky and self.replicas:
+            self.sticky_reads += 1
+        self.primary_reads += 1
+        return self.primary()
+
+    async def check(self):
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def metrics(self):
+        lags = [replica.lag for replica in self.replicas if replica.lag is not None]
+        return {
+            "replicas": len(self.replicas),
+            "replicas_usable": sum(lag <= self.max_lag for lag in lags),
+            "lag_seconds_max": max(lags, default=0),
+            "replica_reads_total": self.replica_reads,
+            "primary_reads_total": self.primary_reads,
+            "lag_fallbacks_total": self.lag_fallbacks,
+            "sticky_reads_total": self.sticky_reads,
+        }
+
+
+def _dsns(name: str):
+    return [dsn.strip() for dsn in os.getenv(name, "").split(",") if dsn.strip()]
+
+
+general_replicas = ReplicaSet("general", general_async_session, _dsns("GENERAL_DATABASE_REPLICAS"))
+chat_replicas = ReplicaSet("chat", chat_async_session, _dsns("CHAT_DATABASE_REPLICAS"))
+register_collector("db_replicas_general", general_replicas.metrics)
+register_collector("db_replicas_chat", chat_replicas.metrics)
+
+
+class ReadYourWrites:
+    """Users who wrote recently on this worker, until when their reads stay on the primary."""
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS, max_entries: int = 100_000):
+        self.window = window
+        self.max_entries = max_entries
+        self._until: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark(self, username: str) -> float:
+        until = time.time() + self.window
+        with self._lock:
+            self._until[username] = until
+            self._until.move_to_end(username)
+            while len(self._until) > self.max_entries:
+                self._until.popitem(last=False)
+        return until
+
+    def active(self, request: Request, username: str) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._until.get(username, 0) > now:
+                return True
+        for until in (request.headers.get(READ_YOUR_WRITES_HEADER), request.cookies.get(READ_YOUR_WRITES_COOKIE)):
+            try:
+                if until is not None and float(until) > now:
+                    return True
+            except ValueError:
+                pass
+        return False
+
+
+read_your_writes = ReadYourWrites()
+
+
+def _username(request: Request):
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return decode_token(authorization[7:]).get("sub")
+    except JWTError:
+        return None
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """Pin a user's reads to the primary for a short while after each successful write."""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400 and read_your_writes.window > 0:
+        username = _username(request)
+        if username is not None:
+            until = read_your_writes.mark(username)
+            response.headers[READ_YOUR_WRITES_HEADER] = f"{until:.3f}"
+            response.set_cookie(
+                READ_YOUR_WRITES_COOKIE, f"{until:.3f}", max_age=int(read_your_writes.window) + 1,
+                httponly=True, samesite="lax",
+            )
+    return response
+
+
+# FastAPI dependencies for routes that only read
+async def get_general_read_db(request: Request, current_user=Depends(get_current_user)):
+    async with general_replicas.session(read_your_writes.active(request, current_user.username)) as db:
+        yield db
+
+
+async def get_chat_read_db(request: Request, current_user=Depends(get_current_user)):
+    async with chat_replicas.session(read_your_writes.active(request, current_user.username)) as db:
+        yield db
+
+
+async def replica_lag_loop():
+    """Measure replica lag so reads only go to replicas that are caught up enough."""
+    while True:
+        await asyncio.gather(general_replicas.check(), chat_replicas.check())
+        await asyncio.sleep(REPLICA_LAG_CHECK_SECONDS)
@@ -0,0 +1,237 @@
+# backend/utils/revocation.py
+"""
+Token revocation without a query per request. Revoked token ids (the `jti` claim,
+or the SHA-256 of tokens issued without one) live in `blacklisted_tokens` together
+with the token's expiry. Each worker mirrors them into a Bloom filter, so checking
+a token that was never revoked, which is nearly every request, only hashes it. A
+filter hit is confirmed against the table before the request is refused.
+
+The filter is topped up incrementally every REVOCATION_REFRESH_SECONDS, and
+revocations made by this worker are added at once. Ids are handed out before their
+transaction commits, so a row can become visible after a higher one: each refresh
+re-reads the last REVOCATION_REFRESH_OVERLAP ids and adds the ones it hasn't seen.
+Rows are pruned when the token they revoke has expired, after which the filter is
+rebuilt, because a Bloom filter cannot forget.
+"""
+from datetime import datetime as dt, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_
+from utils.database import general_session
+from utils.models import BlacklistedToken
+from utils.metrics import register_collector
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger("uvicorn")
+
+REVOCATION_CAPACITY = int(os.getenv("REVOCATION_CAPACITY", 100_000))
+REVOCATION_ERROR_RATE = float(os.getenv("REVOCATION_ERROR_RATE", 0.001))
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", 5))
+REVOCATION_REFRESH_OVERLAP = int(os.getenv("REVOCATION_REFRESH_OVERLAP", 1000))
+REVOCATION_PRUNE_MINUTES = float(os.getenv("REVOCATION_PRUNE_MINUTES", 60))
+REVOCATION_PRUNE_BATCH_SIZE = int(os.getenv("REVOCATION_PRUNE_BATCH_SIZE", 5000))
+# Rows from before tokens carried an expiry are kept this long after revocation
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+
+
+def token_id(token: str, claims: dict) -> str:
+    """The id a token is revoked under: its jti, or a hash for tokens issued without one."""
+    return claims.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        for i in range(self.hashes):
+            yield (first + i * second) % size
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        for position in self._positions(item):
+            # Most tokens were never revoked and miss on the first bit or two
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevocationList:
+    def __init__(
+        self,
+        capacity: int = REVOCATION_CAPACITY,
+        error_rate: float = REVOCATION_ERROR_RATE,
+        overlap: int = REVOCATION_REFRESH_OVERLAP,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.overlap = overlap
+        self.filter = BloomFilter(capacity, error_rate)
+        # What the current filter was sized for; loads size it for twice the rows when that's more
+        self.filter_capacity = capacity
+        self.last_id = 0
+        # Ids already in the filter within the overlap window, so re-reading them doesn't count twice
+        self.recent_ids = set()
+        self.loaded = False
+        self._lock = threading.Lock()
+        # Held for a whole first load, so concurrent callers wait for it instead of starting their own
+        self._load_lock = threading.Lock()
+        self.checks = 0
+        self.filter_hits = 0
+        self.confirmed = 0
+
+    def load(self, db):
+        """Rebuild the filter from the table."""
+        rows = db.query(BlacklistedToken.id, BlacklistedToken.jti).filter(
+            BlacklistedToken.jti.isnot(None)
+        ).all()
+        filter_capacity = max(self.capacity, 2 * len(rows))
+        fresh = BloomFilter(filter_capacity, self.error_rate)
+        for row in rows:
+            fresh.add(row.jti)
+        last_id = max((row.id for row in rows), default=0)
+        with self._lock:
+            self.filter = fresh
+            self.filter_capacity = filter_capacity
+            self.last_id = last_id
+            self.recent_ids = {row.id for row in rows if row.id > last_id - self.overlap}
+            self.loaded = True
+
+    def ensure_loaded(self, db):
+        """Load the filter unless it already is; blocks while another thread loads it."""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self.load(db)
+
+    def refresh(self, db):
+        """Add the rows committed since the last load or refresh, including late commits of lower ids."""
+        if not self.loaded:
+            self.ensure_loaded(db)
+            return
+        rows = db.query(BlacklistedToken.id, BlacklistedToken.jti).filter(
+            BlacklistedToken.id > self.last_id - self.overlap, BlacklistedToken.jti.isnot(None)
+        ).order_by(BlacklistedToken.id).all()
+        with self._lock:
+            for row in rows:
+                if row.id not in self.recent_ids:
+                    self.filter.add(row.jti)
+                    self.recent_ids.add(row.id)
+            if rows:
+                self.last_id = max(self.last_id, rows[-1].id)
+            self.recent_ids = {row_id for row_id in self.recent_ids if row_id > self.last_id - self.overlap}
+        # Past capacity the false-positive rate climbs; the reload sizes it for twice the rows
+        if self.filter.count > self.filter_capacity:
+            self.load(db)
+
+    def add(self, jti: str):
+        with self._lock:
+            self.filter.add(jti)
+
+    def might_be_revoked(self, jti: str) -> bool:
+        """Filter lookup only: False is certain, True still needs `confirm`."""
+        self.checks += 1
+        if jti not in self.filter:
+            return False
+        self.filter_hits += 1
+        return True
+
+    def confirm(self, db, jti: str) -> bool:
+        revoked = db.query(BlacklistedToken.id).filter(BlacklistedToken.jti == jti).first() is not None
+        if revoked:
+            self.confirmed += 1
+        return revoked
+
+    def is_revoked(self, jti: str, db) -> bool:
+        """Cheap for tokens that were never revoked; a filter hit is confirmed in the database."""
+        self.ensure_loaded(db)
+        return self.might_be_revoked(jti) and self.confirm(db, jti)
+
+    def prune(self, db) -> int:
+        """Delete rows whose token has expired anyway, in batches; returns how many went."""
+        now = dt.utcnow()
+        expired = or_(
+            BlacklistedToken.expires_at < now,
+            BlacklistedToken.expires_at.is_(None)
+            & (BlacklistedToken.revoked_at < now - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        )
+        pruned = 0
+        while True:
+            ids = [row.id for row in db.query(BlacklistedToken.id).filter(expired).limit(REVOCATION_PRUNE_BATCH_SIZE)]
+            if not ids:
+                break
+            db.query(BlacklistedToken).filter(BlacklistedToken.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            pruned += len(ids)
+        if pruned:
+            self.load(db)
+        return pruned
+
+    def metrics(self):
+        return {
+            "entries": self.filter.count,
+            "filter_capacity": self.filter_capacity,
+            "filter_bytes": len(self.filter.bits),
+            "checks_total": self.checks,
+            "filter_hits_total": self.filter_hits,
+            "confirmed_total": self.confirmed,
+        }
+
+
+revocation_list = RevocationList()
+register_collector("auth_revocation", revocation_list.metrics)
+
+
+def _load():
+    with general_session() as db:
+        revocation_list.ensure_loaded(db)
+
+
+async def load_revocations():
+    """Load this worker's filter in the threadpool; the lifespan does this before serving requests."""
+    if not revocation_list.loaded:
+        await run_in_threadpool(_load)
+
+
+def _refresh(prune: bool):
+    with general_session() as db:
+        revocation_list.refresh(db)
+        if prune:
+            pruned = revocation_list.prune(db)
+            if pruned:
+                logger.info(f"Pruned {pruned} expired token revocations")
+
+
+async def revocation_loop():
+    """Keep this worker's filter current and prune expired rows now and then."""
+    last_prune = time.monotonic()
+    while True:
+        prune = time.monotonic() - last_prune >= REVOCATION_PRUNE_MINUTES * 60
+        try:
+            await run_in_threadpool(_refresh, prune)
+            if prune:
+                last_prune = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error refreshing token revocations: {e}")
+        await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
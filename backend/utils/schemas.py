@@ -24,6 +24,10 @@ class GoalEnum(str, Enum):
     maintain_weight = "maintain_weight"
     gain_weight = "gain_weight"
 
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
 # User Schemas
 class UserBase(BaseModel):
     username: str
@@ -140,6 +144,31 @@ class RecipeRead(RecipeBase):
     class Config:
         from_attributes = True
 
+class RecipeSummary(BaseModel):
+    """A recipe as shown in lists: without ingredients and instructions."""
+    id: int
+    title: str
+    prepare_time: int
+    cuisine: Optional[str]
+    servings: int
+    calories: float
+    needed_equipment: List[str]
+    tags: Optional[List[str]] = None
+    image_url: Optional[str] = None
+    rating_avg: float
+    rating_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class PantryMatch(RecipeSummary):
+    """A recipe found by the pantry search, with how much of it the pantry covers."""
+    matched: int
+    missing: int
+    missing_ingredients: List[str]
+
+
 class RecipeRating(BaseModel):
     recipe_id: int
     rating: int = Field(..., ge=1, le=5)  # 1 to 5 star rating
@@ -165,10 +194,21 @@ class ChatResponseSchema(BaseModel):
         from_attributes = True  # Enables compatibility with SQLAlchemy models
 
 
+class ChatMessagePreview(BaseModel):
+    id: int
+    user_id: str
+    message: str
+    timestamp: datetime
+
+    class Config:
+        from_attributes = True
+
 class ChatSummary(BaseModel):
     id: UUID
     display_name: str
     last_activity: datetime
+    last_message: Optional[ChatMessagePreview] = None
+    unread_count: int = 0
 
     class Config:
         from_attributes = True
@@ -193,6 +233,18 @@ class ChatMessageRead(ChatMessageBase):
     class Config:
         from_attributes = True
 
+class ChatSearchResult(BaseModel):
+    chat_id: UUID
+    id: int
+    user_id: str
+    message: str
+    timestamp: datetime
+    rank: float
+    highlight: str = Field(..., description="Message fragments with matches wrapped in <mark> tags.")
+
+    class Config:
+        from_attributes = True
+
 class ChatRoomActions(BaseModel):
     chatroom_id: str = Field(..., description="The unique identifier for the chatroom.")
 
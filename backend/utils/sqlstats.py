@@ -0,0 +1,204 @@
+# backend/utils/sqlstats.py
+"""
+Per-request SQL statistics. `instrument_engine` hooks the cursor events of an
+engine; while a request is being served, every statement run on an instrumented
+engine (from the handler, a dependency such as authentication, run_sync or the
+threadpool) is added to that request's RequestQueries through a context variable.
+
+Once the response body has been sent and the background tasks have run, the
+query count and database time are observed in histograms per route for /metrics,
+so statements run while a StreamingResponse is iterated are counted too. When a
+request runs more than SQL_QUERY_WARN_THRESHOLD statements, a warning names the
+route and the statement it repeated most, which is how N+1 loops show up.
+
+With SQL_DEBUG_HEADERS on, the counts are also returned as X-DB-* response headers
+together with the slowest statement. Headers go out before the body, so they can't
+include background tasks, and a streamed body gets `X-DB-Partial: true` because its
+statements are only counted up to the first chunk.
+
+Statements are reduced to a fingerprint (literals, parameters and IN/VALUES
+lists collapsed) so the repeats of one query compare equal.
+"""
+from collections import Counter
+from contextvars import ContextVar
+from fastapi import Request
+from functools import lru_cache
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
+from utils.metrics import Histogram, register_collector, register_histogram
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger("uvicorn")
+
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "false").lower() in ("1", "true", "yes", "on")
+SQL_QUERY_WARN_THRESHOLD = int(os.getenv("SQL_QUERY_WARN_THRESHOLD", 20))
+
+QUERIES_HEADER = "X-DB-Queries"
+TIME_HEADER = "X-DB-Time-Ms"
+SLOWEST_TIME_HEADER = "X-DB-Slowest-Ms"
+SLOWEST_HEADER = "X-DB-Slowest"
+PARTIAL_HEADER = "X-DB-Partial"
+DEBUG_HEADERS = [QUERIES_HEADER, TIME_HEADER, SLOWEST_TIME_HEADER, SLOWEST_HEADER, PARTIAL_HEADER]
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+\b"), "?"),
+    (re.compile(r"[0-9a-f]{8}[-_]?[0-9a-f]{4}[-_]?[0-9a-f]{4}[-_]?[0-9a-f]{4}[-_]?[0-9a-f]{12}", re.I), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"\?(?:\s*,\s*\?)+"), "?"),
+    (re.compile(r"(VALUES \([^()]*\))(?:\s*,\s*\([^()]*\))+", re.I), r"\1"),
+]
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """The statement with literals, parameters and list lengths taken out."""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class RequestQueries:
+    """The statements one request ran."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest = None
+        self.fingerprints = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[statement] += 1
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest = statement
+
+    def most_repeated(self):
+        """(fingerprint, times) of the statement run most often."""
+        counts = Counter()
+        for statement, times in self.fingerprints.items():
+            counts[fingerprint(statement)] += times
+        return counts.most_common(1)[0]
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("sql_request_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sqlstats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    started = conn.info.get("sqlstats_started")
+    if queries is not None and started:
+        queries.record(statement, time.perf_counter() - started.pop())
+
+
+def instrument_engine(engine):
+    """Count the statements `engine` (sync, or the sync_engine of an async one) runs per request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+queries_per_request = register_histogram(Histogram(
+    "http_db_queries", "Statements run per request", (1, 2, 3, 5, 10, 20, 50, 100), ("method", "route"),
+))
+db_seconds_per_request = register_histogram(Histogram(
+    "http_db_seconds", "Database time per request", (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    ("method", "route"),
+))
+
+
+class SQLWarnings:
+    def __init__(self):
+        self.over_threshold = 0
+
+    def metrics(self):
+        return {"requests_over_threshold_total": self.over_threshold}
+
+
+sql_warnings = SQLWarnings()
+register_collector("sql", sql_warnings.metrics)
+
+
+def _route(request: Request) -> str:
+    """The path with its parameters put back as names, so /chat/{chat_id}/messages is one series."""
+    if request.scope.get("route") is None:
+        # Unmatched paths share one series instead of one per URL
+        return "unmatched"
+    names = {str(value): f"{{{name}}}" for name, value in request.path_params.items()}
+    return "/".join(names.get(segment, segment) for segment in request.url.path.split("/"))
+
+
+def _observe(request: Request, queries: RequestQueries):
+    route = _route(request)
+    queries_per_request.observe((request.method, route), queries.count)
+    db_seconds_per_request.observe((request.method, route), queries.seconds)
+
+    if 0 < SQL_QUERY_WARN_THRESHOLD < queries.count:
+        sql_warnings.over_threshold += 1
+        statement, times = queries.most_repeated()
+        logger.warning(
+            f"{request.method} {route} ran {queries.count} queries in {queries.seconds * 1000:.1f} ms "
+            f"(threshold {SQL_QUERY_WARN_THRESHOLD}); repeated {times}x: {statement}"
+        )
+
+
+def _add_debug_headers(headers: MutableHeaders, queries: RequestQueries, partial: bool):
+    headers[QUERIES_HEADER] = str(queries.count)
+    headers[TIME_HEADER] = f"{queries.seconds * 1000:.2f}"
+    if queries.slowest is not None:
+        headers[SLOWEST_TIME_HEADER] = f"{queries.slowest_seconds * 1000:.2f}"
+        # Header values cannot carry newlines or non-latin-1 text
+        headers[SLOWEST_HEADER] = fingerprint(queries.slowest)[:500].encode("latin-1", "replace").decode("latin-1")
+    if partial:
+        headers[PARTIAL_HEADER] = "true"
+
+
+class SQLStatsMiddleware:
+    """
+    Record the statements each request runs; see the module docstring. A plain ASGI
+    middleware rather than an @app.middleware("http") one, because those return as
+    soon as the response starts, before a streamed body or background tasks run.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        held_start = None
+
+        async def send_with_headers(message: Message):
+            nonlocal held_start
+            if message["type"] == "http.response.start" and SQL_DEBUG_HEADERS:
+                # Held back until the first body chunk shows whether the body is streamed
+                held_start = message
+                return
+            if held_start is not None and message["type"] == "http.response.body":
+                _add_debug_headers(MutableHeaders(scope=held_start), queries, message.get("more_body", False))
+                await send(held_start)
+                held_start = None
+            await send(message)
+
+        reset = _current.set(queries)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(reset)
+        _observe(Request(scope), queries)
@@ -1,5 +1,6 @@
 // frontend/src/pages/RecipeList.jsx
 import React, { useEffect, useState } from 'react';
+import { apiFetch } from '../services/apiFetch';
 
 function Account() {
   const [recipes, setRecipes] = useState([]);
@@ -7,13 +8,13 @@ function Account() {
   const userId = 1; // In reality, store/fetch from localStorage or global auth state
 
   useEffect(() => {
-    fetch('/auth/account')
+    apiFetch('/auth/account')
       .then(res => res.json())
       .then(data => setRecipes(data));
   }, []);
 
   const handleRate = async (recipeId) => {
-    await fetch('/auth/account?user_id=' + userId, {
+    await apiFetch('/auth/account?user_id=' + userId, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ recipe_id: recipeId, rating: rating }),
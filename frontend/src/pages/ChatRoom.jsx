@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import { API_BASE_URL } from "../config";
 import Wizard from './mealWizard';
 import '../styles/chatroom.css';
+import { apiFetch } from '../services/apiFetch';
 
 function ChatRoom({ notifySuccess, notifyError }) {
     const [isWizardOpen, setIsWizardOpen] = useState(false);
@@ -10,6 +11,8 @@ function ChatRoom({ notifySuccess, notifyError }) {
     const [messages, setMessages] = useState([]);
     const [message, setMessage] = useState('');
     const [recentChats, setRecentChats] = useState([]);
+    const [chatsCursor, setChatsCursor] = useState(null); // X-Next-Cursor of the chat list, null on the last page
+    const [olderMessagesCursor, setOlderMessagesCursor] = useState(null);
     const [userData, setUserData] = useState(null);
     const [contextMenuVisible, setContextMenuVisible] = useState(false);
     const [contextMenuPosition, setContextMenuPosition] = useState({ x: 0, y: 0 });
@@ -25,7 +28,8 @@ function ChatRoom({ notifySuccess, notifyError }) {
         setSelectedChatId(chatId);
         setRoom(displayName || chatId);
         setMessages([]); // Clear current messages
-        await fetchMessages(chatId); // Fetch all existing messages
+        setOlderMessagesCursor(null);
+        await fetchMessages(chatId); // Fetch the most recent messages
         connectToWebSocket(chatId); // Open WebSocket after fetching messages
     };
 
@@ -53,7 +57,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
     const handleDeleteChat = async () => {
         try {
             const token = localStorage.getItem("token");
-            const res = await fetch(`${API_BASE_URL}/chat/delete/${selectedChatId}`, {
+            const res = await apiFetch(`${API_BASE_URL}/chat/delete/${selectedChatId}`, {
                 method: "DELETE",
                 headers: {
                     Authorization: `Bearer ${token}`,
@@ -64,6 +68,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
                 setRecentChats(recentChats.filter((chat) => chat.id !== selectedChatId));
                 setRoom('');  // Clear current room
                 setMessages([]);  // Clear current messages
+                setOlderMessagesCursor(null);
                 console.log("Chat deleted successfully");
             } else {
                 notifyError("Failed to delete chat.");
@@ -93,7 +98,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
     const syncMessages = async (chatId, lastTimestamp) => {
         const token = localStorage.getItem("token");
         try {
-            const res = await fetch(
+            const res = await apiFetch(
                 `${API_BASE_URL}/chat/${chatId}/sync-messages?since=${encodeURIComponent(lastTimestamp)}`,
                 {
                     headers: {
@@ -166,7 +171,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
     const fetchUser = async () => {
         try {
             const token = localStorage.getItem("token");
-            const res = await fetch(`${API_BASE_URL}/management/account`, {
+            const res = await apiFetch(`${API_BASE_URL}/management/account`, {
                 headers: { Authorization: `Bearer ${token}` },
             });
             if (res.ok) {
@@ -184,12 +189,13 @@ function ChatRoom({ notifySuccess, notifyError }) {
     const fetchRecentChats = async () => {
         try {
             const token = localStorage.getItem("token");
-            const res = await fetch(`${API_BASE_URL}/chat/chats`, {
+            const res = await apiFetch(`${API_BASE_URL}/chat/chats`, {
                 headers: { Authorization: `Bearer ${token}` },
             });
             if (res.ok) {
                 const chats = await res.json();
                 setRecentChats(chats);
+                setChatsCursor(res.headers.get("X-Next-Cursor"));
                 console.log(chats);
 
                 // Automatically open the most recent chat
@@ -208,11 +214,29 @@ function ChatRoom({ notifySuccess, notifyError }) {
         }
     };
 
+    const loadMoreChats = async () => {
+        try {
+            const token = localStorage.getItem("token");
+            const res = await apiFetch(`${API_BASE_URL}/chat/chats?cursor=${encodeURIComponent(chatsCursor)}`, {
+                headers: { Authorization: `Bearer ${token}` },
+            });
+            if (res.ok) {
+                const chats = await res.json();
+                setRecentChats((prev) => [...prev, ...chats.filter((chat) => !prev.some((c) => c.id === chat.id))]);
+                setChatsCursor(res.headers.get("X-Next-Cursor"));
+            } else {
+                notifyError("Failed to fetch more chats.");
+            }
+        } catch (err) {
+            notifyError("An error occurred while fetching more chats.");
+        }
+    };
+
 
     const fetchMessages = async (chatId) => {
         const token = localStorage.getItem("token");
         try {
-            const res = await fetch(`${API_BASE_URL}/chat/${chatId}/messages`, {
+            const res = await apiFetch(`${API_BASE_URL}/chat/${chatId}/messages`, {
                 headers: {
                     Authorization: `Bearer ${token}`,
                 },
@@ -221,6 +245,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
                 const messagesData = await res.json();
                 console.log(messagesData)
                 setMessages(messagesData);
+                setOlderMessagesCursor(res.headers.get("X-Next-Cursor"));
             } else {
                 console.error("Failed to fetch messages");
                 notifyError("Could not load messages.");
@@ -230,6 +255,33 @@ function ChatRoom({ notifySuccess, notifyError }) {
             notifyError("An error occurred while fetching messages.");
         }
     };
+
+    const loadOlderMessages = async () => {
+        const token = localStorage.getItem("token");
+        try {
+            const res = await apiFetch(
+                `${API_BASE_URL}/chat/${selectedChatId}/messages?cursor=${encodeURIComponent(olderMessagesCursor)}`,
+                {
+                    headers: {
+                        Authorization: `Bearer ${token}`,
+                    },
+                }
+            );
+            if (res.ok) {
+                const olderMessages = await res.json();
+                setMessages((prevMessages) => [
+                    ...olderMessages.filter((msg) => isMessageUnique(prevMessages, msg)),
+                    ...prevMessages,
+                ]);
+                setOlderMessagesCursor(res.headers.get("X-Next-Cursor"));
+            } else {
+                notifyError("Could not load older messages.");
+            }
+        } catch (err) {
+            console.error("Error fetching older messages:", err);
+            notifyError("An error occurred while loading older messages.");
+        }
+    };
     const startNewChat = () => {
         setIsWizardOpen(true);
     };
@@ -246,7 +298,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
     const startNewChatLogic = async (wizardData) => {
         try {
             const token = localStorage.getItem("token");
-            const parse = await fetch(`${API_BASE_URL}/management/account`, {
+            const parse = await apiFetch(`${API_BASE_URL}/management/account`, {
                 method: "GET",
                 headers: {
                     Authorization: `Bearer ${token}`,
@@ -259,7 +311,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
                 ...user,
             };
             const displayName = wizardData.cravingfor;
-            const res = await fetch(`${API_BASE_URL}/chat/new?display_name=${displayName}`, {
+            const res = await apiFetch(`${API_BASE_URL}/chat/new?display_name=${displayName}`, {
                 method: "POST",
                 headers: {
                     Authorization: `Bearer ${token}`,
@@ -272,6 +324,7 @@ function ChatRoom({ notifySuccess, notifyError }) {
                 const chat = await res.json();
                 setRoom(chat.display_name || chat.id);
                 setMessages([]);
+                setOlderMessagesCursor(null);
                 setRecentChats((prevChats) => [ chat, ...prevChats]);
                 connectToWebSocket(chat.id);
                 notifySuccess("New chat started!");
@@ -320,7 +373,7 @@ const handleTitleSave = async () => {
 
     try {
         const token = localStorage.getItem("token");
-        const res = await fetch(`${API_BASE_URL}/chat/${selectedChatId}/metadata`, {
+        const res = await apiFetch(`${API_BASE_URL}/chat/${selectedChatId}/metadata`, {
             method: "PUT",
             headers: {
                 "Content-Type": "application/json",
@@ -376,6 +429,11 @@ const handleTitleSave = async () => {
                             </li>
                         ))}
                     </ul>
+                    {chatsCursor && (
+                        <button className="button" onClick={loadMoreChats}>
+                            More Chats
+                        </button>
+                    )}
                 </div>
                 <main className="chat-main">
                     {room && room !== "No Chats Available" ? (
@@ -410,6 +468,11 @@ const handleTitleSave = async () => {
                             </div>
 
                             <div className="messages">
+                                {olderMessagesCursor && (
+                                    <button className="send-button load-more" onClick={loadOlderMessages}>
+                                        Load older messages
+                                    </button>
+                                )}
                                 {messages.map((m, index) => (
                                     <div
                                         key={m.id || index}
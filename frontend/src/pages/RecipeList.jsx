@@ -1,34 +1,42 @@
 import React, { useEffect, useState } from 'react';
+import { apiFetch } from '../services/apiFetch';
 
 function RecipeList() {
   const [recipes, setRecipes] = useState([]);
   const [rating, setRating] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);  // X-Next-Cursor of the last page, null when there is no more
 
   // Get token from localStorage
   const token = localStorage.getItem('token');
   const userId = localStorage.getItem('user_id');  // Get user_id from localStorage
 
-  useEffect(() => {
-    // Check if the user is logged in (i.e., token exists)
-    if (!token) {
-//       alert('You must be logged in to view recipes!');
-      return;  // Prevent fetching recipes if no token is found
-    }
-
-    // Fetch the list of recipes, passing the token in the Authorization header
-    fetch('/recipes/list', {
+  // Fetch one page of recipes, passing the token in the Authorization header; a cursor appends the next page
+  const fetchRecipes = (cursor) =>
+    apiFetch(cursor ? `/recipes/list?cursor=${encodeURIComponent(cursor)}` : '/recipes/list', {
       method: 'GET',
       headers: {
         'Authorization': `Bearer ${token}`,  // Pass token in Authorization header
         'Content-Type': 'application/json',
       },
     })
-      .then(res => res.json())
-      .then(data => setRecipes(data))  // Set recipes in the state
+      .then(res => {
+        setNextCursor(res.headers.get('X-Next-Cursor'));
+        return res.json();
+      })
+      .then(data => setRecipes(prev => (cursor ? [...prev, ...data] : data)))  // Set recipes in the state
       .catch(err => {
         console.error('Error fetching recipes:', err);
 //         alert('Failed to fetch recipes');
       });
+
+  useEffect(() => {
+    // Check if the user is logged in (i.e., token exists)
+    if (!token) {
+//       alert('You must be logged in to view recipes!');
+      return;  // Prevent fetching recipes if no token is found
+    }
+
+    fetchRecipes(null);
   }, [token]);  // Re-run this useEffect if the token changes
 
   const handleRate = async (recipeId) => {
@@ -38,7 +46,7 @@ function RecipeList() {
     }
 
     // Send a rating for the recipe, passing token and user_id in the Authorization header
-    await fetch('/recipes/rate', {
+    await apiFetch('/recipes/rate', {
       method: 'POST',
       headers: {
         'Authorization': `Bearer ${token}`,  // Pass token in Authorization header
@@ -60,7 +68,7 @@ function RecipeList() {
       {recipes.map(r => (
         <div key={r.id}>
           <h3>{r.title}</h3>
-          <p>{r.instructions}</p>
+          <p>{[r.cuisine, `${r.prepare_time} min`, `${Math.round(r.calories)} kcal`, `${r.servings} servings`].filter(Boolean).join(' · ')}</p>
           <input
             type="number"
             min="1"
@@ -71,6 +79,7 @@ function RecipeList() {
           <button onClick={() => handleRate(r.id)}>Rate</button>
         </div>
       ))}
+      {nextCursor && <button onClick={() => fetchRecipes(nextCursor)}>Load more</button>}
     </div>
   );
 }
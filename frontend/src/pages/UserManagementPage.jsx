@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { API_BASE_URL } from "../config";
 import '../styles/usermanagement.css';
 import { notifySuccess, notifyError } from '../services/notificationService';
+import { apiFetch } from '../services/apiFetch';
 
 function UserManagementPage() {
   const [user, setUser] = useState(null);
@@ -14,7 +15,7 @@ function UserManagementPage() {
   const fetchUser = async () => {
     try {
       const token = localStorage.getItem("token");
-      const res = await fetch(`${API_BASE_URL}/management/account`, {
+      const res = await apiFetch(`${API_BASE_URL}/management/account`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
@@ -35,7 +36,7 @@ function UserManagementPage() {
       const token = localStorage.getItem("token");
       const updatedUser = { ...user };
       delete updatedUser.id; // Remove ID
-      const res = await fetch(`${API_BASE_URL}/management/account`, {
+      const res = await apiFetch(`${API_BASE_URL}/management/account`, {
         method: "PUT",
         headers: {
           "Content-Type": "application/json",
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from "react";
 import "../styles/mealwizard.css";
 import { API_BASE_URL } from "../config";
+import { apiFetch } from "../services/apiFetch";
 
 function Wizard({ onComplete }) {
   const [currentStep, setCurrentStep] = useState("alone");
@@ -12,7 +13,7 @@ function Wizard({ onComplete }) {
     const fetchUser = async () => {
       try {
         const token = localStorage.getItem("token");
-        const res = await fetch(`${API_BASE_URL}/management/account`, {
+        const res = await apiFetch(`${API_BASE_URL}/management/account`, {
           headers: {
             Authorization: `Bearer ${token}`,
           },
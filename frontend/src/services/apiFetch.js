@@ -0,0 +1,20 @@
+// fetch() for authenticated API calls. After a write the backend answers with
+// X-Primary-Until: until then this user's reads must go to the primary database, or
+// a read served by another worker could miss the write. The value is sent back on
+// every request until it passes.
+const PRIMARY_UNTIL_HEADER = 'X-Primary-Until';
+const PRIMARY_UNTIL_KEY = 'primary_until';
+
+export const apiFetch = async (url, options = {}) => {
+  const headers = new Headers(options.headers);
+  const primaryUntil = parseFloat(sessionStorage.getItem(PRIMARY_UNTIL_KEY));
+  if (primaryUntil > Date.now() / 1000) {
+    headers.set(PRIMARY_UNTIL_HEADER, primaryUntil.toFixed(3));
+  }
+  const res = await fetch(url, { ...options, headers });
+  const until = parseFloat(res.headers.get(PRIMARY_UNTIL_HEADER));
+  if (until > (primaryUntil || 0)) {
+    sessionStorage.setItem(PRIMARY_UNTIL_KEY, until.toFixed(3));
+  }
+  return res;
+};
@@ -1,10 +1,13 @@
+import { API_BASE_URL } from "../config";
+import { apiFetch } from "./apiFetch";
+
 export const fetchUserAccount = async () => {
   try {
     const token = localStorage.getItem("token");
     if (!token) {
       throw new Error("No token found");
     }
-    const res = await fetch(`${API_BASE_URL}/management/account`, {
+    const res = await apiFetch(`${API_BASE_URL}/management/account`, {
       headers: {
         Authorization: `Bearer ${token}`,
       },